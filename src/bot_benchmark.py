@@ -0,0 +1,231 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |   End-to-end benchmark of the Messenger chatbot against the mock server   --
+# |-----------------------------------------------------------------------------
+
+"""
+Drive the chatbot_demo_ws.py bot with synthetic chatroomPost events through mock_messenger_server.py
+and write machine-readable results:
+
+- reply latency: p50/p90/p99 from sending a 'hello' chatroomPost event to the bot's reply POST
+- sustained posts/sec through BotRuntime.post_message_to_chatroom
+- token refresh latency
+- memory growth (RSS) over the run
+
+    $>python bot_benchmark.py --rate 200 --duration 30 --output bench.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+import json_codec
+from bot_session import BotSession
+from mock_messenger_server import MockMessengerServer
+from rdp_token import RDPTokenManagement
+
+
+# Resident set size of this process in bytes, or None when the platform does not tell
+def current_rss():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak RSS, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+
+def percentiles(values):
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+
+    def rank(fraction):
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    return {
+        'count': len(values),
+        'p50': rank(0.50),
+        'p90': rank(0.90),
+        'p99': rank(0.99),
+        'max': values[-1],
+        'mean': sum(values) / len(values)
+    }
+
+
+class ReplyLatencyProbe:
+    # Match the bot's 'Hello <sender email>' replies to the events carrying that sender email
+    def __init__(self):
+        self.sent = {}
+        self.latencies = []
+
+    def event_sent(self, sequence):
+        self.sent['bench-%d@example.com' % (sequence)] = time.perf_counter()
+
+    def on_post(self, post):
+        message = post.get('message') or ''
+        if message.startswith('Hello '):
+            sent = self.sent.pop(message[6:].strip(), None)
+            if sent is not None:
+                self.latencies.append(time.perf_counter() - sent)
+
+
+async def drive_events(mock_server, probe, room_ids, rate, duration):
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    sequence = 0
+    while time.perf_counter() - start < duration:
+        # Catch up when the loop falls behind the target rate
+        due = int((time.perf_counter() - start) / interval) + 1
+        while sequence < due:
+            probe.event_sent(sequence)
+            mock_server.send_chatroom_post(room_ids[sequence % len(room_ids)], 'hello',
+                                           {'email': 'bench-%d@example.com' % (sequence)})
+            sequence += 1
+        await asyncio.sleep(interval)
+    return sequence, time.perf_counter() - start
+
+
+async def measure_post_throughput(runtime, room_ids, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(index):
+        async with semaphore:
+            status, _ = await runtime.post_message_to_chatroom(room_ids[index % len(room_ids)], 'benchmark %d' % index)
+            return status == 200
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[post(index) for index in range(count)])
+    elapsed = time.perf_counter() - start
+    return {'posts': count, 'succeeded': sum(results), 'seconds': elapsed, 'posts_per_sec': count / elapsed}
+
+
+async def measure_token_refresh(runtime, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await runtime.authenticate(force_refresh=True)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+async def run_benchmark(args):
+    import chatbot_demo_ws
+
+    mock_server = MockMessengerServer(args.host, args.http_port, args.ws_port,
+                                      ['Benchmark %d' % (index) for index in range(args.rooms)],
+                                      latency=args.latency).start()
+    RDPTokenManagement.base_URL = mock_server.gw_url
+    probe = ReplyLatencyProbe()
+    mock_server.post_listeners.append(probe.on_post)
+
+    session = BotSession('benchmark-bot', 'password', 'app-key', chatbot_demo_ws.process_message,
+                         [room['name'] for room in mock_server.chatrooms], None,
+                         mock_server.ws_url, mock_server.gw_url)
+    session.runtime.outbound.set_rates(args.bot_rate, args.bot_rate, args.room_rate, args.room_rate)
+    room_ids = [room['chatroomId'] for room in mock_server.chatrooms]
+    results = {}
+    try:
+        rss_start = current_rss()
+        if not await session.start():
+            raise RuntimeError('Bot session failed to start against the mock server')
+        run_task = asyncio.ensure_future(session.run())
+        while mock_server.connected_clients() == 0:
+            await asyncio.sleep(0.01)
+
+        memory_samples = [rss_start]
+        sampler_stop = asyncio.Event()
+
+        async def sample_memory():
+            while not sampler_stop.is_set():
+                await asyncio.sleep(1)
+                memory_samples.append(current_rss())
+
+        sampler = asyncio.ensure_future(sample_memory())
+        events, elapsed = await drive_events(mock_server, probe, room_ids, args.rate, args.duration)
+        # Give the bot time to answer the last events
+        deadline = time.perf_counter() + args.drain
+        while probe.sent and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        sampler_stop.set()
+        await sampler
+
+        results['reply_latency_seconds'] = percentiles(probe.latencies)
+        results['reply_latency_seconds']['lost'] = len(probe.sent)
+        results['events'] = {'sent': events, 'seconds': elapsed, 'events_per_sec': events / elapsed}
+        results['post_throughput'] = await measure_post_throughput(session.runtime, room_ids, args.posts,
+                                                                   args.concurrency)
+        results['token_refresh_seconds'] = await measure_token_refresh(session.runtime, args.refreshes)
+        rss_end = current_rss()
+        results['memory_rss_bytes'] = {
+            'start': rss_start,
+            'end': rss_end,
+            'growth': rss_end - rss_start if rss_start is not None and rss_end is not None else None,
+            'samples': memory_samples
+        }
+        results['mock_requests'] = dict(mock_server.request_counts)
+
+        await session.stop()
+        await run_task
+    finally:
+        mock_server.stop()
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Messenger chatbot end-to-end benchmark')
+    parser.add_argument('--rate', type=float, default=100.0, help='chatroomPost events per second')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of event traffic')
+    parser.add_argument('--drain', type=float, default=10.0, help='seconds to wait for the last replies')
+    parser.add_argument('--rooms', type=int, default=5, help='number of chatrooms')
+    parser.add_argument('--posts', type=int, default=1000, help='posts for the throughput measurement')
+    parser.add_argument('--concurrency', type=int, default=50, help='concurrent posts for the throughput measurement')
+    parser.add_argument('--refreshes', type=int, default=20, help='token refreshes to measure')
+    parser.add_argument('--latency', type=float, default=0.0, help='mock server HTTP latency in seconds')
+    parser.add_argument('--bot-rate', type=float, default=100000.0, help='outbound messages per second for the bot')
+    parser.add_argument('--room-rate', type=float, default=100000.0, help='outbound messages per second per chatroom')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--http-port', type=int, default=18080)
+    parser.add_argument('--ws-port', type=int, default=18081)
+    parser.add_argument('--output', help='JSON results file, results are printed when omitted')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    # The demo prints every message, keep it out of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        benchmark_results = asyncio.run(run_benchmark(args))
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'json_backend': json_codec.backend,
+        'config': vars(args),
+        'results': benchmark_results
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+        print('Benchmark results saved to %s' % (args.output))
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,63 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |         Refinitiv Messenger BOT API lazy payload logging helpers          --
+# |-----------------------------------------------------------------------------
+
+import json
+import logging
+
+# Parent logger name of every Messenger BOT API subsystem logger
+ROOT_LOGGER_NAME = 'messenger'
+
+
+# Return the logger of a subsystem, for example get_logger('rest') returns the 'messenger.rest' logger
+def get_logger(subsystem):
+    return logging.getLogger('{}.{}'.format(ROOT_LOGGER_NAME, subsystem))
+
+
+class LazyJson:
+    """
+    Log argument that serializes a payload only when the log record is emitted.
+
+    Pass it as a logging argument instead of formatting the message eagerly:
+
+        logger.debug('Sent: %s', LazyJson(body))
+
+    str and bytes payloads (raw WebSocket frames) are logged as-is, without a parse/serialize round trip.
+    """
+
+    # Single-line JSON when True, sorted and indented JSON when False
+    compact = False
+    # Maximum number of characters logged per payload, None logs the whole payload
+    max_length = 4096
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        payload = self.payload
+        if isinstance(payload, bytes):
+            text = payload.decode('utf-8', 'replace')
+        elif isinstance(payload, str):
+            text = payload
+        elif self.compact:
+            text = json.dumps(payload, separators=(',', ':'))
+        else:
+            text = json.dumps(payload, sort_keys=True, indent=2, separators=(',', ':'))
+        if self.max_length is not None and len(text) > self.max_length:
+            text = '%s...(%d characters truncated)' % (text[:self.max_length], len(text) - self.max_length)
+        return text
+
+
+# Set how LazyJson payloads are written for the whole process
+def set_payload_format(compact=None, max_length=-1):
+    if compact is not None:
+        LazyJson.compact = compact
+    if max_length != -1:
+        LazyJson.max_length = max_length
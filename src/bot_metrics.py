@@ -0,0 +1,274 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |     Refinitiv Messenger BOT API in-process metrics and Prometheus export  --
+# |-----------------------------------------------------------------------------
+
+"""
+In-process counters and latency histograms of the bot, with an optional Prometheus text exporter.
+
+The bot modules record into the process-wide registry:
+
+- messenger_http_requests_total / messenger_http_request_seconds: Messenger BOT API REST calls by
+  endpoint and HTTP status
+- rdp_token_requests_total / rdp_token_request_seconds: RDP password grants and refresh grants by status
+- messenger_ws_frames_total: WebSocket frames in and out, messenger_ws_connections_total and
+  messenger_ws_reconnects_total
+- messenger_command_seconds: chatroom command handler durations by command
+- messenger_response_cache_requests_total: command reply cache hits, misses, coalesced and uncacheable requests
+- messenger_inbound_duplicates_total and messenger_inbound_out_of_order_total: inbound guard drops and
+  ordering violations
+- messenger_inbound_dropped_total and messenger_inbound_lag_seconds: inbound queue load shedding and lag
+
+Read the values in code with registry.snapshot(), or serve them to Prometheus:
+
+    import bot_metrics
+    bot_metrics.start_exporter(9100)
+"""
+
+import bisect
+import threading
+import time
+
+from bot_logging import get_logger
+
+# Metrics logger
+logger = get_logger('metrics')
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labels, extra=None):
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(labelnames, labels)]
+    if extra is not None:
+        pairs.append('%s="%s"' % extra)
+    return '{%s}' % (','.join(pairs)) if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    # Monotonic count by label values, safe to increment from the REST threads
+    kind = 'counter'
+
+    def __init__(self, name, help_text='', labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = []
+        values = self.snapshot()
+        if not values and not self.labelnames:
+            values = {(): 0}
+        for labels, value in sorted(values.items()):
+            lines.append('%s%s %s' % (self.name, _format_labels(self.labelnames, labels), _format_value(value)))
+        return lines
+
+
+class Histogram:
+    # Observation counts per bucket, sum and count by label values
+    kind = 'histogram'
+
+    def __init__(self, name, help_text='', labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts (last one is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    # Context manager recording the duration of its block
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: {'buckets': list(entry[0]), 'sum': entry[1], 'count': entry[2]}
+                    for labels, entry in self._values.items()}
+
+    def render(self):
+        lines = []
+        for labels, entry in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry['buckets']):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (self.name, _format_labels(self.labelnames, labels,
+                                                                          ('le', _format_value(bound))),
+                                                 cumulative))
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append('%s_sum%s %s' % (self.name, label_text, _format_value(entry['sum'])))
+            lines.append('%s_count%s %d' % (self.name, label_text, entry['count']))
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class MetricsRegistry:
+    # Named metrics of the process, counter() and histogram() return the existing metric of a name
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError('Metric %s is already registered as a %s' % (name, metric.kind))
+            return metric
+
+    def counter(self, name, help_text='', labelnames=()):
+        return self._register(Counter, name, help_text, labelnames)
+
+    def histogram(self, name, help_text='', labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labelnames, buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    # Current values of every metric, by metric name and label values
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in list(self._metrics.items())}
+
+    # Prometheus text exposition format
+    def render_prometheus(self):
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append('# HELP %s %s' % (name, metric.help_text))
+            lines.append('# TYPE %s %s' % (name, metric.kind))
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry used by the bot modules
+registry = MetricsRegistry()
+
+http_requests = registry.counter('messenger_http_requests_total',
+                                 'Messenger BOT API HTTP requests', ('endpoint', 'status'))
+http_request_seconds = registry.histogram('messenger_http_request_seconds',
+                                          'Messenger BOT API HTTP request latency', ('endpoint', 'status'))
+token_requests = registry.counter('rdp_token_requests_total',
+                                  'RDP token requests by grant type', ('grant_type', 'status'))
+token_request_seconds = registry.histogram('rdp_token_request_seconds',
+                                           'RDP token request latency', ('grant_type',))
+ws_frames = registry.counter('messenger_ws_frames_total', 'WebSocket frames', ('direction',))
+ws_connections = registry.counter('messenger_ws_connections_total', 'WebSocket connections established')
+ws_reconnects = registry.counter('messenger_ws_reconnects_total', 'WebSocket reconnections')
+inbound_duplicates = registry.counter('messenger_inbound_duplicates_total', 'Duplicate chatroomPost events dropped')
+inbound_out_of_order = registry.counter('messenger_inbound_out_of_order_total',
+                                        'chatroomPost events older than the last event of their chatroom')
+inbound_dropped = registry.counter('messenger_inbound_dropped_total', 'Events shed by the full inbound queue',
+                                   ('policy', 'kind'))
+inbound_lag_seconds = registry.histogram('messenger_inbound_lag_seconds',
+                                         'Time events wait in the inbound queue before a handler runs')
+cache_requests = registry.counter('messenger_response_cache_requests_total',
+                                  'Command reply cache lookups: hit, miss, coalesced or uncacheable', ('name', 'result'))
+command_seconds = registry.histogram('messenger_command_seconds', 'Chatroom command handler duration',
+                                     ('command', 'outcome'))
+
+
+class MetricsExporter:
+    # Serve the registry in the Prometheus text format on http://host:port/metrics from a background thread
+    def __init__(self, port=9100, host='', metrics_registry=None):
+        self.port = port
+        self.host = host
+        self.registry = metrics_registry or registry
+        self._server = None
+        self._thread = None
+
+    def _handler(self):
+        # Every module records metrics, only an exporter needs the HTTP server: import it here
+        from http.server import BaseHTTPRequestHandler
+
+        metrics_registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                data = metrics_registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+    def start(self):
+        from http.server import ThreadingHTTPServer
+
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-exporter', daemon=True)
+        self._thread.start()
+        logger.info('Metrics exporter listening on port %s', self._server.server_address[1])
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+
+# Start a Prometheus exporter of the process-wide registry
+def start_exporter(port=9100, host=''):
+    return MetricsExporter(port, host).start()
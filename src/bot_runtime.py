@@ -0,0 +1,454 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |     Refinitiv Messenger BOT API asyncio runtime (WebSocket and REST)      --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import functools
+import random
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import websockets
+
+import bot_metrics
+import json_codec
+from bot_logging import LazyJson, get_logger
+from chatroom_directory import ChatroomDirectory
+from inbound_guard import InboundGuard
+from inbound_queue import InboundQueue
+from messenger_client import get_messenger_client
+from outbound_scheduler import OutboundScheduler
+from room_membership import RoomMembership
+
+# Messenger BOT API WebSocket runtime logger
+logger = get_logger('ws')
+
+
+class BotRuntime:
+    # Messenger BOT API WebSocket Service Detail
+    ws_url = 'wss://api.collab.refinitiv.com/services/nt/api/messenger/v1/stream'
+    ws_subprotocol = 'messenger-json'
+    # websockets ping interval in seconds, None disables it. For the environment that needs a ping-pong message only
+    ping_interval = None
+
+    # The current RDP expires_time is 600 seconds (10 minutes). However, the Messenger Bot WebSocket server still uses 300 seconds (5 minutes).
+    ws_expires_in = 300
+    # Give 60 seconds to obtain the new security token and send reissue
+    refresh_before = 60
+
+    # Number of threads running the blocking HTTP REST calls for the event loop
+    max_rest_workers = 10
+    # Number of workers running the message handlers of the queued WebSocket events, the events of one
+    # chatroom are handled one at a time in the order they were received
+    inbound_workers = 4
+    # Maximum number of queued WebSocket events and the overflow policy of inbound_queue.py
+    inbound_queue_size = 1000
+    inbound_overflow_policy = 'drop_oldest'
+
+    # Reconnection backoff in seconds: reconnect_delay * 2 ** attempt, capped at max_reconnect_delay, with jitter
+    reconnect_delay = 0.5
+    max_reconnect_delay = 30.0
+    # Consecutive failed reconnection attempts before run() gives up, None retries forever
+    max_reconnect_attempts = None
+
+    def __init__(self, rdp_token, message_handler=None, ws_url=None, gw_url=None, bot_api_base_path=None,
+                 max_rest_workers=None, inbound_workers=None, executor=None, inbound_guard=None, outbox=None):
+        self.rdp_token = rdp_token
+        # Coroutine function called as message_handler(runtime, message_json) for every WebSocket event
+        self.message_handler = message_handler
+        if ws_url is not None:
+            self.ws_url = ws_url
+        if max_rest_workers is not None:
+            self.max_rest_workers = max_rest_workers
+        if inbound_workers is not None:
+            self.inbound_workers = inbound_workers
+        # One pooled connection per REST thread
+        self.messenger_client = get_messenger_client(gw_url, bot_api_base_path, pool_maxsize=self.max_rest_workers)
+
+        # Authentication and connection objects
+        self.access_token = None
+        self.refresh_token = None
+        self.expire_time = 0
+        # Time the current access token was received, a reconnection may reuse it
+        self.token_time = 0
+        self.web_socket = None
+
+        # Chatroom objects
+        self.joined_rooms = RoomMembership()
+        # Chatrooms and managed chatrooms by name and chatroomId, refreshed in the background every ttl seconds
+        self.directory = ChatroomDirectory(self.messenger_client, lambda: self.access_token)
+
+        # Bot sessions of one process can share the executor running their REST calls
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=self.max_rest_workers, thread_name_prefix='messenger-rest')
+        self._executor = executor
+        self._tasks = set()
+        # Coroutine functions awaited by close() once the inbound events are handled, before the outbound flush
+        self.close_callbacks = []
+        # Coroutine functions awaited after each connect request, with the connection number (1 for the first)
+        self.connect_callbacks = []
+        # Set while the chatrooms are joined: BotSession.start() clears it until its chatrooms are joined,
+        # so a connection opened meanwhile does not replay the outbox to chatrooms not joined yet
+        self.rooms_ready = asyncio.Event()
+        self.rooms_ready.set()
+        # Duplicate and ordering filter of the received events, sessions of a process can share one
+        self.inbound_guard = inbound_guard if inbound_guard is not None else InboundGuard()
+        # Bounded handoff queue between the WebSocket receive loop and the message handler workers
+        self.inbound_queue = InboundQueue(self.inbound_queue_size, self.inbound_overflow_policy)
+        self._workers = []
+        # chatroomId: [lock, number of workers using it], serializes the handlers of one chatroom
+        self._room_locks = {}
+        # Number of WebSocket connections established by run()
+        self.connections = 0
+        self._stop_event = asyncio.Event()
+        # Rate-limited posts for this bot, with a token bucket per bot and per chatroom
+        self.outbound = OutboundScheduler(self.messenger_client, lambda: self.access_token, self.call_blocking)
+        # Optional durable outbox (outbox.py): posts are stored before they are sent and replayed until delivered
+        self.outbox = outbox
+
+    # Run a blocking call (HTTP REST, RDP Auth) off the event loop
+    async def call_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    # Schedule a coroutine on the event loop and keep a reference until it is done
+    def spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # =============================== RDP and Messenger BOT API functions ========================================
+
+    # Get the cached RDP token, or request a new one now with force_refresh
+    async def authenticate(self, force_refresh=False):
+        # Based on WebSocket application behavior, the Authentication will not read/write Token from rest-token.txt file
+        get_token = self.rdp_token.refresh if force_refresh else self.rdp_token.get_token
+        auth_token = await self.call_blocking(get_token, save_token_to_file=False,
+                                              current_refresh_token=self.refresh_token)
+        if not auth_token:
+            self.access_token, self.refresh_token, self.expire_time = None, None, 0
+            return False
+        if auth_token['access_token'] != self.access_token:
+            self.token_time = time.monotonic()
+        self.access_token = auth_token['access_token']
+        self.refresh_token = auth_token['refresh_token']
+        self.expire_time = int(auth_token['expires_in'])
+        return True
+
+    async def list_chatrooms(self, room_is_managed=False):
+        return await self.call_blocking(self.messenger_client.list_chatrooms,
+                                        self.access_token, room_is_managed)
+
+    # Reload the chatroom directory, return True if the chatroom list succeeded
+    async def refresh_directory(self):
+        return await self.call_blocking(self.directory.refresh)
+
+    async def _directory_refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.directory.ttl)
+            await self.refresh_directory()
+
+    # room_is_managed None means look it up in the chatroom directory
+    async def _join_chatroom(self, room_id, room_is_managed):
+        status, _ = await self.call_blocking(self.messenger_client.join_chatroom,
+                                             self.access_token, room_id, room_is_managed)
+        return status == 200
+
+    async def _leave_chatroom(self, room_id, room_is_managed):
+        return await self.call_blocking(self.messenger_client.leave_chatroom,
+                                        self.access_token, room_id, room_is_managed)
+
+    # Join a chatroom once, concurrent callers share the same join request
+    async def join_chatroom(self, room_id, room_is_managed=None):
+        if room_is_managed is None:
+            room_is_managed = self.directory.is_managed(room_id)
+        return await self.joined_rooms.ensure_joined(room_id, self._join_chatroom, room_is_managed)
+
+    async def _post_message_to_chatroom(self, room_id, text, room_is_managed):
+        if not await self.joined_rooms.ensure_joined(room_id, self._join_chatroom, room_is_managed):
+            return None, None
+        return await self.outbound.post_message_to_chatroom(room_id, text, room_is_managed)
+
+    # Send a message of the outbox, on 401 request a new token so the retry of the outbox uses it
+    async def _send_outbox_message(self, kind, target, text, room_is_managed):
+        if kind == 'chatroom':
+            status, response = await self._post_message_to_chatroom(target, text, room_is_managed)
+        else:
+            status, response = await self.outbound.post_direct_message(target, text)
+        if status == 401:
+            await self.authenticate(force_refresh=True)
+        return status, response
+
+    async def post_direct_message(self, contact_email, text):
+        if self.outbox is not None:
+            return await self.outbox.deliver('recipient', contact_email, text, False, self._send_outbox_message)
+        return await self.outbound.post_direct_message(contact_email, text)
+
+    async def post_message_to_chatroom(self, room_id, text, room_is_managed=None):
+        if room_is_managed is None:
+            room_is_managed = self.directory.is_managed(room_id)
+        if self.outbox is not None:
+            return await self.outbox.deliver('chatroom', room_id, text, room_is_managed, self._send_outbox_message)
+        return await self._post_message_to_chatroom(room_id, text, room_is_managed)
+
+    async def leave_chatroom(self, room_id, room_is_managed=None):
+        if room_id not in self.joined_rooms:
+            return None, None
+        if room_is_managed is None:
+            room_is_managed = self.joined_rooms.is_managed(room_id)
+        self.joined_rooms.discard(room_id)
+        return await self._leave_chatroom(room_id, room_is_managed)
+
+    # =============================== WebSocket functions ========================================
+
+    async def _send_ws_command(self, command):
+        # create connection request message in JSON format
+        request_msg = {
+            'reqId': str(random.randint(0, 1000000)),
+            'command': command,
+            'payload': {
+                'stsToken': self.access_token
+            }
+        }
+        try:
+            await self.web_socket.send(json_codec.dumps(request_msg))
+            bot_metrics.ws_frames.inc('out')
+        except Exception as error:
+            logger.error('send_ws_%s_request exception: %s', command, error)
+
+        logger.info('Sent: %s', LazyJson(request_msg))
+
+    # Send a connection request to Messenger ChatBot API WebSocket server
+    async def send_ws_connect_request(self):
+        await self._send_ws_command('connect')
+
+    # Function for Refreshing Tokens.  Auth Tokens need to be refreshed within 5 minutes for the WebSocket to persist
+    async def send_ws_keepalive(self):
+        await self._send_ws_command('authenticate')
+
+    # Refresh the RDP token and reissue it to the WebSocket connection before it expires
+    async def _token_refresh_loop(self):
+        try:
+            while True:
+                expire_time = min(int(self.expire_time), self.ws_expires_in)
+                if expire_time <= self.refresh_before:
+                    # Fail the refresh since value too small, reconnecting would not help
+                    logger.error('Token expires_in %s is too small to refresh', self.expire_time)
+                    self._stop_event.set()
+                    break
+                # The token may be older than this connection when it was reused on reconnection
+                await asyncio.sleep(max(0, self.token_time + expire_time - self.refresh_before - time.monotonic()))
+
+                print('Refresh Token ')
+                # The RDP token refresher thread has usually renewed the token already, request one otherwise
+                access_token = self.access_token
+                if not await self.authenticate():
+                    break
+                if self.access_token == access_token and not await self.authenticate(force_refresh=True):
+                    break
+                # Update authentication token to the WebSocket connection.
+                await self.send_ws_keepalive()
+        except Exception as error:
+            logger.error('Refresh Token exception: %s', error)
+
+        # Token can no longer be refreshed, close the stream, run() reconnects with a new token
+        if self.web_socket is not None:
+            await self.web_socket.close()
+
+    async def _dispatch(self, message_json):
+        try:
+            await self.message_handler(self, message_json)
+        except Exception as error:
+            logger.error('Process message fail : %s', error)
+
+    # Dispatch an event after the events of its chatroom taken earlier from the queue: the lock is requested
+    # right after get(), without awaiting, and asyncio.Lock wakes its waiters first come first served
+    async def _dispatch_in_room_order(self, message_json):
+        post = message_json.get('post')
+        room_id = message_json.get('chatroomId', post.get('chatroomId') if isinstance(post, dict) else None)
+        if room_id is None:
+            return await self._dispatch(message_json)
+        room_lock = self._room_locks.setdefault(room_id, [asyncio.Lock(), 0])
+        room_lock[1] += 1
+        try:
+            async with room_lock[0]:
+                await self._dispatch(message_json)
+        finally:
+            room_lock[1] -= 1
+            if room_lock[1] == 0:
+                del self._room_locks[room_id]
+
+    # Run the message handler, including its outbound posts, for each queued WebSocket event
+    async def _inbound_worker(self):
+        while True:
+            message_json = await self.inbound_queue.get()
+            try:
+                await self._dispatch_in_room_order(message_json)
+            finally:
+                self.inbound_queue.task_done()
+
+    def _start_inbound_workers(self):
+        if self.message_handler is None or self._workers:
+            return
+        self._workers = [self.spawn(self._inbound_worker()) for _ in range(self.inbound_workers)]
+
+    async def _stop_inbound_workers(self):
+        # Let the workers drain the events already received, then stop them
+        if self._workers:
+            await self.inbound_queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    # Receive WebSocket events, only parse and enqueue them, so a slow handler or REST post never delays the stream
+    async def _receive_loop(self):
+        async for message in self.web_socket:
+            bot_metrics.ws_frames.inc('in')
+            # Log the raw frame, there is no need to serialize the parsed message again
+            logger.debug('Received: %s', LazyJson(message))
+            try:
+                message_json = json_codec.loads(message)
+                if not isinstance(message_json, dict):
+                    raise ValueError('not a JSON object')
+                if self.message_handler is not None and self.inbound_guard.accept(message_json):
+                    self.inbound_queue.put_nowait(message_json)
+            except Exception as error:
+                # A malformed frame is skipped, the stream goes on
+                logger.error('Receive: skip invalid frame %r: %s', message[:200], error)
+
+    # Replay the outbox once the chatrooms are joined
+    async def _outbox_loop(self):
+        await self.rooms_ready.wait()
+        await self.outbox.retry_loop(self._send_outbox_message)
+
+    # Seconds to wait before the next reconnection attempt, exponential backoff with jitter
+    def reconnect_backoff(self, attempt):
+        delay = min(self.max_reconnect_delay, self.reconnect_delay * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    # Connect once and serve the stream until the connection is closed, return True if it was established
+    async def _connect_and_receive(self, ssl_context):
+        refresh_task = None
+        connected = False
+        try:
+            async with websockets.connect(self.ws_url, subprotocols=[self.ws_subprotocol],
+                                          ssl=ssl_context, ping_interval=self.ping_interval) as web_socket:
+                self.web_socket = web_socket
+                connected = True
+                if self._stop_event.is_set():
+                    # stop() was called while the connection was opening, it could not close it
+                    return connected
+                logger.info('Receive: onopen event. WebSocket Connection is established')
+                if self.connections:
+                    bot_metrics.ws_reconnects.inc()
+                    # The chatrooms joined before the connection was lost are joined again before posting
+                    await self.joined_rooms.rejoin_all(self._join_chatroom)
+                self.connections += 1
+                bot_metrics.ws_connections.inc()
+                await self.send_ws_connect_request()
+                self.outbound.resume()
+                for callback in self.connect_callbacks:
+                    try:
+                        await callback(self.connections)
+                    except Exception as error:
+                        logger.error('Connect callback exception: %s', error)
+                refresh_task = self.spawn(self._token_refresh_loop())
+                await self._receive_loop()
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as error:
+            logger.error('Error: %s', error)
+        finally:
+            self.web_socket = None
+            if refresh_task is not None:
+                refresh_task.cancel()
+            if connected:
+                logger.error('Receive: onclose event. WebSocket Connection Closed')
+        return connected
+
+    # Connect to Messenger BOT API WebSocket server and keep the connection up until stop() is called.
+    # A lost connection is re-established with backoff: the still-valid token is reused, connect is sent
+    # again, the joined chatrooms are joined again and the posts made meanwhile are held, then sent
+    async def run(self):
+        ssl_context = None
+        if self.ws_url.startswith('wss://'):
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+
+        directory_task = self.spawn(self._directory_refresh_loop())
+        outbox_task = None
+        if self.outbox is not None:
+            # Send the messages a previous run did not deliver, then retry the failed ones
+            outbox_task = self.spawn(self._outbox_loop())
+        self._start_inbound_workers()
+        attempt = 0
+        try:
+            while not self._stop_event.is_set():
+                # Reuse the cached token while it is active, request a new one otherwise
+                try:
+                    authenticated = await self.authenticate()
+                except Exception as error:
+                    logger.error('RDP authentication exception: %s', error)
+                    authenticated = False
+                if authenticated:
+                    print('Connecting to WebSocket %s ... ' % (self.ws_url))
+                    if await self._connect_and_receive(ssl_context):
+                        attempt = 0
+                    else:
+                        attempt += 1
+                else:
+                    attempt += 1
+                if self._stop_event.is_set():
+                    break
+                if self.max_reconnect_attempts is not None and attempt > self.max_reconnect_attempts:
+                    logger.error('WebSocket reconnection failed %d times, giving up', attempt)
+                    break
+
+                self.outbound.pause()
+                delay = self.reconnect_backoff(attempt)
+                logger.warning('Reconnecting to WebSocket in %.2f seconds', delay)
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            directory_task.cancel()
+            if outbox_task is not None:
+                outbox_task.cancel()
+            await self.close()
+
+    # Stop run(): close the WebSocket connection without reconnecting
+    async def stop(self):
+        self._stop_event.set()
+        if self.web_socket is not None:
+            await self.web_socket.close()
+
+    # Leave joined Chatrooms, wait for in-flight handlers and release the REST threads
+    async def close(self):
+        await self._stop_inbound_workers()
+        for callback in self.close_callbacks:
+            try:
+                await callback()
+            except Exception as error:
+                logger.error('Close callback exception: %s', error)
+        # The spawned tasks (the greeting, handler replies) post through the outbound scheduler and the
+        # outbox: they finish before those close. Posts held for a connection are sent now
+        self.outbound.resume()
+        pending = [task for task in self._tasks if task is not asyncio.current_task()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self.outbound.close()
+        if self.outbox is not None:
+            await self.outbox.close()
+        await self.joined_rooms.leave_all(self._leave_chatroom)
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,183 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |       Refinitiv Messenger BOT API sessions, many bots in one process      --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bot_logging import get_logger
+from bot_runtime import BotRuntime
+from messenger_client import close_messenger_clients
+from rdp_token import RDPTokenManagement
+
+# Bot session logger
+logger = get_logger('session')
+
+
+class BotSession:
+    """
+    One bot identity: its RDPTokenManagement, WebSocket stream, chatroom membership and message handler.
+
+    start() authenticates, sends the greeting 1 to 1 message and joins the chatrooms, run() then
+    serves the WebSocket stream, reconnecting when the connection is lost, until stop() is called.
+    start(connect=True) opens the WebSocket connection while the chatrooms are joined. Once authenticated,
+    the RDP token is renewed by a background thread (RDPTokenManagement.start_refresher).
+    """
+
+    # RDP token is renewed before_timeout seconds before it expires
+    before_timeout = 30
+    greeting_text = 'Hello from Python'
+
+    def __init__(self, username, password, app_key, message_handler, chatroom_names=(), recipient_email=None,
+                 ws_url=None, gw_url=None, bot_api_base_path=None, executor=None, token_store=None,
+                 inbound_guard=None, outbox=None):
+        self.username = username
+        self.chatroom_names = list(chatroom_names)
+        self.recipient_email = recipient_email
+        self.rdp_token = RDPTokenManagement(username, password, app_key, self.before_timeout, token_store)
+        self.runtime = BotRuntime(self.rdp_token, message_handler, ws_url, gw_url, bot_api_base_path,
+                                  executor=executor, inbound_guard=inbound_guard, outbox=outbox)
+        # run() task started by start(connect=True), and the seconds from the start of start() to each phase
+        self._run_task = None
+        self.timings = {}
+        self._started_at = None
+        self.runtime.close_callbacks.append(self._stop_token_refresher)
+        self.runtime.connect_callbacks.append(self._on_connect)
+
+    # Record the seconds from the start of start() to the end of a phase
+    def _phase_done(self, phase):
+        self.timings[phase] = time.perf_counter() - self._started_at
+
+    async def _stop_token_refresher(self):
+        await self.runtime.call_blocking(self.rdp_token.stop_refresher)
+
+    async def _send_greeting(self):
+        print('%s: send 1 to 1 message to %s ' % (self.username, self.recipient_email))
+        await self.runtime.post_direct_message(self.recipient_email, self.greeting_text)
+        self._phase_done('greeting')
+
+    async def _on_connect(self, connections):
+        if connections == 1 and self._started_at is not None:
+            self._phase_done('websocket')
+
+    async def _join(self, chatroom_name):
+        room_id = self.runtime.directory.chatroom_id(chatroom_name)
+        if room_id is None or not await self.runtime.join_chatroom(room_id):
+            logger.error('%s: cannot join chatroom %s', self.username, chatroom_name)
+            return False
+        return True
+
+    # Authenticate, greet and join the chatrooms, return True when the bot is ready.
+    # Only the token is needed before the other steps: the greeting is sent in the background, the
+    # chatrooms are joined concurrently and, with connect, the WebSocket connection is opened while the
+    # chatrooms are listed and joined (run() then serves it). self.timings has the seconds to each phase
+    async def start(self, connect=False):
+        runtime = self.runtime
+        self.timings = {}
+        self._started_at = time.perf_counter()
+
+        print('%s: Getting RDP Authentication Token' % (self.username))
+        # Authenticate with RDP Token service
+        if not await runtime.authenticate():
+            return False
+        self._phase_done('authenticate')
+        print('%s: Successfully Authenticated ' % (self.username))
+        # Renew the token in the background, so the REST calls and reconnections do not wait for RDP
+        self.rdp_token.start_refresher(save_token_to_file=False)
+
+        if connect:
+            runtime.rooms_ready.clear()
+            self._run_task = asyncio.get_running_loop().create_task(runtime.run())
+
+        # Send 1 to 1 message to reipient without a chat room, nothing waits for it
+        if self.recipient_email:
+            runtime.spawn(self._send_greeting())
+
+        # List associated Chatrooms
+        print('%s: Get Rooms ' % (self.username))
+        if not await runtime.refresh_directory():
+            return False
+        self._phase_done('list_chatrooms')
+
+        # Join associated Chatrooms
+        print('%s: Join Rooms ' % (self.username))
+        if not all(await asyncio.gather(*[self._join(chatroom_name) for chatroom_name in self.chatroom_names])):
+            return False
+        self._phase_done('join_chatrooms')
+        runtime.rooms_ready.set()
+
+        logger.info('%s: ready in %.3f seconds (%s)', self.username, self.timings['join_chatrooms'],
+                    ', '.join('%s %.3f' % (phase, seconds) for phase, seconds in self.timings.items()))
+        return True
+
+    # Connect to a Chatroom via a WebSocket connection and serve it until stop() is called
+    async def run(self):
+        if self._run_task is not None:
+            await self._run_task
+        else:
+            await self.runtime.run()
+
+    async def stop(self):
+        await self.runtime.stop()
+
+    # Stop the session and release its resources, also when start() failed
+    async def close(self):
+        if self._run_task is not None:
+            await self.runtime.stop()
+            await self._run_task
+        else:
+            await self.runtime.close()
+
+
+class BotHost:
+    """
+    Run many BotSession objects on one event loop.
+
+    The sessions share the Messenger BOT API connection pool (get_messenger_client) and one executor
+    for their blocking REST and RDP calls. With an inbound_guard, a chatroom post received by several
+    sessions of the host is handled by the first one only.
+    """
+
+    # Number of threads running the blocking HTTP REST calls of every session
+    max_rest_workers = 32
+
+    def __init__(self, max_rest_workers=None, inbound_guard=None):
+        if max_rest_workers is not None:
+            self.max_rest_workers = max_rest_workers
+        self.inbound_guard = inbound_guard
+        self.executor = ThreadPoolExecutor(max_workers=self.max_rest_workers, thread_name_prefix='messenger-rest')
+        self.sessions = []
+
+    def add_session(self, username, password, app_key, message_handler, chatroom_names=(), recipient_email=None,
+                    **kwargs):
+        kwargs.setdefault('inbound_guard', self.inbound_guard)
+        session = BotSession(username, password, app_key, message_handler, chatroom_names, recipient_email,
+                             executor=self.executor, **kwargs)
+        # The executor threads share the session's Messenger BOT API client, one pooled connection each
+        session.runtime.messenger_client.grow_pool(self.max_rest_workers)
+        self.sessions.append(session)
+        return session
+
+    async def _start_and_run(self, session):
+        if await session.start(connect=True):
+            await session.run()
+        else:
+            logger.error('%s: bot session failed to start', session.username)
+            await session.close()
+
+    # Start every session concurrently and serve them until all of them are closed, then close the shared
+    # connection pools. A single BotSession leaves them open, other sessions of the process may use them
+    async def run(self):
+        try:
+            await asyncio.gather(*[self._start_and_run(session) for session in self.sessions])
+        finally:
+            self.executor.shutdown(wait=False)
+            close_messenger_clients()
@@ -9,11 +9,15 @@
 # |                   Refinitiv Messenger BOT API via HTTP REST               --
 # |-----------------------------------------------------------------------------
 
-import requests
-import json
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from rdp_token import RDPTokenManagement
+from messenger_client import close_messenger_clients, get_messenger_client
+from room_membership import RoomMembership
+from chatroom_directory import ChatroomDirectory
+from bot_logging import set_payload_format
+from table_formatter import render_table
 
 # Input your Bot Username
 bot_username = '---YOUR BOT USERNAME---'
@@ -27,6 +31,9 @@ recipient_email = '---YOUR MESSENGER ACCOUNT EMAIL---'
 chatroom_name = '---YOUR CHAT ROOM NAME---'
 # Setting Log level the supported value is 'logging.INFO' and 'logging.DEBUG'
 log_level = logging.DEBUG
+# Log payloads as single-line JSON, and the maximum number of characters logged per payload (None for no limit)
+log_compact_json = False
+log_max_payload = 4096
 
 # Authentication objects
 auth_token = None
@@ -37,6 +44,18 @@ chatroom_id = None
 gw_url = 'https://api.refinitiv.com'
 bot_api_base_path = '/messenger/beta1'
 
+# Market data table posted by the demo: title, column keys and header labels, rows and number formats.
+# The (up)/(dn) markers of Fair Value are part of the data, as published
+assessment_title = 'USD BBL EU AM Assessment at 11:30 UKT'
+assessment_columns = ['Name', 'Asmt', 'Asmt Time', 'Fair Value', 'Fair Value Time', 'Hst Cls']
+assessment_header = ['Name', 'Asmt', '10-Apr-19', 'Fair Value', '10-Apr-19', 'Hst Cls']
+assessment_rows = [
+    ['BRT Sw APR19', 70.58, '05:07', '(up) 71.04', '10:58', 70.58],
+    ['BRTSw MAY19', 70.13, '05:07', '(dn) 70.59', '10:58', 70.14],
+    ['BRT Sw JUN19', 69.75, '05:07', '(up)70.2', '10:58', 69.76]
+]
+assessment_formats = {'Asmt': '.2f', 'Hst Cls': '.2f'}
+
 # =============================== RDP and Messenger BOT API functions ========================================
 
 
@@ -51,164 +70,45 @@ def authen_rdp(rdp_token_object):  # Call RDPTokenManagement to get authenticati
 
 # Get List of Chatrooms Function via HTTP REST
 def list_chatrooms(access_token, room_is_managed=False):
+    # Send a HTTP request message over the shared, pooled Messenger BOT API client
+    return get_messenger_client(gw_url, bot_api_base_path).list_chatrooms(access_token, room_is_managed)
 
-    if room_is_managed:
-        url = '{}{}/managed_chatrooms'.format(gw_url, bot_api_base_path)
-    else:
-        url = '{}{}/chatrooms'.format(gw_url, bot_api_base_path)
-
-    response = None
-    try:
-        # Send a HTTP request message with Python requests module
-        response = requests.get(
-            url, headers={'Authorization': 'Bearer {}'.format(access_token)})
-    except requests.exceptions.RequestException as e:
-        logging.error('Messenger BOT API: List Chatroom exception failure: %s' % e)
-
-    if response.status_code == 200:  # HTTP Status 'OK'
-        print('Messenger BOT API: get chatroom  success')
-        logging.info('Receive: %s' % (json.dumps(response.json(),sort_keys=True, indent=2, separators=(',', ':'))))
-        return response.status_code, response.json()
-    else:
-        print('Messenger BOT API: get chatroom result failure:',
-              response.status_code, response.reason)
-        print('Text:', response.text)
-        return response.status_code, None
 
-
-def join_chatroom(access_token, room_id=None, room_is_managed=False):  # Join chatroom
-    joined_rooms = []
-    if room_is_managed:
-        url = '{}{}/managed_chatrooms/{}/join'.format(
-            gw_url, bot_api_base_path, room_id)
-    else:
-        url = '{}{}/chatrooms/{}/join'.format(gw_url,
-                                              bot_api_base_path, room_id)
-
-    response = None
-    try:
-        # Send a HTTP request message with Python requests module
-        response = requests.post(
-            url, headers={'Authorization': 'Bearer {}'.format(access_token)})
-    except requests.exceptions.RequestException as e:
-        logging.error('Messenger BOT API: join chatroom exception failure: %s' % e)
-
-    if response.status_code == 200:  # HTTP Status 'OK'
-        joined_rooms.append(room_id)
-        print('Messenger BOT API: join chatroom success')
-        # Print for debugging purpose
-        logging.info('Receive: %s' % (json.dumps(response.json(),
-                                                  sort_keys=True, indent=2, separators=(',', ':'))))
-    else:
-        print('Messenger BOT API: join chatroom result failure:',
-              response.status_code, response.reason)
-        print('Text:', response.text)
+def join_chatroom(access_token, room_id=None, room_is_managed=False, joined_rooms=None):  # Join chatroom
+    if joined_rooms is None:
+        joined_rooms = RoomMembership()
+    status, _ = get_messenger_client(gw_url, bot_api_base_path).join_chatroom(
+        access_token, room_id, room_is_managed)
+    if status == 200:  # HTTP Status 'OK'
+        joined_rooms.add(room_id, room_is_managed)
 
     return joined_rooms
 
 
 # send 1 to 1 message to recipient email directly without a Chatroom via BOT
 def post_direct_message(access_token, contact_email='', text=''):
-    url = '{}{}/message'.format(gw_url, bot_api_base_path)
-
-    body = {
-        'recipientEmail': contact_email,
-        'message': text
-    }
-
-    # Print for debugging purpose
-    logging.debug('Sent: %s' % (json.dumps(
-        body, sort_keys=True, indent=2, separators=(',', ':'))))
-
-    try:
-        # Send a HTTP request message with Python requests module
-        response = requests.post(
-            url=url, data=json.dumps(body), headers={'Authorization': 'Bearer {}'.format(access_token)})
-    except requests.exceptions.RequestException as e:
-        logging.error('Messenger BOT API: post a 1 to 1 message exception failure: %s ' % e)
-
-    if response.status_code == 200:  # HTTP Status 'OK'
-        print('Messenger BOT API: post a 1 to 1 message to %s success' %
-              (contact_email))
-        # Print for debugging purpose
-        logging.info('Receive: %s' % (json.dumps(response.json(),
-                                                  sort_keys=True, indent=2, separators=(',', ':'))))
-    else:
-        print('Messenger BOT API: post a 1 to 1 message failure:',
-              response.status_code, response.reason)
-        print('Text:', response.text)
+    get_messenger_client(gw_url, bot_api_base_path).post_direct_message(
+        access_token, contact_email, text)
 
 
 # Posting Messages to a Chatroom via HTTP REST
 def post_message_to_chatroom(access_token,  joined_rooms, room_id=None,  text='', room_is_managed=False):
     if room_id not in joined_rooms:
-        joined_rooms = join_chatroom(access_token, room_id, room_is_managed)
+        join_chatroom(access_token, room_id, room_is_managed, joined_rooms)
 
-    if joined_rooms:
-        if room_is_managed:
-            url = '{}{}/managed_chatrooms/{}/post'.format(
-                gw_url, bot_api_base_path, room_id)
-        else:
-            url = '{}{}/chatrooms/{}/post'.format(
-                gw_url, bot_api_base_path, room_id)
-
-        body = {
-            'message': text
-        }
-
-        # Print for debugging purpose
-        logging.info('Sent: %s' % (json.dumps(
-            body, sort_keys=True, indent=2, separators=(',', ':'))))
-
-        response = None
-        try:
-            response = requests.post(
-                url=url, data=json.dumps(body), headers={'Authorization': 'Bearer {}'.format(access_token)})  # Send a HTTP request message with Python requests module
-        except requests.exceptions.RequestException as e:
-            logging.error('Messenger BOT API: post message to exception failure: %s ' % e)
-
-        if response.status_code == 200:  # HTTP Status 'OK'
-            joined_rooms.append(room_id)
-            print('Messenger BOT API: post message to chatroom success')
-            # Print for debugging purpose
-            logging.info('Receive: %s' % (json.dumps(
-                response.json(), sort_keys=True, indent=2, separators=(',', ':'))))
-        else:
-            print('Messenger BOT API: post message to failure:',
-                  response.status_code, response.reason)
-            print('Text:', response.text)
-    pass
+    if room_id in joined_rooms:
+        get_messenger_client(gw_url, bot_api_base_path).post_message_to_chatroom(
+            access_token, room_id, text, room_is_managed)
 
 
 # Leave a joined Chatroom
 def leave_chatroom(access_token, joined_rooms, room_id=None, room_is_managed=False):
 
     if room_id in joined_rooms:
-        if room_is_managed:
-            url = '{}{}/managed_chatrooms/{}/leave'.format(
-                gw_url, bot_api_base_path, room_id)
-        else:
-            url = '{}{}/chatrooms/{}/leave'.format(
-                gw_url, bot_api_base_path, room_id)
-
-        response = None
-        try:
-            # Send a HTTP request message with Python requests module
-            response = requests.post(
-                url, headers={'Authorization': 'Bearer {}'.format(access_token)})
-        except requests.exceptions.RequestException as e:
-            logging.error('Messenger BOT API: leave chatroom exception failure: %s' % e)
-
-        if response.status_code == 200:
-            print('Messenger BOT API: leave chatroom success')
-            logging.info('Receive: %s' % (json.dumps(
-                response.json(), sort_keys=True, indent=2, separators=(',', ':'))))
-        else:
-            print('Messenger BOT API: leave chatroom failure:',
-                  response.status_code, response.reason)
-            print('Text:', response.text)
-
-        joined_rooms.remove(room_id)
+        get_messenger_client(gw_url, bot_api_base_path).leave_chatroom(
+            access_token, room_id, room_is_managed)
+
+        joined_rooms.discard(room_id)
 
     return joined_rooms
 
@@ -219,6 +119,7 @@ if __name__ == '__main__':
 
     # Setting Python Logging
     logging.basicConfig(format='%(asctime)s: %(levelname)s:%(name)s :%(message)s', level=log_level, datefmt='%Y-%m-%d %H:%M:%S')
+    set_payload_format(log_compact_json, log_max_payload)
 
     print('Getting RDP Authentication Token')
 
@@ -234,32 +135,32 @@ if __name__ == '__main__':
 
     print('Successfully Authenticated ')
 
-    # Send 1 to 1 message to reipient without a chat room
-    text_to_post = """
-    USD BBL EU AM Assessment at 11:30 UKT\nName\tAsmt\t10-Apr-19\tFair Value\t10-Apr-19\tHst Cls\nBRT Sw APR19\t70.58\t05:07\t(up) 71.04\t10:58\t70.58\nBRTSw MAY19\t70.13\t05:07\t(dn) 70.59\t10:58\t70.14\nBRT Sw JUN19\t69.75\t05:07\t(up)70.2\t10:58\t69.76
-    """
+    # Send 1 to 1 message to reipient without a chat room, on a background thread while the Chatroom is listed and joined
+    text_to_post = '\n    %s\n    ' % (render_table(assessment_rows, assessment_columns, assessment_formats,
+                                                  title=assessment_title, header=assessment_header))
     print('send 1 to 1 message to %s ' % (recipient_email))
-    post_direct_message(access_token, recipient_email, text_to_post)
+    with ThreadPoolExecutor(max_workers=1) as background:
+        greeting = background.submit(post_direct_message, access_token, recipient_email, text_to_post)
 
-    # List associated Chatrooms
-    print('Get Rooms ')
-    status, chatroom_respone = list_chatrooms(access_token)
+        # List associated Chatrooms
+        print('Get Rooms ')
+        chatroom_directory = ChatroomDirectory(get_messenger_client(gw_url, bot_api_base_path), lambda: access_token)
+        listed = chatroom_directory.refresh()
 
-    if not chatroom_respone:
-        sys.exit(1)
+        if listed:
+            chatroom_id = chatroom_directory.chatroom_id(chatroom_name)
+            #print('Chatroom ID is ', chatroom_id)
 
-    #print(json.dumps(chatroom_respone, sort_keys=True,indent=2, separators=(',', ':')))
+            # Join associated Chatroom
+            print('Join Rooms ')
+            joined_rooms = join_chatroom(access_token, chatroom_id)
+            # print('joined_rooms is ', joined_rooms)
 
-    #chatroom_id = chatroom_respone['chatrooms'][0]['chatroomId']
-    for room in chatroom_respone['chatrooms']:
-        if room['name'] == chatroom_name:
-            chatroom_id = room['chatroomId']
-    #print('Chatroom ID is ', chatroom_id)
+        # The greeting is sent, or its error raised, before going on
+        greeting.result()
 
-    # Join associated Chatroom
-    print('Join Rooms ')
-    joined_rooms = join_chatroom(access_token, chatroom_id)
-    # print('joined_rooms is ', joined_rooms)
+    if not listed:
+        sys.exit(1)
 
     if joined_rooms:
         # Send a default message to a Chatroom
@@ -276,3 +177,6 @@ if __name__ == '__main__':
 
         print('Leave Rooms ')
         joined_rooms = leave_chatroom(access_token, joined_rooms, chatroom_id)
+
+    # Close the pooled Messenger BOT API connections
+    close_messenger_clients()
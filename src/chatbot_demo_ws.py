@@ -10,16 +10,16 @@
 # |-----------------------------------------------------------------------------
 
 import sys
-import time
-import getopt
-import requests
-import socket
-import json
-import websocket
-import threading
-import random
+import asyncio
 import logging
-from rdp_token import RDPTokenManagement
+from bot_session import BotSession
+from messenger_client import close_messenger_clients
+from command_router import CommandRouter
+from bot_logging import get_logger, set_payload_format
+from table_formatter import render_table
+from inbound_queue import InboundQueue
+from response_cache import ResponseCache
+import bot_metrics
 
 # Input your Bot Username
 bot_username = '---YOUR BOT USERNAME---'
@@ -33,268 +33,98 @@ recipient_email = '---YOUR MESSENGER ACCOUNT EMAIL---'
 chatroom_name = '---YOUR CHAT ROOM NAME---'
 # Setting Log level the supported value is 'logging.INFO' and 'logging.DEBUG'
 log_level = logging.DEBUG
+# Log payloads as single-line JSON, and the maximum number of characters logged per payload (None for no limit)
+log_compact_json = False
+log_max_payload = 4096
+# Number of worker processes handling chatroomPost events, sharded by chatroomId. 0 handles them in this process
+event_worker_processes = 0
+# Maximum number of received events waiting for a handler, and what to drop when it is reached:
+# 'drop_oldest', 'drop_chatter' (messages that are not commands) or 'prioritize_commands'
+inbound_queue_size = 1000
+inbound_overflow_policy = 'prioritize_commands'
+# Seconds the /complex_message table is cached before it is rendered again
+complex_message_ttl = 5
+# Seconds the bot waits to merge the replies to a chatroom/recipient into one post. 0 sends every reply as it is
+outbound_coalesce_window = 0
+# SQLite database of the durable outbox, posts are stored until delivered and replayed after a restart. None disables it
+outbox_database = None
+# Port of the Prometheus metrics exporter (http://localhost:<port>/metrics). None disables it
+metrics_port = None
 
-# Authentication and connection objectscls
-auth_token = None
-rdp_token = None
-access_token = None
-expire_time = 0
-logged_in = False
-
-refresh_token = None
 # Chatroom objects
 chatroom_id = None
-joined_rooms = None
 
 # Please verify below URL is correct via the WS lookup
 ws_url = 'wss://api.collab.refinitiv.com/services/nt/api/messenger/v1/stream'
 gw_url = 'https://api.refinitiv.com'
 bot_api_base_path = '/messenger/beta1'
 
-# =============================== RDP and Messenger BOT API functions ========================================
-
-
-def authen_rdp(rdp_token_object):  # Call RDPTokenManagement to get authentication
-    # Based on WebSocket application behavior, the Authentication will not read/write Token from rest-token.txt file
-    auth_token = rdp_token_object.get_token(save_token_to_file=False,  current_refresh_token = refresh_token)
-    if auth_token:
-        # return RDP access token (sts_token) ,refresh_token , expire_in values and RDP login status
-        return auth_token['access_token'], auth_token['refresh_token'], auth_token['expires_in'] , True
-    else:
-        return None,None, 0, False
-
-
-# Get List of Chatrooms Function via HTTP REST
-def list_chatrooms(access_token, room_is_managed=False):
-
-    if room_is_managed:
-        url = '{}{}/managed_chatrooms'.format(gw_url, bot_api_base_path)
-    else:
-        url = '{}{}/chatrooms'.format(gw_url, bot_api_base_path)
-
-    response = None
-    try:
-        # Send a HTTP request message with Python requests module
-        response = requests.get(
-            url, headers={'Authorization': 'Bearer {}'.format(access_token)})
-    except requests.exceptions.RequestException as e:
-        logging.error('Messenger BOT API: List Chatroom exception failure: %s' % e)
-
-    if response.status_code == 200:  # HTTP Status 'OK'
-        print('Messenger BOT API: get chatroom  success')
-        logging.info('Receive: %s' % (json.dumps(response.json(),sort_keys=True, indent=2, separators=(',', ':'))))
-        return response.status_code, response.json()
-    else:
-        print('Messenger BOT API: get chatroom result failure:',response.status_code, response.reason)
-        print('Text:', response.text)
-        return response.status_code, None
-    
-
-
-def join_chatroom(access_token, room_id=None, room_is_managed=False):  # Join chatroom
-    joined_rooms = []
-    if room_is_managed:
-        url = '{}{}/managed_chatrooms/{}/join'.format(
-            gw_url, bot_api_base_path, room_id)
-    else:
-        url = '{}{}/chatrooms/{}/join'.format(gw_url,
-                                              bot_api_base_path, room_id)
-
-    response = None
-    try:
-        # Send a HTTP request message with Python requests module
-        response = requests.post(
-            url, headers={'Authorization': 'Bearer {}'.format(access_token)})
-    except requests.exceptions.RequestException as e:
-        logging.error('Messenger BOT API: join chatroom exception failure: %s' % e)
-
-    if response.status_code == 200:  # HTTP Status 'OK'
-        joined_rooms.append(room_id)
-        print('Messenger BOT API: join chatroom success')
-        logging.info('Receive: %s' % (json.dumps(response.json(),sort_keys=True, indent=2, separators=(',', ':'))))
-    else:
-        print('Messenger BOT API: join chatroom result failure:',
-              response.status_code, response.reason)
-        print('Text:', response.text)
-
-    return joined_rooms
-
-
-# send 1 to 1 message to recipient email directly without a Chatroom via BOT
-def post_direct_message(access_token, contact_email='', text=''):
-    url = '{}{}/message'.format(gw_url, bot_api_base_path)
-
-    body = {
-        'recipientEmail': contact_email,
-        'message': text
-    }
-
-    # Print for debugging purpose
-    logging.info('Sent: %s' % (json.dumps(body, sort_keys=True, indent=2, separators=(',', ':'))))
-
-    try:
-        # Send a HTTP request message with Python requests module
-        response = requests.post(
-            url=url, data=json.dumps(body), headers={'Authorization': 'Bearer {}'.format(access_token)})
-    except requests.exceptions.RequestException as e:
-        logging.error('Messenger BOT API: post a 1 to 1 message exception failure: %s ' % e)
-
-    if response.status_code == 200:  # HTTP Status 'OK'
-        print('Messenger BOT API: post a 1 to 1 message to %s success' %
-              (contact_email))
-        logging.info('Receive: %s' % (json.dumps(response.json(),sort_keys=True, indent=2, separators=(',', ':'))))
-    else:
-        print('Messenger BOT API: post a 1 to 1 message failure:',
-              response.status_code, response.reason)
-        print('Text:', response.text)
-
-
-# Posting Messages to a Chatroom via HTTP REST
-def post_message_to_chatroom(access_token,  joined_rooms, room_id=None,  text='', room_is_managed=False):
-    if room_id not in joined_rooms:
-        joined_rooms = join_chatroom(access_token, room_id, room_is_managed)
-
-    if joined_rooms:
-        if room_is_managed:
-            url = '{}{}/managed_chatrooms/{}/post'.format(
-                gw_url, bot_api_base_path, room_id)
-        else:
-            url = '{}{}/chatrooms/{}/post'.format(
-                gw_url, bot_api_base_path, room_id)
-
-        body = {
-            'message': text
-        }
-
-        # Print for debugging purpose
-        logging.info('Sent: %s' % (json.dumps(body, sort_keys=True, indent=2, separators=(',', ':'))))
-
-        response = None
-        try:
-            # Send a HTTP request message with Python requests module
-            response = requests.post(
-                url=url, data=json.dumps(body), headers={'Authorization': 'Bearer {}'.format(access_token)})
-        except requests.exceptions.RequestException as e:
-            logging.error('Messenger BOT API: post message to exception failure: %s ' % e)
-
-        if response.status_code == 200:  # HTTP Status 'OK'
-            joined_rooms.append(room_id)
-            print('Messenger BOT API: post message to chatroom success')
-            # Print for debugging purpose
-            logging.info('Receive: %s' % (json.dumps(
-                response.json(), sort_keys=True, indent=2, separators=(',', ':'))))
-        else:
-            print('Messenger BOT API: post message to failure:',
-                  response.status_code, response.reason)
-            print('Text:', response.text)
-    pass
-
-
-# Leave a joined Chatroom
-def leave_chatroom(access_token, joined_rooms, room_id=None, room_is_managed=False):
-
-    if room_id in joined_rooms:
-        if room_is_managed:
-            url = '{}{}/managed_chatrooms/{}/leave'.format(
-                gw_url, bot_api_base_path, room_id)
-        else:
-            url = '{}{}/chatrooms/{}/leave'.format(
-                gw_url, bot_api_base_path, room_id)
-
-        response = None
-        try:
-            # Send a HTTP request message with Python requests module
-            response = requests.post(
-                url, headers={'Authorization': 'Bearer {}'.format(access_token)})
-        except requests.exceptions.RequestException as e:
-            logging.error('Messenger BOT API: leave chatroom exception failure: %s' % e)
-
-        if response.status_code == 200:  # HTTP Status 'OK'
-            print('Messenger BOT API: leave chatroom success')
-            logging.info('Receive: %s' % (json.dumps(response.json(), sort_keys=True, indent=2, separators=(',', ':'))))
-        else:
-            print('Messenger BOT API: leave chatroom failure:',
-                  response.status_code, response.reason)
-            print('Text:', response.text)
-
-        joined_rooms.remove(room_id)
-
-    return joined_rooms
+# Market data table posted by the demo: title, column keys and header labels, rows and number formats.
+# The (up)/(dn) markers of Fair Value are part of the data, as published
+assessment_title = 'USD BBL EU AM Assessment at 11:30 UKT'
+assessment_columns = ['Name', 'Asmt', 'Asmt Time', 'Fair Value', 'Fair Value Time', 'Hst Cls']
+assessment_header = ['Name', 'Asmt', '10-Apr-19', 'Fair Value', '10-Apr-19', 'Hst Cls']
+assessment_rows = [
+    ['BRT Sw APR19', 70.58, '05:07', '(up) 71.04', '10:58', 70.58],
+    ['BRTSw MAY19', 70.13, '05:07', '(dn) 70.59', '10:58', 70.14],
+    ['BRT Sw JUN19', 69.75, '05:07', '(up)70.2', '10:58', 69.76]
+]
+assessment_formats = {'Asmt': '.2f', 'Hst Cls': '.2f'}
 
 # =============================== WebSocket functions ========================================
 
 
-def on_message(_, message):  # Called when message received, parse message into JSON for processing
-    message_json = json.loads(message)
-    logging.debug('Received: %s' % (json.dumps(message_json, sort_keys=True, indent=2, separators=(',', ':'))))
-    process_message(message_json)
+# Chatroom bot logger
+logger = get_logger('bot')
 
+# Chatroom commands, the command name and its aliases are case-insensitive
+router = CommandRouter()
+response_cache = ResponseCache()
 
-def on_error(_, error):  # Called when websocket error has occurred
-    logging.error('Error: %s' % (error))
 
+# Reply to the Chatroom the event came from
+def event_chatroom_id(message_json):
+    return message_json.get('chatroomId', chatroom_id)
 
-def on_close(_, close_status_code, close_msg):  # Called when websocket is closed
-    logging.error('Receive: onclose event. WebSocket Connection Closed')
-    leave_chatroom(access_token, joined_rooms, chatroom_id)
-    # Abort application
-    sys.exit("Abort application")
 
+@router.command('/help', 'C1', 'C2', 'C3')
+async def help_command(runtime, message_json, args):
+    await runtime.post_message_to_chatroom(event_chatroom_id(message_json), 'What would you like help with?\n ')
 
-def on_open(_):  # Called when handshake is complete and websocket is open, send login
-    logging.info('Receive: onopen event. WebSocket Connection is established')
-    send_ws_connect_request(access_token)
 
-# For the environment that needs a ping-pong message only
-def on_ping(_, message):
-    print("Got a ping! A pong reply has already been automatically sent.")
+# Market data table message, rendered once per complex_message_ttl seconds (read at each call, so it can be
+# changed at run time). Call complex_message_text.invalidate() when assessment_rows change
+@response_cache.cached('/complex_message', lambda: complex_message_ttl)
+def complex_message_text():
+    table = render_table(assessment_rows, assessment_columns, assessment_formats, title=assessment_title,
+                         header=assessment_header)
+    # Keep the leading and trailing lines of the message the demo has always sent
+    return '\n                %s\n                ' % (table)
 
-# For the environment that needs a ping-pong message only
-def on_pong(_, message):
-    print("Got a pong! No need to respond")
 
+# Sending tabular data, hyperlinks and a full set of emoji in a message to a Chatroom
+@router.command('/complex_message')
+async def complex_message_command(runtime, message_json, args):
+    complex_msg = await complex_message_text()
+    await runtime.post_message_to_chatroom(event_chatroom_id(message_json), complex_msg)
 
-# Send a connection request to Messenger ChatBot API WebSocket server
-def send_ws_connect_request(access_token):
 
-    # create connection request message in JSON format
-    connect_request_msg = {
-        'reqId': str(random.randint(0, 1000000)),
-        'command': 'connect',
-        'payload': {
-            'stsToken': access_token
-        }
-    }
-    try:
-        web_socket_app.send(json.dumps(connect_request_msg))
-    except Exception as error:
-        #print('send_ws_connect_request Exception:', error)
-        logging.error('send_ws_connect_request exception: %s' % (error))
+# Receive 'Hello' message, get sender email address and say hello back
+@router.command('hello')
+async def hello_command(runtime, message_json, args):
+    sender = message_json['post']['sender']['email']
+    await runtime.post_message_to_chatroom(event_chatroom_id(message_json), 'Hello %s\n ' % (sender))
 
-    logging.info('Sent: %s' % (json.dumps(connect_request_msg, sort_keys=True, indent=2, separators=(',', ':'))))
 
+# Inbound queue classifier: WebSocket control events and the messages of registered commands
+def is_command_event(message_json):
+    if message_json.get('event') != 'chatroomPost':
+        return True
+    command, _ = router.resolve(str(message_json.get('post', {}).get('message', '')))
+    return command is not None
 
-# Function for Refreshing Tokens.  Auth Tokens need to be refreshed within 5 minutes for the WebSocket to persist
-def send_ws_keepalive(access_token):
 
-    # create connection request message in JSON format
-    connect_request_msg = {
-        'reqId': str(random.randint(0, 1000000)),
-        'command': 'authenticate',
-        'payload': {
-            'stsToken': access_token
-        }
-    }
-    try:
-        web_socket_app.send(json.dumps(connect_request_msg))
-    except Exception as error:
-        #print('send_ws_connect_request Exception :', error)
-        logging.error('send_ws_connect_request exception: %s' % (error))
-    
-    logging.info('Sent: %s' % (json.dumps(connect_request_msg, sort_keys=True, indent=2, separators=(',', ':'))))
-
-
-def process_message(message_json):  # Process incoming message from a joined Chatroom
+async def process_message(runtime, message_json):  # Process incoming message from a joined Chatroom
 
     message_event = message_json['event']
 
@@ -302,125 +132,67 @@ def process_message(message_json):  # Process incoming message from a joined Cha
         try:
             incoming_msg = message_json['post']['message']
             print('Receive text message: %s' % (incoming_msg))
-            if incoming_msg == '/help' or incoming_msg == 'C1' or incoming_msg == 'C2' or incoming_msg == 'C3':
-                post_message_to_chatroom(
-                    access_token, joined_rooms, chatroom_id, 'What would you like help with?\n ')
-            # Sending tabular data, hyperlinks and a full set of emoji in a message to a Chatroom
-            elif incoming_msg.lower() == '/complex_message':
-                complex_msg = """
-                USD BBL EU AM Assessment at 11:30 UKT\nName\tAsmt\t10-Apr-19\tFair Value\t10-Apr-19\tHst Cls\nBRT Sw APR19\t70.58\t05:07\t(up) 71.04\t10:58\t70.58\nBRTSw MAY19\t70.13\t05:07\t(dn) 70.59\t10:58\t70.14\nBRT Sw JUN19\t69.75\t05:07\t(up)70.2\t10:58\t69.76
-                """
-                post_message_to_chatroom(
-                    access_token, joined_rooms, chatroom_id, complex_msg)
-            # Receive 'Hello' message, get sender email address and say hello back
-            elif incoming_msg.lower() == 'hello':
-                sender = message_json['post']['sender']['email']
-                post_message_to_chatroom(
-                    access_token, joined_rooms, chatroom_id, 'Hello %s\n ' % (sender))
+            await router.dispatch(runtime, message_json, incoming_msg)
 
         except Exception as error:
-            logging.error('Post meesage to a Chatroom fail : %s' % error)
+            logger.error('Post meesage to a Chatroom fail : %s', error)
 
 
 # =============================== Main Process ========================================
-# Running the tutorial
-if __name__ == '__main__':
-
-    # Setting Python Logging
-    logging.basicConfig(format='%(asctime)s: %(levelname)s:%(name)s :%(message)s', level=log_level, datefmt='%Y-%m-%d %H:%M:%S')
-
-    print('Getting RDP Authentication Token')
-
-    # Create and initiate RDPTokenManagement object
-    rdp_token = RDPTokenManagement(bot_username, bot_password, app_key, 30)
-
-    # Authenticate with RDP Token service
-    access_token, refresh_token, expire_time, logged_in = authen_rdp(rdp_token)
-    # if not auth_token:
-    if not access_token:
-        # Abort application
-        sys.exit(1)
-
-    print('Successfully Authenticated ')
-
-    # Send 1 to 1 message to reipient without a chat room
-    print('send 1 to 1 message to %s ' % (recipient_email))
-    post_direct_message(access_token, recipient_email, 'Hello from Python')
 
-    # List associated Chatrooms
-    print('Get Rooms ')
-    status, chatroom_respone = list_chatrooms(access_token)
-
-    if not chatroom_respone:
+async def main():
+    global chatroom_id
+
+    # Create the bot session: RDPTokenManagement object, asyncio runtime, Chatroom membership and handlers.
+    # Add more bot identities to a BotHost object to run them in this process with a shared connection pool.
+    message_handler = process_message
+    sharding = None
+    if event_worker_processes > 0:
+        # CPU-heavy command handlers run in worker processes, replies are sent by this process.
+        # Optional features import their modules when enabled, so they do not slow down the startup
+        from event_sharding import ShardedEventProcessor
+        sharding = ShardedEventProcessor(process_message, event_worker_processes)
+        message_handler = sharding.message_handler
+    outbox = None
+    if outbox_database is not None:
+        from outbox import SQLiteOutbox
+        outbox = SQLiteOutbox(outbox_database)
+    session = BotSession(bot_username, bot_password, app_key, message_handler, [chatroom_name], recipient_email,
+                         ws_url, gw_url, bot_api_base_path, outbox=outbox)
+    if sharding is not None:
+        session.runtime.close_callbacks.append(sharding.close)
+    session.runtime.outbound.coalesce_window = outbound_coalesce_window
+    session.runtime.inbound_queue = InboundQueue(inbound_queue_size, inbound_overflow_policy, is_command_event)
+
+    # Authenticate with RDP Token service, send 1 to 1 message, then list and join associated Chatroom.
+    # The WebSocket connection is opened while the Chatroom is listed and joined
+    if not await session.start(connect=True):
+        await session.close()
         # Abort application
         sys.exit(1)
 
-    #print(json.dumps(chatroom_respone, sort_keys=True,indent=2, separators=(',', ':')))
+    chatroom_id = session.runtime.directory.chatroom_id(chatroom_name)
 
-    #chatroom_id = chatroom_respone['chatrooms'][0]['chatroomId']
-    for room in chatroom_respone['chatrooms']:
-        if room['name'] == chatroom_name:
-            chatroom_id = room['chatroomId']
-    #print('Chatroom ID is ', chatroom_id)
+    # Connect to a Chatroom via a WebSocket connection, the event loop runs the stream, REST calls and token refresh.
+    # A lost connection is re-established, run() only returns when the bot gives up reconnecting
+    await session.run()
+    # Abort application
+    sys.exit("Abort application")
 
-    # Join associated Chatroom
-    print('Join Rooms ')
-    joined_rooms = join_chatroom(access_token, chatroom_id)
-    # print('joined_rooms is ', joined_rooms)
 
-    if not joined_rooms:
-        # Abort application
-        sys.exit(1)
+# Running the tutorial
+if __name__ == '__main__':
 
-    # Connect to a Chatroom via a WebSocket connection
-    print('Connecting to WebSocket %s ... ' % (ws_url))
-    #websocket.enableTrace(True)
-    web_socket_app = websocket.WebSocketApp(
-        ws_url,
-        on_message=on_message,
-        on_error=on_error,
-        on_close=on_close,
-        on_open=on_open,
-        subprotocols=['messenger-json'])
-    # Event loop
-    wst = threading.Thread(
-        target=web_socket_app.run_forever,
-        kwargs={'sslopt': {'check_hostname': False}})
-    
-    # # For the environment that needs a ping-pong message only
-    # web_socket_app = websocket.WebSocketApp(ws_url,
-    #     on_message=on_message,
-    #     on_error=on_error,
-    #     on_close=on_close,
-    #     on_open=on_open,
-    #     on_ping=on_ping,
-    #     on_pong=on_pong,
-    #     subprotocols=['messenger-json'])
-    # # Event loop
-    # wst = threading.Thread(target=web_socket_app.run_forever, kwargs={"sslopt": {"check_hostname": False}, "ping_interval": 60, "ping_timeout": 10, "ping_payload": "2"})
-    wst.daemon = True
-    wst.start()
+    # Setting Python Logging
+    logging.basicConfig(format='%(asctime)s: %(levelname)s:%(name)s :%(message)s', level=log_level, datefmt='%Y-%m-%d %H:%M:%S')
+    set_payload_format(log_compact_json, log_max_payload)
+    if metrics_port is not None:
+        bot_metrics.start_exporter(metrics_port)
 
     try:
-        while True:
-            # Give 60 seconds to obtain the new security token and send reissue
-            #logging.debug('expire_time = %s' %(expire_time))
-            if int(expire_time) > 60: 
-                #The current RDP expires_time is 600 seconds (10 minutes). However, the Messenger Bot WebSocket server still uses 300 seconds (5 minutes).
-                expire_time = '300'
-                time.sleep(int(expire_time) - 60) 
-            else:
-                # Fail the refresh since value too small
-                # Abort application
-                sys.exit(1)
-
-            print('Refresh Token ')
-            access_token, refresh_token, expire_time, logged_in = authen_rdp(rdp_token)
-            if not access_token:
-                # Abort application
-                sys.exit(1)
-            # Update authentication token to the WebSocket connection.
-            if logged_in:
-                send_ws_keepalive(access_token)
+        asyncio.run(main())
     except KeyboardInterrupt:
-        web_socket_app.close()
+        pass
+    finally:
+        # Close the pooled Messenger BOT API connections once the session is closed
+        close_messenger_clients()
@@ -0,0 +1,101 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |        Refinitiv Messenger BOT API chatroom directory (name/id cache)     --
+# |-----------------------------------------------------------------------------
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bot_logging import get_logger
+
+# Chatroom directory logger
+logger = get_logger('directory')
+
+
+class ChatroomDirectory:
+    """
+    Cache of the bot's chatrooms and managed chatrooms, indexed by name and by chatroomId.
+
+    Lookups are dictionary reads and never call the Messenger BOT API. Call refresh() to reload the
+    indexes, is_stale() tells when the ttl has passed.
+    """
+
+    # Seconds before the cached chatroom list should be refreshed
+    ttl = 300
+    # List the managed chatrooms as well as the chatrooms
+    include_managed = True
+
+    def __init__(self, messenger_client, token_provider, ttl=None, include_managed=None):
+        self.messenger_client = messenger_client
+        # Callable returning the current access token
+        self.token_provider = token_provider
+        if ttl is not None:
+            self.ttl = ttl
+        if include_managed is not None:
+            self.include_managed = include_managed
+
+        # Chatroom lists by room_is_managed, kept when a refresh of that list fails
+        self._rooms = {False: [], True: []}
+        self._by_name = {}
+        self._by_id = {}
+        self.updated = 0.0
+
+    def is_stale(self):
+        return time.monotonic() - self.updated >= self.ttl
+
+    # Reload chatrooms (and managed chatrooms) from Messenger BOT API, return True if the chatroom list succeeded.
+    # The managed chatrooms are listed in a thread of their own while this thread lists the chatrooms
+    def refresh(self):
+        access_token = self.token_provider()
+        if self.include_managed:
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix='directory') as executor:
+                managed = executor.submit(self.messenger_client.list_chatrooms, access_token, True)
+                status, response = self.messenger_client.list_chatrooms(access_token)
+                managed_status, managed_response = managed.result()
+            if managed_status == 200 and managed_response:
+                self._rooms[True] = managed_response.get('chatrooms', [])
+        else:
+            status, response = self.messenger_client.list_chatrooms(access_token)
+        if status == 200 and response:
+            self._rooms[False] = response.get('chatrooms', [])
+
+        by_name = {}
+        by_id = {}
+        for room_is_managed in (True, False):
+            for room in self._rooms[room_is_managed]:
+                entry = dict(room, isManaged=room_is_managed)
+                # Normal chatrooms win a name clash, as the demos look up chatrooms by name
+                by_name[room.get('name')] = entry
+                by_id[room.get('chatroomId')] = entry
+        # Swap the indexes at once, so readers never see a half built directory
+        self._by_name, self._by_id = by_name, by_id
+        self.updated = time.monotonic()
+        logger.debug('Chatroom directory refreshed with %d chatrooms', len(by_id))
+        return status == 200
+
+    def get_by_name(self, name):
+        return self._by_name.get(name)
+
+    def get_by_id(self, room_id):
+        return self._by_id.get(room_id)
+
+    # Return the chatroomId of a chatroom name, or None
+    def chatroom_id(self, name):
+        room = self._by_name.get(name)
+        return room['chatroomId'] if room else None
+
+    def is_managed(self, room_id):
+        room = self._by_id.get(room_id)
+        return room['isManaged'] if room else False
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, room_id):
+        return room_id in self._by_id
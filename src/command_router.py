@@ -0,0 +1,107 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |          Refinitiv Messenger BOT API chatroom command router              --
+# |-----------------------------------------------------------------------------
+
+import inspect
+import shlex
+import time
+
+import bot_metrics
+
+
+class Command:
+    def __init__(self, name, handler, aliases=(), help_text=''):
+        self.name = name
+        self.handler = handler
+        self.aliases = tuple(aliases)
+        self.help_text = help_text
+
+
+class CommandRouter:
+    """
+    Dispatch chatroom messages to registered command handlers with a single dict lookup.
+
+    The first word of a message is the command and the remaining words are its arguments. A name without
+    a leading '/' (hello, C1) is a keyword: it only matches a message made of the keyword alone, so chatter
+    starting with the word is not a command. Command names and aliases are case-insensitive. Register a
+    handler with the decorator:
+
+        router = CommandRouter()
+
+        @router.command('/help', 'C1', 'C2', 'C3', help_text='Show help')
+        async def help_command(runtime, message_json, args):
+            ...
+    """
+
+    def __init__(self):
+        # Lower case command name or alias -> Command
+        self._commands = {}
+
+    @staticmethod
+    def normalize(name):
+        return name.strip().lower()
+
+    # Register handler for a command name and its aliases
+    def add_command(self, name, handler, aliases=(), help_text=''):
+        command = Command(name, handler, aliases, help_text)
+        for key in (name,) + tuple(aliases):
+            key = self.normalize(key)
+            if key in self._commands:
+                raise ValueError('Command %s is already registered' % (key))
+            self._commands[key] = command
+        return command
+
+    # Decorator form of add_command
+    def command(self, name, *aliases, help_text=''):
+        def decorator(handler):
+            self.add_command(name, handler, aliases, help_text)
+            return handler
+        return decorator
+
+    # Registered commands, without aliases
+    def commands(self):
+        unique = {}
+        for command in self._commands.values():
+            unique[command.name] = command
+        return list(unique.values())
+
+    # Split the command arguments, honoring quotes when they are balanced
+    @staticmethod
+    def parse_args(text):
+        try:
+            return shlex.split(text)
+        except ValueError:
+            return text.split()
+
+    # Return the Command and its argument list for a message, or (None, None) if it is not a command
+    def resolve(self, message):
+        parts = message.strip().split(None, 1)
+        if not parts:
+            return None, None
+        command = self._commands.get(parts[0].lower())
+        if command is None or (len(parts) > 1 and not parts[0].startswith('/')):
+            return None, None
+        return command, self.parse_args(parts[1]) if len(parts) > 1 else []
+
+    # Run the command handler for a message, return True if the message was a command
+    async def dispatch(self, runtime, message_json, message):
+        command, args = self.resolve(message)
+        if command is None:
+            return False
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = command.handler(runtime, message_json, args)
+            if inspect.isawaitable(result):
+                await result
+            outcome = 'ok'
+        finally:
+            bot_metrics.command_seconds.observe(time.perf_counter() - start, command.name, outcome)
+        return True
@@ -0,0 +1,134 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |     Refinitiv Messenger BOT API bulk 1 to 1 message broadcast             --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import os
+
+import json_codec
+from bot_logging import get_logger
+
+# Broadcast logger
+logger = get_logger('broadcast')
+
+
+class BroadcastReport:
+    # Delivery result of each recipient: HTTP status, None when the request failed without a response
+    def __init__(self):
+        self.results = {}
+        # Recipients delivered by a previous run and skipped by this one
+        self.skipped = set()
+
+    def add(self, email, status):
+        self.results[email] = status
+
+    def delivered(self):
+        return [email for email, status in self.results.items() if status == 200]
+
+    def failed(self):
+        return {email: status for email, status in self.results.items() if status != 200}
+
+    def summary(self):
+        return {'delivered': len(self.delivered()), 'failed': len(self.failed()), 'skipped': len(self.skipped)}
+
+
+class DirectMessageBroadcast:
+    """
+    Send a 1 to 1 message to many recipients concurrently through a BotRuntime.
+
+    The messages go through the runtime outbound scheduler, so the bot rate limit and the HTTP 429/5xx
+    retries apply, over the shared Messenger BOT API connection pool. At most max_concurrency messages
+    are waiting at a time, so a large recipient list is not queued at once.
+
+        broadcast = DirectMessageBroadcast(runtime, journal_file='./alert-journal.jsonl')
+        report = await broadcast.send(recipients, 'Hello {first_name}, {alert}')
+
+    With journal_file, every delivery is appended to the journal as a JSON line, and send(..., resume=True)
+    skips the recipients already delivered by a previous, interrupted run.
+    """
+
+    max_concurrency = 50
+
+    def __init__(self, runtime, max_concurrency=None, journal_file=None):
+        self.runtime = runtime
+        if max_concurrency is not None:
+            self.max_concurrency = max_concurrency
+        self.journal_file = journal_file
+
+    # Recipients delivered according to the journal file
+    def load_journal(self):
+        delivered = set()
+        if self.journal_file is None or not os.path.exists(self.journal_file):
+            return delivered
+        with open(self.journal_file, 'rb') as journal:
+            for line in journal:
+                try:
+                    entry = json_codec.loads(line)
+                except ValueError:
+                    # Last line of an interrupted run
+                    continue
+                if entry.get('status') == 200:
+                    delivered.add(entry['email'])
+        return delivered
+
+    # Email and message text of a recipient: an email string, or a dict with an 'email' item and template fields
+    @staticmethod
+    def render(recipient, message):
+        if isinstance(recipient, dict):
+            email = recipient['email']
+            fields = recipient
+        else:
+            email = recipient
+            fields = {'email': recipient}
+        if callable(message):
+            return email, message(recipient)
+        return email, message.format(**fields)
+
+    async def _worker(self, recipients, message, report, skip, journal):
+        for recipient in recipients:
+            email = recipient.get('email') if isinstance(recipient, dict) else recipient
+            if email in skip:
+                report.skipped.add(email)
+                continue
+            # A bad recipient or template field fails this recipient only, the broadcast goes on
+            try:
+                email, text = self.render(recipient, message)
+                status, _ = await self.runtime.post_direct_message(email, text)
+            except Exception as error:
+                logger.error('Broadcast to %s exception: %r', email, error)
+                status = None
+            report.add(email, status)
+            if journal is not None:
+                journal.write(json_codec.dumps_bytes({'email': email, 'status': status}) + b'\n')
+
+    # Send message to every recipient, return a BroadcastReport.
+    # message is a str.format template of the recipient fields, or a callable(recipient) returning the text
+    async def send(self, recipients, message, resume=False):
+        report = BroadcastReport()
+        skip = self.load_journal() if resume else set()
+        journal = None
+        if self.journal_file is not None:
+            journal = open(self.journal_file, 'ab' if resume else 'wb', buffering=0)
+        # The workers share one iterator, so the recipients are read as they are sent
+        recipients = iter(recipients)
+        try:
+            await asyncio.gather(*[self._worker(recipients, message, report, skip, journal)
+                                   for _ in range(self.max_concurrency)])
+        finally:
+            if journal is not None:
+                journal.close()
+        logger.info('Broadcast %s', report.summary())
+        return report
+
+
+# Send message to every recipient with a DirectMessageBroadcast, return a BroadcastReport
+async def broadcast_direct_message(runtime, recipients, message, max_concurrency=None, journal_file=None,
+                                   resume=False):
+    return await DirectMessageBroadcast(runtime, max_concurrency, journal_file).send(recipients, message, resume)
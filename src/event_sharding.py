@@ -0,0 +1,190 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |   Refinitiv Messenger BOT API chatroom event sharding to worker processes --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import threading
+
+from bot_logging import get_logger
+
+# Event sharding logger
+logger = get_logger('sharding')
+
+
+class ConsistentHashRing:
+    # Map keys to nodes, adding or removing a node only moves the keys of that node
+    def __init__(self, nodes, replicas=100):
+        self.replicas = replicas
+        self._hashes = []
+        self._nodes = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        # A stable hash, unlike hash() it does not change between interpreter runs
+        return int.from_bytes(hashlib.md5(str(key).encode('utf-8')).digest()[:8], 'big')
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            point = self._hash('%s#%d' % (node, replica))
+            index = bisect.bisect(self._hashes, point)
+            self._hashes.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove(self, node):
+        for index in reversed(range(len(self._nodes))):
+            if self._nodes[index] == node:
+                del self._hashes[index]
+                del self._nodes[index]
+
+    def get(self, key):
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+class ReplyCollector:
+    # Stand-in for BotRuntime inside a worker process, records the replies of a message handler
+    def __init__(self):
+        self.replies = []
+
+    async def post_message_to_chatroom(self, room_id, text, room_is_managed=None):
+        self.replies.append(('chatroom', room_id, text))
+
+    async def post_direct_message(self, contact_email, text):
+        self.replies.append(('recipient', contact_email, text))
+
+
+# Worker process: run message_handler(runtime, message_json) for each event of its chatrooms, in order
+def _shard_worker(message_handler, events, results):
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            item = events.get()
+            if item is None:
+                break
+            runtime_id, message_json = item
+            collector = ReplyCollector()
+            try:
+                loop.run_until_complete(message_handler(collector, message_json))
+            except Exception as error:
+                logger.error('Process message fail : %s', error)
+            for reply in collector.replies:
+                results.put((runtime_id,) + reply)
+    finally:
+        loop.close()
+
+
+class ShardedEventProcessor:
+    """
+    Run the chatroomPost message handler in worker processes, so CPU-heavy commands use every core.
+
+    Events are routed to a worker by consistent hashing on chatroomId: the events of a chatroom are
+    handled by one worker, in order. message_handler has the usual (runtime, message_json) signature,
+    it must be a module level function and its runtime argument only supports post_message_to_chatroom
+    and post_direct_message. The replies come back to the bot process and are sent, in order per
+    chatroom, by the BotRuntime outbound scheduler.
+    """
+
+    worker_processes = 4
+
+    def __init__(self, message_handler, worker_processes=None, local_handler=None):
+        self.message_handler = message_handler
+        # Coroutine function for the events that are not chatroomPost, run in the bot process
+        self.local_handler = local_handler
+        if worker_processes is not None:
+            self.worker_processes = worker_processes
+        self._context = multiprocessing.get_context('spawn')
+        self._ring = ConsistentHashRing(range(self.worker_processes))
+        self._event_queues = []
+        self._processes = []
+        self._results = None
+        self._reader = None
+        self._loop = None
+        # BotRuntime objects by id, replies carry the id of the runtime that received the event
+        self._runtimes = {}
+        # Last posting task of each chatroom, the next reply waits for it to keep the order
+        self._room_tails = {}
+
+    def start(self):
+        if self._processes:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._results = self._context.Queue()
+        for _ in range(self.worker_processes):
+            events = self._context.Queue()
+            process = self._context.Process(target=_shard_worker, args=(self.message_handler, events, self._results),
+                                            daemon=True)
+            process.start()
+            self._event_queues.append(events)
+            self._processes.append(process)
+        self._reader = threading.Thread(target=self._read_results, name='shard-results', daemon=True)
+        self._reader.start()
+
+    # BotRuntime message_handler: route chatroomPost events to their worker process
+    async def message_handler(self, runtime, message_json):
+        if message_json.get('event') != 'chatroomPost':
+            if self.local_handler is not None:
+                await self.local_handler(runtime, message_json)
+            return
+        self.start()
+        self._runtimes[id(runtime)] = runtime
+        shard = self._ring.get(message_json.get('chatroomId'))
+        self._event_queues[shard].put((id(runtime), message_json))
+
+    def _read_results(self):
+        while True:
+            reply = self._results.get()
+            if reply is None:
+                break
+            self._loop.call_soon_threadsafe(self._post_reply, reply)
+
+    def _post_reply(self, reply):
+        runtime_id, kind, target, text = reply
+        runtime = self._runtimes.get(runtime_id)
+        if runtime is None:
+            return
+        key = (runtime_id, kind, target)
+        previous = self._room_tails.get(key)
+        task = self._loop.create_task(self._post_after(previous, runtime, kind, target, text))
+        self._room_tails[key] = task
+        task.add_done_callback(lambda done: self._room_tails.pop(key, None) if self._room_tails.get(key) is done
+                               else None)
+
+    async def _post_after(self, previous, runtime, kind, target, text):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        if kind == 'chatroom':
+            await runtime.post_message_to_chatroom(target, text)
+        else:
+            await runtime.post_direct_message(target, text)
+
+    # Stop the worker processes once they have handled their events, then wait for the pending replies
+    async def close(self):
+        if not self._processes:
+            return
+        for events in self._event_queues:
+            events.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join)
+        self._results.put(None)
+        await loop.run_in_executor(None, self._reader.join)
+        # Let the replies scheduled by the reader thread start before waiting for them
+        await asyncio.sleep(0)
+        if self._room_tails:
+            await asyncio.gather(*list(self._room_tails.values()), return_exceptions=True)
+        self._processes = []
+        self._event_queues = []
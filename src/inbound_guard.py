@@ -0,0 +1,110 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |   Refinitiv Messenger BOT API inbound event deduplication and ordering    --
+# |-----------------------------------------------------------------------------
+
+import collections
+
+import bot_metrics
+from bot_logging import get_logger
+
+# Inbound guard logger
+logger = get_logger('inbound')
+
+
+class EventDeduplicator:
+    # Bounded LRU of the event ids already seen, constant memory and O(1) lookups
+    capacity = 10000
+
+    def __init__(self, capacity=None):
+        if capacity is not None:
+            self.capacity = capacity
+        self._seen = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._seen)
+
+    # Return True if key was seen before, remember it otherwise
+    def seen(self, key):
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            return True
+        self._seen[key] = None
+        if len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+        return False
+
+
+# Return (chatroomId, post id) of a chatroomPost event, or None when the event has no id
+def event_key(message_json):
+    post = message_json.get('post')
+    if not isinstance(post, dict):
+        return None
+    post_id = post.get('messageId') or post.get('postId')
+    if post_id is None:
+        return None
+    return message_json.get('chatroomId', post.get('chatroomId')), post_id
+
+
+class InboundGuard:
+    """
+    Filter the WebSocket events before the message handlers run.
+
+    A chatroomPost event is dropped when its post id was seen already, for example when it is received
+    again after a reconnection, or by another session of the process sharing the guard. The post
+    timestamps of each chatroom are checked: an event older than the last one of its chatroom is logged
+    and counted, and dropped with drop_out_of_order.
+    """
+
+    # Number of chatrooms whose last timestamp is kept
+    max_rooms = 1000
+    drop_out_of_order = False
+
+    def __init__(self, capacity=None, drop_out_of_order=None):
+        self.deduplicator = EventDeduplicator(capacity)
+        if drop_out_of_order is not None:
+            self.drop_out_of_order = drop_out_of_order
+        self._last_timestamps = collections.OrderedDict()
+        self.duplicates = 0
+        self.out_of_order = 0
+
+    # Return True if the event is in order for its chatroom, and remember its timestamp
+    def _check_order(self, room_id, timestamp):
+        last = self._last_timestamps.get(room_id)
+        self._last_timestamps[room_id] = timestamp if last is None else max(last, timestamp)
+        self._last_timestamps.move_to_end(room_id)
+        if len(self._last_timestamps) > self.max_rooms:
+            self._last_timestamps.popitem(last=False)
+        return last is None or timestamp >= last
+
+    # Return True if the event must be handled
+    def accept(self, message_json):
+        key = event_key(message_json)
+        if key is None:
+            return True
+        if self.deduplicator.seen(key):
+            self.duplicates += 1
+            bot_metrics.inbound_duplicates.inc()
+            logger.info('Drop duplicate event %s in chatroom %s', key[1], key[0])
+            return False
+
+        timestamp = message_json['post'].get('timestamp')
+        if timestamp is None:
+            return True
+        try:
+            in_order = self._check_order(key[0], timestamp)
+        except TypeError:
+            # Timestamps of different types cannot be compared
+            return True
+        if not in_order:
+            self.out_of_order += 1
+            bot_metrics.inbound_out_of_order.inc()
+            logger.warning('Event %s is older than the last event of chatroom %s', key[1], key[0])
+            return not self.drop_out_of_order
+        return True
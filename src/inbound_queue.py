@@ -0,0 +1,159 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |   Refinitiv Messenger BOT API bounded inbound event queue with shedding   --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import collections
+import time
+
+import bot_metrics
+from bot_logging import get_logger
+
+# Inbound queue logger
+logger = get_logger('inbound')
+
+# Overflow policies
+DROP_OLDEST = 'drop_oldest'
+DROP_CHATTER = 'drop_chatter'
+PRIORITIZE_COMMANDS = 'prioritize_commands'
+POLICIES = (DROP_OLDEST, DROP_CHATTER, PRIORITIZE_COMMANDS)
+
+
+# Default command classifier: events that are not chatroomPost, and posts starting with '/'
+def is_command_event(message_json):
+    if message_json.get('event') != 'chatroomPost':
+        return True
+    post = message_json.get('post') or {}
+    return str(post.get('message', '')).lstrip().startswith('/')
+
+
+class InboundQueue:
+    """
+    Bounded queue between the WebSocket receive loop and the message handler workers.
+
+    put_nowait() never blocks the receive loop: when maxsize events are waiting, the overflow policy
+    sheds one event.
+
+    - drop_oldest: drop the oldest waiting event.
+    - drop_chatter: drop a chatroom post that is not a command, the new one or the oldest waiting one,
+      and the oldest event only when every waiting event is a command.
+    - prioritize_commands: commands are handled before the other events, and the oldest other event is
+      dropped first. When only commands are waiting, new chatter is dropped and a new command drops the
+      oldest command.
+
+    is_command(message_json) tells commands from chatter, lag() is the age of the oldest waiting event
+    and dropped counts the dropped events by kind ('command' or 'chatter').
+    """
+
+    maxsize = 1000
+    policy = DROP_OLDEST
+
+    def __init__(self, maxsize=None, policy=None, is_command=None):
+        if maxsize is not None:
+            self.maxsize = maxsize
+        if policy is not None:
+            self.policy = policy
+        if self.policy not in POLICIES:
+            raise ValueError('Unknown inbound overflow policy %s' % (self.policy))
+        self.is_command = is_command or is_command_event
+        # (enqueue time, is command, message_json): _commands is only used by prioritize_commands
+        self._commands = collections.deque()
+        self._events = collections.deque()
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self._not_empty = asyncio.Event()
+        self.dropped = {'command': 0, 'chatter': 0}
+        # Queue lag of the last event handed to a worker
+        self.last_lag = 0.0
+
+    def qsize(self):
+        return len(self._commands) + len(self._events)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def full(self):
+        return 0 < self.maxsize <= self.qsize()
+
+    # Seconds the oldest waiting event has been queued
+    def lag(self):
+        oldest = [queue[0][0] for queue in (self._commands, self._events) if queue]
+        return time.monotonic() - min(oldest) if oldest else 0.0
+
+    def drop_count(self):
+        return sum(self.dropped.values())
+
+    def _drop(self, item):
+        kind = 'command' if item[1] else 'chatter'
+        self.dropped[kind] += 1
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._finished.set()
+        bot_metrics.inbound_dropped.inc(self.policy, kind)
+        logger.warning('Inbound queue full (%d events), drop a %s event', self.qsize(), kind)
+
+    # Remove the oldest waiting chatter event, return it or None
+    def _pop_oldest_chatter(self):
+        for item in self._events:
+            if not item[1]:
+                self._events.remove(item)
+                return item
+        return None
+
+    # Make room for item, return False when item itself is dropped
+    def _shed(self, item):
+        if self.policy == DROP_OLDEST:
+            self._drop(self._events.popleft())
+        elif self.policy == DROP_CHATTER:
+            if not item[1]:
+                return False
+            dropped = self._pop_oldest_chatter()
+            self._drop(dropped if dropped is not None else self._events.popleft())
+        elif self._events:
+            self._drop(self._events.popleft())
+        elif not item[1]:
+            # Only commands are waiting: the new chatter is dropped, never a command
+            return False
+        else:
+            self._drop(self._commands.popleft())
+        return True
+
+    def put_nowait(self, message_json):
+        item = (time.monotonic(), self.is_command(message_json), message_json)
+        self._unfinished += 1
+        self._finished.clear()
+        if self.full() and not self._shed(item):
+            self._drop(item)
+            return
+        if self.policy == PRIORITIZE_COMMANDS and item[1]:
+            self._commands.append(item)
+        else:
+            self._events.append(item)
+        self._not_empty.set()
+
+    async def get(self):
+        while self.empty():
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        item = self._commands.popleft() if self._commands else self._events.popleft()
+        self.last_lag = time.monotonic() - item[0]
+        bot_metrics.inbound_lag_seconds.observe(self.last_lag)
+        return item[2]
+
+    def task_done(self):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._finished.set()
+
+    # Wait until every queued event has been handled or dropped
+    async def join(self):
+        if self._unfinished > 0:
+            await self._finished.wait()
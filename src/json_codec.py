@@ -0,0 +1,88 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |       JSON codec for the Messenger BOT API WebSocket and REST hot paths   --
+# |-----------------------------------------------------------------------------
+
+"""
+Compact JSON encoding/decoding with the fastest installed backend: orjson, then ujson, then the
+Python json module. Install orjson (pip install orjson) or ujson to use them, nothing else changes.
+
+- dumps_bytes(obj): UTF-8 JSON bytes, for HTTP request bodies.
+- dumps(obj): JSON str, for WebSocket text frames.
+- loads(data): parse str or bytes, so HTTP response bodies are parsed without decoding them first.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _stdlib_codec():
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def dumps(obj):
+        return encoder.encode(obj)
+
+    def dumps_bytes(obj):
+        return encoder.encode(obj).encode('utf-8')
+
+    return 'json', dumps, dumps_bytes, json.loads
+
+
+def _orjson_codec():
+    def dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+
+    return 'orjson', dumps, orjson.dumps, orjson.loads
+
+
+def _ujson_codec():
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False)
+
+    def dumps_bytes(obj):
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    return 'ujson', dumps, dumps_bytes, ujson.loads
+
+
+# Codec factories by backend name, in order of preference
+CODECS = {}
+if orjson is not None:
+    CODECS['orjson'] = _orjson_codec
+if ujson is not None:
+    CODECS['ujson'] = _ujson_codec
+CODECS['json'] = _stdlib_codec
+
+backend = None
+dumps = None
+dumps_bytes = None
+loads = None
+
+
+# Select the codec backend ('orjson', 'ujson' or 'json'), the fastest installed one by default
+def use_backend(name=None):
+    global backend, dumps, dumps_bytes, loads
+    if name is None:
+        name = next(iter(CODECS))
+    if name not in CODECS:
+        raise ValueError('JSON backend %s is not installed' % (name))
+    backend, dumps, dumps_bytes, loads = CODECS[name]()
+    return backend
+
+
+use_backend()
@@ -0,0 +1,92 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |   Micro-benchmark of the JSON codec backends on Messenger BOT API payloads --
+# |-----------------------------------------------------------------------------
+
+import sys
+import timeit
+
+import json_codec
+
+# WebSocket chatroomPost event
+chatroom_post_event = {
+    'event': 'chatroomPost',
+    'chatroomId': 'groupchat-dqs3xbqfd94a7kqx',
+    'post': {
+        'chatroomId': 'groupchat-dqs3xbqfd94a7kqx',
+        'message': '/complex_message',
+        'messageId': '2b1b5f4e-87e4-4a66-a1a5-2f4d8e7a3c51',
+        'sender': {
+            'email': 'trader.name@company.com',
+            'firstName': 'Trader',
+            'lastName': 'Name',
+            'userId': 'a0b1c2d3-e4f5-0617-2839-4a5b6c7d8e9f'
+        },
+        'timestamp': '2023-10-20T10:58:12.345Z'
+    },
+    'reqId': '943378'
+}
+
+# HTTP REST chatroom post request body with a market data table
+table_post_body = {
+    'message': 'USD BBL EU AM Assessment at 11:30 UKT\nName\tAsmt\t10-Apr-19\tFair Value\t10-Apr-19\tHst Cls\n'
+               + ''.join('BRT Sw M%02d\t70.%02d\t05:07\t(up) 71.04\t10:58\t70.58\n' % (i, i) for i in range(40))
+}
+
+# HTTP REST list chatrooms response
+list_chatrooms_response = {
+    'chatrooms': [{
+        'chatroomId': 'groupchat-%016x' % (i),
+        'name': 'Chatroom %d' % (i),
+        'description': 'Desk chatroom %d' % (i),
+        'type': 'group'
+    } for i in range(200)]
+}
+
+# WebSocket connect request
+connect_request = {
+    'reqId': '123456',
+    'command': 'connect',
+    'payload': {
+        'stsToken': 'eyJ0eXAiOiJhdCtqd3QiLCJhbGciOiJSUzI1NiJ9.' + 'x' * 1200
+    }
+}
+
+payloads = {
+    'chatroomPost event': chatroom_post_event,
+    'table post body': table_post_body,
+    'list chatrooms response': list_chatrooms_response,
+    'connect request': connect_request,
+}
+
+
+# Return microseconds per call of the encode (dumps_bytes) and decode (loads) of a payload
+def measure(payload, number):
+    encoded = json_codec.dumps_bytes(payload)
+    encode = min(timeit.repeat(lambda: json_codec.dumps_bytes(payload), number=number, repeat=5)) / number
+    decode = min(timeit.repeat(lambda: json_codec.loads(encoded), number=number, repeat=5)) / number
+    return encode * 1e6, decode * 1e6
+
+
+if __name__ == '__main__':
+
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    results = {}
+    for backend in json_codec.CODECS:
+        json_codec.use_backend(backend)
+        for name, payload in payloads.items():
+            results[(backend, name)] = measure(payload, number)
+
+    print('%-24s %-8s %12s %12s %10s' % ('payload', 'backend', 'encode us', 'decode us', 'speedup'))
+    for name in payloads:
+        baseline = sum(results[('json', name)])
+        for backend in json_codec.CODECS:
+            encode, decode = results[(backend, name)]
+            print('%-24s %-8s %12.2f %12.2f %9.1fx' % (name, backend, encode, decode, baseline / (encode + decode)))
+    json_codec.use_backend()
@@ -0,0 +1,204 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |       Refinitiv Messenger BOT API pooled, keep-alive HTTP REST client     --
+# |-----------------------------------------------------------------------------
+
+import requests
+import threading
+import time
+from requests.adapters import HTTPAdapter
+import bot_metrics
+import json_codec
+from bot_logging import LazyJson, get_logger
+
+# Messenger BOT API HTTP REST logger
+logger = get_logger('rest')
+
+# Shared clients, one per Messenger BOT API gateway
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class MessengerClient:
+    # Connection pool settings
+    pool_connections = 10
+    pool_maxsize = 10
+    max_retries = 0
+
+    # (connect, read) timeouts in seconds
+    timeout = (5, 30)
+    keep_alive = True
+
+    # Messenger BOT API Service Detail
+    gw_url = 'https://api.refinitiv.com'
+    bot_api_base_path = '/messenger/beta1'
+
+    def __init__(self, gw_url=None, bot_api_base_path=None, pool_connections=None, pool_maxsize=None,
+                 timeout=None, keep_alive=None, max_retries=None):
+        if gw_url is not None:
+            self.gw_url = gw_url
+        if bot_api_base_path is not None:
+            self.bot_api_base_path = bot_api_base_path
+        if pool_connections is not None:
+            self.pool_connections = pool_connections
+        if pool_maxsize is not None:
+            self.pool_maxsize = pool_maxsize
+        if timeout is not None:
+            self.timeout = timeout
+        if keep_alive is not None:
+            self.keep_alive = keep_alive
+        if max_retries is not None:
+            self.max_retries = max_retries
+
+        # A single Session keeps the TCP+TLS connections to gw_url open between calls
+        self.session = requests.Session()
+        self._mount_adapter()
+        self.session.headers['Connection'] = 'keep-alive' if self.keep_alive else 'close'
+
+    def _mount_adapter(self):
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize,
+                              max_retries=self.max_retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # Keep at least pool_maxsize connections per host, one for each thread calling the client concurrently.
+    # A smaller pool discards the connections of the other threads after each call
+    def grow_pool(self, pool_maxsize):
+        if pool_maxsize > self.pool_maxsize:
+            self.pool_maxsize = pool_maxsize
+            self._mount_adapter()
+
+    def close(self):
+        self.session.close()
+
+    # Create Messenger BOT API chatrooms/managed_chatrooms URL
+    def url(self, path, room_is_managed=False, room_id=None):
+        rooms_path = 'managed_chatrooms' if room_is_managed else 'chatrooms'
+        if room_id is None:
+            return '{}{}/{}{}'.format(self.gw_url, self.bot_api_base_path, rooms_path, path)
+        return '{}{}/{}/{}{}'.format(self.gw_url, self.bot_api_base_path, rooms_path, room_id, path)
+
+    # Create Messenger BOT API 1 to 1 message URL
+    def message_url(self):
+        return '{}{}/message'.format(self.gw_url, self.bot_api_base_path)
+
+    # Metrics endpoint label of a URL, with the chatroomId replaced, for example 'chatrooms/{chatroomId}/post'
+    def endpoint(self, url):
+        path = url.split('?')[0]
+        prefix = self.gw_url + self.bot_api_base_path + '/'
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+        parts = path.split('/')
+        if len(parts) > 2:
+            parts[1] = '{chatroomId}'
+        return '/'.join(parts)
+
+    # Send a HTTP request message over the pooled Session, return the HTTP response or None on exception
+    def send(self, method, url, access_token, body=None, action=''):
+        data = None
+        if body is not None:
+            # Send the body as UTF-8 JSON bytes from the fastest installed JSON backend
+            data = json_codec.dumps_bytes(body)
+        response = None
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, url, data=data, timeout=self.timeout,
+                headers={'Authorization': 'Bearer {}'.format(access_token)})
+            status = str(response.status_code)
+        except requests.exceptions.RequestException as e:
+            logger.error('Messenger BOT API: %s exception failure: %s', action, e)
+        endpoint = self.endpoint(url)
+        bot_metrics.http_request_seconds.observe(time.perf_counter() - start, endpoint, status)
+        bot_metrics.http_requests.inc(endpoint, status)
+        return response
+
+    # Send a HTTP request message over the pooled Session, return HTTP status and JSON response
+    def request(self, method, url, access_token, body=None, action=''):
+        return self.handle_response(self.send(method, url, access_token, body, action), action)
+
+    # Print the HTTP response result, return HTTP status and JSON response
+    def handle_response(self, response, action=''):
+        if response is None:
+            return None, None
+
+        if response.status_code == 200:  # HTTP Status 'OK'
+            print('Messenger BOT API: %s success' % (action))
+            response_json = json_codec.loads(response.content)
+            # Print for debugging purpose
+            logger.info('Receive: %s', LazyJson(response_json))
+            return response.status_code, response_json
+        else:
+            print('Messenger BOT API: %s failure:' % (action),
+                  response.status_code, response.reason)
+            print('Text:', response.text)
+            return response.status_code, None
+
+    # Get List of Chatrooms
+    def list_chatrooms(self, access_token, room_is_managed=False):
+        url = self.url('', room_is_managed)
+        return self.request('GET', url, access_token, action='get chatroom')
+
+    # Join chatroom
+    def join_chatroom(self, access_token, room_id=None, room_is_managed=False):
+        url = self.url('/join', room_is_managed, room_id)
+        return self.request('POST', url, access_token, action='join chatroom')
+
+    # send 1 to 1 message to recipient email directly without a Chatroom via BOT
+    def post_direct_message(self, access_token, contact_email='', text=''):
+        url = self.message_url()
+        body = {
+            'recipientEmail': contact_email,
+            'message': text
+        }
+        # Print for debugging purpose
+        logger.info('Sent: %s', LazyJson(body))
+        return self.request('POST', url, access_token, body,
+                            action='post a 1 to 1 message to %s' % (contact_email))
+
+    # Posting Messages to a Chatroom
+    def post_message_to_chatroom(self, access_token, room_id=None, text='', room_is_managed=False):
+        url = self.url('/post', room_is_managed, room_id)
+        body = {
+            'message': text
+        }
+        # Print for debugging purpose
+        logger.info('Sent: %s', LazyJson(body))
+        return self.request('POST', url, access_token, body, action='post message to chatroom')
+
+    # Leave a joined Chatroom
+    def leave_chatroom(self, access_token, room_id=None, room_is_managed=False):
+        url = self.url('/leave', room_is_managed, room_id)
+        return self.request('POST', url, access_token, action='leave chatroom')
+
+
+# Return the shared MessengerClient for a gateway, so every caller in the process uses one connection pool.
+# With pool_maxsize, the pool of an existing client grows to at least pool_maxsize connections
+def get_messenger_client(gw_url=None, bot_api_base_path=None, **kwargs):
+    key = (gw_url or MessengerClient.gw_url, bot_api_base_path or MessengerClient.bot_api_base_path)
+    client = _clients.get(key)
+    if client is None or kwargs.get('pool_maxsize', 0) > client.pool_maxsize:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = MessengerClient(key[0], key[1], **kwargs)
+                _clients[key] = client
+            elif kwargs.get('pool_maxsize') is not None:
+                client.grow_pool(kwargs['pool_maxsize'])
+    return client
+
+
+# Close every shared MessengerClient connection pool
+def close_messenger_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
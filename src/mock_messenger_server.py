@@ -0,0 +1,330 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |   Local Messenger BOT API and RDP Auth stand-in server for load testing   --
+# |-----------------------------------------------------------------------------
+
+"""
+Local stand-in for the RDP Auth, Messenger BOT API REST and Messenger WebSocket services, so the demos
+and benchmarks run without network access.
+
+Point the demos at it:
+
+    RDPTokenManagement.base_URL = 'http://localhost:8080'
+    gw_url = 'http://localhost:8080'
+    ws_url = 'ws://localhost:8081'
+
+HTTP endpoints: /auth/oauth2/v1/token, /messenger/beta1/chatrooms, /messenger/beta1/managed_chatrooms,
+.../{chatroomId}/join, .../{chatroomId}/post, .../{chatroomId}/leave and /messenger/beta1/message.
+POST /mock/chatrooms/{chatroomId}/events with {"message": ..., "sender": ...} sends a chatroomPost event
+to the connected bots. The 'messenger-json' WebSocket stream answers the connect/authenticate commands.
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import websockets
+
+import json_codec
+from bot_logging import get_logger
+
+# Mock server logger
+logger = get_logger('mock')
+
+_room_path = re.compile(r'^/messenger/beta1/(chatrooms|managed_chatrooms)/([^/]+)/(join|post|leave)$')
+_event_path = re.compile(r'^/mock/chatrooms/([^/]+)/events$')
+
+
+class MockMessengerServer:
+    # HTTP REST response latency in seconds (latency + random jitter)
+    latency = 0.0
+    latency_jitter = 0.0
+    # Fraction of Messenger BOT API requests answered with HTTP 503 and HTTP 429
+    error_rate = 0.0
+    throttle_rate = 0.0
+    # Retry-After header value of the HTTP 429 responses, in seconds
+    retry_after = 1
+    # expires_in of the granted tokens, in seconds
+    expires_in = 600
+
+    def __init__(self, host='localhost', http_port=8080, ws_port=8081, chatrooms=None, managed_chatrooms=None,
+                 latency=None, error_rate=None, throttle_rate=None):
+        self.host = host
+        self.http_port = http_port
+        self.ws_port = ws_port
+        if latency is not None:
+            self.latency = latency
+        if error_rate is not None:
+            self.error_rate = error_rate
+        if throttle_rate is not None:
+            self.throttle_rate = throttle_rate
+        if chatrooms is None:
+            chatrooms = ['Chatroom %d' % (index) for index in range(1, 6)]
+        self.chatrooms = [{'chatroomId': 'groupchat-%04d' % (index), 'name': name}
+                          for index, name in enumerate(chatrooms)]
+        self.managed_chatrooms = [{'chatroomId': 'managed-%04d' % (index), 'name': name}
+                                  for index, name in enumerate(managed_chatrooms or [])]
+
+        # Messages posted by the bots: dicts with chatroomId/recipientEmail, message and the receive time
+        self.posts = []
+        # Callables called as listener(post) for every message posted by a bot
+        self.post_listeners = []
+        self.request_counts = {}
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+        self._http_server = None
+        self._ws_loop = None
+        self._ws_clients = set()
+        self._threads = []
+
+    @property
+    def gw_url(self):
+        return 'http://{}:{}'.format(self.host, self.http_port)
+
+    @property
+    def ws_url(self):
+        return 'ws://{}:{}'.format(self.host, self.ws_port)
+
+    # =============================== HTTP REST ========================================
+
+    def _count(self, name):
+        with self._lock:
+            self.request_counts[name] = self.request_counts.get(name, 0) + 1
+
+    def _record_post(self, post):
+        post['received_tm'] = time.time()
+        with self._lock:
+            self.posts.append(post)
+        for listener in self.post_listeners:
+            listener(post)
+
+    def _fault(self):
+        # Return an injected (status, headers) failure, or None
+        draw = self._random.random()
+        if draw < self.throttle_rate:
+            return 429, {'Retry-After': str(self.retry_after)}
+        if draw < self.throttle_rate + self.error_rate:
+            return 503, {}
+        return None
+
+    def _token(self):
+        return {
+            'access_token': uuid.uuid4().hex,
+            'refresh_token': uuid.uuid4().hex,
+            'expires_in': str(self.expires_in),
+            'scope': 'trapi.messenger',
+            'token_type': 'Bearer'
+        }
+
+    # Return status, headers and JSON response of a HTTP request
+    def handle_http(self, method, path, body):
+        if self.latency or self.latency_jitter:
+            time.sleep(self.latency + self._random.random() * self.latency_jitter)
+
+        if method == 'POST' and path == '/auth/oauth2/v1/token':
+            self._count('token')
+            return 200, {}, self._token()
+
+        match = _event_path.match(path)
+        if method == 'POST' and match:
+            event = json_codec.loads(body) if body else {}
+            self.send_chatroom_post(match.group(1), event.get('message', ''), event.get('sender'))
+            return 200, {}, {}
+
+        if not path.startswith('/messenger/beta1/'):
+            return 404, {}, {'error': 'not found'}
+
+        fault = self._fault()
+        if fault is not None:
+            self._count(str(fault[0]))
+            return fault[0], fault[1], {'error': 'injected failure'}
+
+        if method == 'GET' and path == '/messenger/beta1/chatrooms':
+            self._count('chatrooms')
+            return 200, {}, {'chatrooms': self.chatrooms}
+        if method == 'GET' and path == '/messenger/beta1/managed_chatrooms':
+            self._count('managed_chatrooms')
+            return 200, {}, {'chatrooms': self.managed_chatrooms}
+        if method == 'POST' and path == '/messenger/beta1/message':
+            self._count('message')
+            message = json_codec.loads(body) if body else {}
+            self._record_post({'recipientEmail': message.get('recipientEmail'), 'message': message.get('message')})
+            return 200, {}, {}
+
+        match = _room_path.match(path)
+        if method == 'POST' and match:
+            action = match.group(3)
+            self._count(action)
+            if action == 'post':
+                message = json_codec.loads(body) if body else {}
+                self._record_post({'chatroomId': match.group(2), 'message': message.get('message')})
+            return 200, {}, {}
+
+        return 404, {}, {'error': 'not found'}
+
+    def _http_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive connections, like the real gateway
+            protocol_version = 'HTTP/1.1'
+            # TCP_NODELAY: the headers and the body are separate writes, with Nagle the body would wait
+            # for the delayed ACK of the client (about 40 ms) on every keep-alive request
+            disable_nagle_algorithm = True
+
+            def _respond(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, headers, response = server.handle_http(method, self.path.split('?')[0], body)
+                data = json_codec.dumps_bytes(response)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+    # =============================== WebSocket ========================================
+
+    async def _ws_handler(self, web_socket, path=None):
+        self._ws_clients.add(web_socket)
+        try:
+            async for message in web_socket:
+                request = json_codec.loads(message)
+                command = request.get('command')
+                self._count('ws_' + str(command))
+                if command == 'connect':
+                    await web_socket.send(json_codec.dumps({'event': 'connected', 'reqId': request.get('reqId')}))
+                elif command == 'authenticate':
+                    await web_socket.send(json_codec.dumps({'event': 'authenticated', 'reqId': request.get('reqId')}))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._ws_clients.discard(web_socket)
+
+    async def _broadcast(self, frame):
+        for web_socket in list(self._ws_clients):
+            try:
+                await web_socket.send(frame)
+            except websockets.exceptions.ConnectionClosed:
+                self._ws_clients.discard(web_socket)
+
+    # Create a chatroomPost event as the Messenger WebSocket stream sends it
+    @staticmethod
+    def chatroom_post_event(room_id, text, sender=None):
+        post_id = uuid.uuid4().hex
+        return {
+            'event': 'chatroomPost',
+            'chatroomId': room_id,
+            'post': {
+                'chatroomId': room_id,
+                'message': text,
+                'messageId': post_id,
+                'postId': post_id,
+                'sender': sender or {'email': 'user@example.com'},
+                'timestamp': time.time()
+            }
+        }
+
+    # Send an event to every connected bot, from any thread
+    def send_event(self, event):
+        future = asyncio.run_coroutine_threadsafe(self._broadcast(json_codec.dumps(event)), self._ws_loop)
+        return future
+
+    def send_chatroom_post(self, room_id, text, sender=None):
+        return self.send_event(self.chatroom_post_event(room_id, text, sender))
+
+    # Close every WebSocket connection, as a network failure would
+    def drop_connections(self):
+        async def close_all():
+            for web_socket in list(self._ws_clients):
+                await web_socket.close()
+        return asyncio.run_coroutine_threadsafe(close_all(), self._ws_loop)
+
+    def connected_clients(self):
+        return len(self._ws_clients)
+
+    def _run_ws(self, ready):
+        self._ws_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._ws_loop)
+
+        async def serve():
+            self._ws_stop = asyncio.Event()
+            async with websockets.serve(self._ws_handler, self.host, self.ws_port, subprotocols=['messenger-json']):
+                ready.set()
+                await self._ws_stop.wait()
+
+        self._ws_loop.run_until_complete(serve())
+        self._ws_loop.close()
+
+    # Start the HTTP and WebSocket servers in background threads
+    def start(self):
+        self._http_server = ThreadingHTTPServer((self.host, self.http_port), self._http_handler())
+        self._http_server.daemon_threads = True
+        http_thread = threading.Thread(target=self._http_server.serve_forever, name='mock-http', daemon=True)
+        http_thread.start()
+
+        ready = threading.Event()
+        ws_thread = threading.Thread(target=self._run_ws, args=(ready,), name='mock-ws', daemon=True)
+        ws_thread.start()
+        ready.wait()
+        self._threads = [http_thread, ws_thread]
+        print('Mock Messenger server: HTTP %s WebSocket %s' % (self.gw_url, self.ws_url))
+        return self
+
+    def stop(self):
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+        if self._ws_loop is not None:
+            self._ws_loop.call_soon_threadsafe(self._ws_stop.set)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+# =============================== Main Process ========================================
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Local Messenger BOT API stand-in server')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--http-port', type=int, default=8080)
+    parser.add_argument('--ws-port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='HTTP response latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of HTTP 503 responses')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of HTTP 429 responses')
+    parser.add_argument('--chatroom', action='append', help='chatroom name, repeat for more chatrooms')
+    args = parser.parse_args()
+
+    mock_server = MockMessengerServer(args.host, args.http_port, args.ws_port, args.chatroom,
+                                      latency=args.latency, error_rate=args.error_rate,
+                                      throttle_rate=args.throttle_rate).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        mock_server.stop()
@@ -0,0 +1,354 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |    Refinitiv Messenger BOT API rate-limit-aware outbound message scheduler --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import collections
+import email.utils
+import time
+
+from bot_logging import LazyJson, get_logger
+
+# Messenger BOT API outbound scheduler logger
+logger = get_logger('outbound')
+
+
+# Convert a Retry-After header value (delay-seconds or HTTP-date) into seconds
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    # rate is tokens per second, capacity is the allowed burst
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    # Seconds until a token is available, 0 if one can be consumed now
+    def wait_time(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def consume(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+
+    # Stop handing out tokens for delay seconds, used when the gateway returns Retry-After
+    def block(self, delay, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + delay)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class OutboundMessage:
+    def __init__(self, key, method, url, body, action, future, coalesce=False):
+        self.key = key
+        self.method = method
+        self.url = url
+        self.body = body
+        self.action = action
+        self.future = future
+        self.attempts = 0
+        # Text messages may be merged with the next ones of the same chatroom/recipient
+        self.coalesce = coalesce
+        self.submitted = time.monotonic()
+        # Futures of the messages merged into this one, they get the same result
+        self.merged_futures = []
+
+    def set_result(self, result):
+        for future in [self.future] + self.merged_futures:
+            if not future.done():
+                future.set_result(result)
+
+
+class OutboundScheduler:
+    # Token bucket for all messages of the bot (messages per second and burst)
+    bot_rate = 10.0
+    bot_burst = 20
+    # Token bucket for each chatroom (messages per second and burst)
+    room_rate = 1.0
+    room_burst = 5
+
+    # Maximum number of HTTP requests in flight, one at a time per chatroom/recipient to keep order
+    max_in_flight = 10
+    # Seconds a text message waits for the next ones of its chatroom/recipient, to send them as one post.
+    # 0 disables coalescing
+    coalesce_window = 0.0
+    # Maximum length of a coalesced message text
+    max_message_length = 4000
+
+    # Attempts per message for HTTP 429, 5xx and connection failures
+    max_attempts = 5
+    # Exponential backoff in seconds when the gateway does not send Retry-After
+    retry_backoff = 1.0
+    max_retry_backoff = 60.0
+
+    def __init__(self, messenger_client, token_provider, call_blocking, bot_rate=None, bot_burst=None,
+                 room_rate=None, room_burst=None, max_in_flight=None, max_attempts=None, coalesce_window=None,
+                 max_message_length=None):
+        self.messenger_client = messenger_client
+        # Callables returning the current access token and running a blocking call off the event loop
+        self.token_provider = token_provider
+        self.call_blocking = call_blocking
+        if bot_rate is not None:
+            self.bot_rate = bot_rate
+        if bot_burst is not None:
+            self.bot_burst = bot_burst
+        if room_rate is not None:
+            self.room_rate = room_rate
+        if room_burst is not None:
+            self.room_burst = room_burst
+        if max_in_flight is not None:
+            self.max_in_flight = max_in_flight
+        if max_attempts is not None:
+            self.max_attempts = max_attempts
+        if coalesce_window is not None:
+            self.coalesce_window = coalesce_window
+        if max_message_length is not None:
+            self.max_message_length = max_message_length
+
+        self.bot_bucket = TokenBucket(self.bot_rate, self.bot_burst)
+        self._room_buckets = {}
+        # Per chatroom/recipient FIFO queues, keys ready to send and keys with a request in flight
+        self._queues = {}
+        self._ready = collections.deque()
+        self._in_flight = set()
+        # Earliest time a chatroom/recipient may be retried after a 5xx or connection failure
+        self._retry_at = {}
+        self._futures = set()
+        self._senders = set()
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+        # Paused while the bot is disconnected, messages are queued until resume()
+        self.paused = False
+        # Send the coalesced messages without waiting for the window, on shutdown
+        self._flushing = False
+        # Number of messages merged into another one
+        self.coalesced = 0
+
+    # Change the token bucket rates, the chatroom buckets are recreated with the new rate
+    def set_rates(self, bot_rate=None, bot_burst=None, room_rate=None, room_burst=None):
+        if bot_rate is not None:
+            self.bot_rate = bot_rate
+        if bot_burst is not None:
+            self.bot_burst = bot_burst
+        if room_rate is not None:
+            self.room_rate = room_rate
+        if room_burst is not None:
+            self.room_burst = room_burst
+        self.bot_bucket = TokenBucket(self.bot_rate, self.bot_burst)
+        self._room_buckets = {}
+
+    # Hold the queued and new messages, for example while the WebSocket connection is re-established
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        self._wakeup.set()
+
+    # Number of messages waiting or in flight
+    def queue_depth(self):
+        return sum(len(queue) for queue in self._queues.values()) + len(self._in_flight)
+
+    # Number of waiting messages for each chatroom/recipient
+    def queue_depths(self):
+        return {key: len(queue) for key, queue in self._queues.items() if queue}
+
+    def _room_bucket(self, key):
+        if key[0] != 'chatroom':
+            return None
+        bucket = self._room_buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.room_rate, self.room_burst)
+            self._room_buckets[key] = bucket
+        return bucket
+
+    # Queue a HTTP request message, return a future with HTTP status and JSON response.
+    # coalesce allows merging a body with only a 'message' text (and recipientEmail) into the next ones
+    def submit(self, key, method, url, body, action='', coalesce=False):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch_loop())
+
+        future = loop.create_future()
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        queue = self._queues.setdefault(key, collections.deque())
+        queue.append(OutboundMessage(key, method, url, body, action, future, coalesce))
+        if len(queue) == 1 and key not in self._in_flight:
+            self._ready.append(key)
+        self._wakeup.set()
+        return future
+
+    async def post_message_to_chatroom(self, room_id, text, room_is_managed=False):
+        url = self.messenger_client.url('/post', room_is_managed, room_id)
+        body = {
+            'message': text
+        }
+        # Print for debugging purpose
+        logger.info('Sent: %s', LazyJson(body))
+        return await self.submit(('chatroom', room_id), 'POST', url, body, 'post message to chatroom', True)
+
+    async def post_direct_message(self, contact_email, text):
+        body = {
+            'recipientEmail': contact_email,
+            'message': text
+        }
+        # Print for debugging purpose
+        logger.info('Sent: %s', LazyJson(body))
+        return await self.submit(('recipient', contact_email), 'POST', self.messenger_client.message_url(), body,
+                                 'post a 1 to 1 message to %s' % (contact_email), True)
+
+    # Seconds the head message of a queue still waits for more messages to coalesce with
+    def _coalesce_wait(self, queue, now):
+        message = queue[0]
+        if self.coalesce_window <= 0 or self._flushing or not message.coalesce:
+            return 0.0
+        return message.submitted + self.coalesce_window - now
+
+    # Pop the head message of a queue, merged with the following text messages up to max_message_length
+    def _pop_coalesced(self, queue):
+        message = queue.popleft()
+        if self.coalesce_window <= 0 or not message.coalesce:
+            return message
+        texts = [message.body['message']]
+        length = len(texts[0])
+        while queue:
+            following = queue[0]
+            if not following.coalesce or following.url != message.url:
+                break
+            text = following.body['message']
+            if length + 1 + len(text) > self.max_message_length:
+                break
+            queue.popleft()
+            texts.append(text)
+            length += 1 + len(text)
+            message.merged_futures.append(following.future)
+            message.merged_futures.extend(following.merged_futures)
+        if len(texts) > 1:
+            self.coalesced += len(texts) - 1
+            message.body = dict(message.body, message='\n'.join(texts))
+        return message
+
+    # Start the sends allowed by the token buckets, return seconds until the next one may be allowed
+    def _dispatch_ready(self):
+        if self.paused:
+            return None
+        now = time.monotonic()
+        next_wait = None
+        for _ in range(len(self._ready)):
+            if len(self._in_flight) >= self.max_in_flight:
+                return None
+            key = self._ready.popleft()
+            room_bucket = self._room_bucket(key)
+            wait = max(self.bot_bucket.wait_time(now), self._retry_at.get(key, 0.0) - now,
+                       self._coalesce_wait(self._queues[key], now))
+            if room_bucket is not None:
+                wait = max(wait, room_bucket.wait_time(now))
+            if wait > 0:
+                self._ready.append(key)
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                continue
+
+            self.bot_bucket.consume(now)
+            if room_bucket is not None:
+                room_bucket.consume(now)
+            self._retry_at.pop(key, None)
+            message = self._pop_coalesced(self._queues[key])
+            self._in_flight.add(key)
+            sender = asyncio.get_running_loop().create_task(self._send(message))
+            self._senders.add(sender)
+            sender.add_done_callback(self._senders.discard)
+        return next_wait
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            wait = self._dispatch_ready()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send(self, message):
+        key = message.key
+        try:
+            response = await self.call_blocking(self.messenger_client.send, message.method, message.url,
+                                                self.token_provider(), message.body, message.action)
+            status = response.status_code if response is not None else None
+            message.attempts += 1
+            if (status is None or status == 429 or status >= 500) and message.attempts < self.max_attempts:
+                retry_after = None
+                if response is not None:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is None:
+                    retry_after = min(self.max_retry_backoff, self.retry_backoff * 2 ** (message.attempts - 1))
+                logger.warning('Messenger BOT API: %s throttled (%s), retry in %.1f seconds',
+                               message.action, status, retry_after)
+                if status == 429:
+                    # Throttled, hold every send of this bot until Retry-After
+                    self.bot_bucket.block(retry_after)
+                else:
+                    self._retry_at[key] = time.monotonic() + retry_after
+                # Requeue at the head to keep the chatroom/recipient order
+                self._queues[key].appendleft(message)
+                return
+
+            message.set_result(self.messenger_client.handle_response(response, message.action))
+        except Exception as error:
+            logger.error('Messenger BOT API: %s exception failure: %s', message.action, error)
+            message.set_result((None, None))
+        finally:
+            self._in_flight.discard(key)
+            if self._queues.get(key):
+                self._ready.append(key)
+            else:
+                self._queues.pop(key, None)
+            self._wakeup.set()
+
+    # Wait until every queued message has been sent, then stop the dispatcher
+    async def close(self):
+        # Send the messages waiting for their coalescing window now
+        self._flushing = True
+        self.resume()
+        if self._futures:
+            await asyncio.gather(*list(self._futures), return_exceptions=True)
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        self._flushing = False
@@ -0,0 +1,240 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |     Refinitiv Messenger BOT API durable outbox, at-least-once delivery    --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bot_logging import get_logger
+
+# Outbox logger
+logger = get_logger('outbox')
+
+
+class SQLiteOutbox:
+    """
+    Durable outbound messages in an SQLite database in WAL mode.
+
+    deliver() writes a message to the database before it is sent and deletes it once the Messenger
+    BOT API answers HTTP 200. A message rejected with one of rejected_statuses is deleted too, since the
+    request itself is invalid. Any other answer, including 401 and 403 of an expired token and 429, keeps
+    the message: it is sent again every retry_interval seconds by retry_loop(), which also replays the
+    messages left by a previous run of the bot. A message sent but
+    not yet acknowledged when the process dies is sent again, so delivery is at-least-once.
+
+    Writes and acknowledgements are group committed: the ones made within commit_interval seconds are
+    written by one transaction, so durability costs one disk sync per batch instead of one per message.
+
+        runtime = BotRuntime(rdp_token, message_handler, outbox=SQLiteOutbox('./outbox.db'))
+    """
+
+    # Seconds to gather writes into one transaction, and the maximum number of writes per transaction
+    commit_interval = 0.005
+    max_batch = 500
+    # Seconds acknowledgements wait for the next transaction, a later one only means a longer replay after a crash
+    ack_interval = 0.5
+    # Seconds before a message that failed is sent again
+    retry_interval = 30
+    # HTTP statuses rejecting the message itself: sending it again would not help, so it is deleted
+    rejected_statuses = (400, 404, 413, 422)
+    # SQLite synchronous mode: FULL syncs every commit, NORMAL survives a process crash but not a power loss
+    synchronous = 'FULL'
+
+    def __init__(self, database='./outbox.db', synchronous=None):
+        self.database = database
+        if synchronous is not None:
+            self.synchronous = synchronous
+        # One thread owns the SQLite connection and runs every database call
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox')
+        self._connection = None
+        # Writes waiting for the next group commit: (kind, target, room_is_managed, text, in_flight, future)
+        # and ids to delete
+        self._inserts = []
+        self._acks = set()
+        self._flusher = None
+        self._insert_added = asyncio.Event()
+        # Ids acknowledged by the commit in progress: the rows are only deleted once it is done
+        self._committing_acks = set()
+        # Ids of the messages being sent, and the time of the last failure of the others
+        self._in_flight = set()
+        self._failed_at = {}
+
+    # =============================== Database thread ========================================
+
+    def _open(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.database, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=%s' % (self.synchronous))
+            connection.execute('CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                               'kind TEXT NOT NULL, target TEXT NOT NULL, room_is_managed INTEGER NOT NULL, '
+                               'message TEXT NOT NULL, created REAL NOT NULL)')
+            self._connection = connection
+        return self._connection
+
+    # Insert and delete a batch in one transaction, return the ids of the inserted messages
+    def _commit(self, inserts, acks):
+        connection = self._open()
+        now = time.time()
+        ids = []
+        connection.execute('BEGIN')
+        try:
+            for kind, target, room_is_managed, text in inserts:
+                cursor = connection.execute('INSERT INTO outbox (kind, target, room_is_managed, message, created) '
+                                            'VALUES (?, ?, ?, ?, ?)', (kind, target, int(room_is_managed), text, now))
+                ids.append(cursor.lastrowid)
+            connection.executemany('DELETE FROM outbox WHERE id = ?', [(message_id,) for message_id in acks])
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return ids
+
+    def _select_pending(self):
+        return self._open().execute('SELECT id, kind, target, room_is_managed, message FROM outbox '
+                                    'ORDER BY id').fetchall()
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # =============================== Group commit ========================================
+
+    def _schedule_flush(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._inserts or self._acks:
+            if not self._inserts:
+                # Acknowledgements wait for the next message write, at most ack_interval seconds
+                self._insert_added.clear()
+                try:
+                    await asyncio.wait_for(self._insert_added.wait(), self.ack_interval)
+                except asyncio.TimeoutError:
+                    pass
+            if self._inserts:
+                # Let the concurrent writers join this transaction
+                await asyncio.sleep(self.commit_interval)
+            inserts, self._inserts = self._inserts[:self.max_batch], self._inserts[self.max_batch:]
+            acks, self._acks = self._acks, set()
+            self._committing_acks |= acks
+            try:
+                ids = await self._call(self._commit, [insert[:4] for insert in inserts], acks)
+            except Exception as error:
+                logger.error('Outbox commit exception: %s', error)
+                # The acknowledgements go with the next commit
+                self._acks |= acks
+                for insert in inserts:
+                    if not insert[5].done():
+                        insert[5].set_exception(error)
+                continue
+            finally:
+                self._committing_acks -= acks
+            for insert, message_id in zip(inserts, ids):
+                # A message deliver() sends is in flight from its commit, so replay() cannot send it too
+                if insert[4]:
+                    self._in_flight.add(message_id)
+                if not insert[5].done():
+                    insert[5].set_result(message_id)
+                elif insert[4]:
+                    self._in_flight.discard(message_id)
+
+    async def _add(self, kind, target, text, room_is_managed, in_flight):
+        future = asyncio.get_running_loop().create_future()
+        self._inserts.append((kind, target, room_is_managed, text, in_flight, future))
+        self._insert_added.set()
+        self._schedule_flush()
+        return await future
+
+    # Store a message durably, return its id
+    async def add(self, kind, target, text, room_is_managed=False):
+        return await self._add(kind, target, text, room_is_managed, False)
+
+    # Delete a delivered message with the next group commit
+    def ack(self, message_id):
+        self._failed_at.pop(message_id, None)
+        self._acks.add(message_id)
+        self._schedule_flush()
+
+    # Messages not acknowledged yet, as (id, kind, target, room_is_managed, text) in the order they were added
+    async def pending(self):
+        return [(row[0], row[1], row[2], bool(row[3]), row[4]) for row in await self._call(self._select_pending)]
+
+    # Wait until every write has been committed
+    async def flush(self):
+        while self._flusher is not None and not self._flusher.done():
+            await asyncio.gather(self._flusher, return_exceptions=True)
+
+    async def close(self):
+        await self.flush()
+        await self._call(self._close)
+        self._executor.shutdown(wait=True)
+
+    # =============================== Delivery ========================================
+
+    # Send a message marked in flight by its caller
+    async def _send(self, message_id, kind, target, text, room_is_managed, send):
+        try:
+            status, response = await send(kind, target, text, room_is_managed)
+        except Exception as error:
+            logger.error('Outbox send exception: %s', error)
+            status, response = None, None
+        finally:
+            self._in_flight.discard(message_id)
+        if status == 200 or status in self.rejected_statuses:
+            if status != 200:
+                logger.error('Outbox message %s to %s rejected with HTTP %s, not retried', message_id, target, status)
+            self.ack(message_id)
+        else:
+            self._failed_at[message_id] = time.monotonic()
+        return status, response
+
+    # Store a message, then send it with send(kind, target, text, room_is_managed) -> (status, json)
+    async def deliver(self, kind, target, text, room_is_managed, send):
+        message_id = await self._add(kind, target, text, room_is_managed, True)
+        return await self._send(message_id, kind, target, text, room_is_managed, send)
+
+    # Send the stored messages again: the failed ones after retry_interval and the ones of a previous run
+    async def replay(self, send):
+        now = time.monotonic()
+        tasks = []
+        # The database thread runs the commits and this select in order, and their results resume their
+        # tasks in the same order: a message committed before the select is already marked in flight, and
+        # an acknowledgement is in _committing_acks until the select has seen its row deleted
+        for message_id, kind, target, room_is_managed, text in await self.pending():
+            if message_id in self._in_flight or message_id in self._acks or message_id in self._committing_acks:
+                continue
+            failed_at = self._failed_at.get(message_id)
+            if failed_at is not None and now - failed_at < self.retry_interval:
+                continue
+            self._in_flight.add(message_id)
+            # Start in id order, so each chatroom/recipient gets its messages in order
+            tasks.append(asyncio.get_running_loop().create_task(
+                self._send(message_id, kind, target, text, room_is_managed, send)))
+        if tasks:
+            logger.info('Outbox replays %d messages', len(tasks))
+            await asyncio.gather(*tasks)
+        return len(tasks)
+
+    # Replay the stored messages now and every retry_interval seconds
+    async def retry_loop(self, send):
+        while True:
+            try:
+                await self.replay(send)
+            except Exception as error:
+                logger.error('Outbox replay exception: %s', error)
+            await asyncio.sleep(self.retry_interval)
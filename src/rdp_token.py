@@ -14,6 +14,13 @@ import requests
 import json
 import time
 import logging
+import threading
+import bot_metrics
+from bot_logging import LazyJson, get_logger
+from token_store import FileTokenStore
+
+# RDP Authentication logger
+logger = get_logger('auth')
 
 # Authentication objects
 auth_obj = None
@@ -40,16 +47,34 @@ class RDPTokenManagement:
     token_file = './rest-token.txt'
     scope = 'trapi.messenger'
 
+    # Fraction of expires_in after which the background refresher renews the token
+    refresh_fraction = 0.8
+    # Seconds before the background refresher retries a failed refresh
+    refresh_retry = 10
+
     # Create RDP Authentication service URL
     # authen_URL = base_URL + category_URL + rdp_authen_version + endpoint_URL
     authen_URL = '{}{}{}/token'.format(base_URL,
                                        category_URL, rdp_authen_version)
 
-    def __init__(self, username, password, app_key,  before_timeout=10):
+    def __init__(self, username, password, app_key,  before_timeout=10, token_store=None):
         self.username = username
         self.password = password
         self.app_key = app_key
         self.before_timeout = before_timeout
+        # base_URL may point at another RDP Auth server (for example mock_messenger_server.py)
+        self.authen_URL = '{}{}{}/token'.format(self.base_URL, self.category_URL, self.rdp_authen_version)
+        # Token store used when save_token_to_file is True, shared with the other processes of the bot
+        if token_store is None:
+            token_store = FileTokenStore(self.token_file)
+        self.token_store = token_store
+
+        # In-memory token cache, guarded by _lock so only one token request runs at a time
+        self._auth_obj = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._stop_refresher = threading.Event()
 
     # Create new RDP Authentication request message and send it to RDP service
     def request_new_token(self, refresh_token, url=None):
@@ -74,31 +99,37 @@ class RDPTokenManagement:
                 'grant_type': 'refresh_token',
             }
         response = None
+        grant_type = authen_request_msg['grant_type']
+        status = 'error'
 
         # Print for debugging purpose
-        logging.debug('Sent: %s' % (json.dumps(
-            authen_request_msg, sort_keys=True, indent=2, separators=(',', ':'))))
+        logger.debug('Sent: %s', LazyJson(authen_request_msg))
         try:
             # Send request message to RDP with Python requests module
-            response = requests.post(url,
-                                     headers={
-                                         'Accept': 'application/json',
-                                         'Content-Type': 'application/x-www-form-urlencoded'},
-                                     data=authen_request_msg,
-                                     auth=(
-                                         self.app_key,
-                                         self.client_secret
-                                     ))
+            with bot_metrics.token_request_seconds.time(grant_type):
+                response = requests.post(url,
+                                         headers={
+                                             'Accept': 'application/json',
+                                             'Content-Type': 'application/x-www-form-urlencoded'},
+                                         data=authen_request_msg,
+                                         auth=(
+                                             self.app_key,
+                                             self.client_secret
+                                         ))
+            status = str(response.status_code)
         except requests.exceptions.RequestException as e:
-            logging.error('RDP authentication exception failure: %s' % (e))
+            logger.error('RDP authentication exception failure: %s', e)
+        bot_metrics.token_requests.inc(grant_type, status)
+        if response is None:
+            return None, None
 
         if response.status_code == 200:  # HTTP Status 'OK'
             print('Authenticaion success')
             # Print RDP authentication response message for debugging purpose
-            logging.debug('Receive: %s' % (json.dumps(response.json(), sort_keys=True, indent=2, separators=(',', ':'))))
+            logger.debug('Receive: %s', LazyJson(response.json()))
         else:  # Handle HTTP error
-            logging.error('RDP authentication result failure: %s %s' % (response.status_code, response.reason))
-            logging.error('Text: %s' % (response.text))
+            logger.error('RDP authentication result failure: %s %s', response.status_code, response.reason)
+            logger.error('Text: %s', response.text)
             # both access and refresh tokens are expired
             #if response.status_code == 400 and (response.json()['error'] == 'invalid_grant' or response.json()['error_description'] == 'Refresh token does not exist.'):
             #    print('Both Access Token and Refresh Token are expired')
@@ -122,52 +153,96 @@ class RDPTokenManagement:
         return response.status_code, response.json()
 
 
-    # Save RDP Authentication information (Access Token, Refresh Token and Expire time) into the file
+    # Save RDP Authentication information (Access Token, Refresh Token and Expire time) into the token store
     def save_authen_to_file(self, _authen_obj):
 
-        with open(self.token_file, 'w') as saved_token:  # Open './token.txt' file
-            print('Saving Authentication information to file')
-            # _authen_obj['expires_tm'] = time.time() + int(_authen_obj['expires_in']) - 10
-            _authen_obj['expires_tm'] = time.time(
-            ) + int(_authen_obj['expires_in']) - self.before_timeout
+        print('Saving Authentication information to file')
+        # _authen_obj['expires_tm'] = time.time() + int(_authen_obj['expires_in']) - 10
+        _authen_obj['expires_tm'] = time.time(
+        ) + int(_authen_obj['expires_in']) - self.before_timeout
 
-            json.dump(_authen_obj, saved_token, indent=4)
+        self.token_store.save(_authen_obj)
 
     """
     Get RDP Authentication Token.
     Use save_token_to_file variable to verify if read and write RDP token to './rest-token.txt' file or not.
     
-    - REST application: save_token_to_file = True. Get previous token from a file first. If token expire or not exist, request a new token. Once authentication is granted, saved Token information to a file for later use.
-    - WebSocket application: save_token_to_file = False. Always request a new token to RDP without read/save a token file due to WebSocket application behavior.
-    
+    - REST application: save_token_to_file = True. Get previous token from the token store (./rest-token.txt file by default) first. If token expire or not exist, request a new token. Once authentication is granted, saved Token information to the token store for later use. Processes sharing a token store request one token and reuse it.
+    - WebSocket application: save_token_to_file = False. Request a new token to RDP without read/save a token file due to WebSocket application behavior.
+
+    The token is cached in memory: while it is active, get_token() returns it without reading the file or calling RDP.
+    Call refresh() to request a new token now, or start_refresher() to renew it in the background.
     """
 
     def get_token(self, save_token_to_file=True, current_refresh_token = None):
+        auth_obj = self._auth_obj
+        if auth_obj is not None and auth_obj['expires_tm'] > time.time():  # Access Token is still active
+            return auth_obj
+        return self.refresh(save_token_to_file, current_refresh_token, force=False)
+
+    # Request a new token, only one request runs at a time and callers waiting for it share its result
+    def refresh(self, save_token_to_file=True, current_refresh_token = None, force=True):
+        generation = self._generation
+        with self._lock:
+            if self._generation != generation and self._auth_obj is not None:
+                # Another caller has refreshed the token while this one was waiting
+                return self._auth_obj
+            if not force and self._auth_obj is not None and self._auth_obj['expires_tm'] > time.time():
+                return self._auth_obj
+
+            if current_refresh_token is None and self._auth_obj is not None:
+                current_refresh_token = self._auth_obj['refresh_token']
+            if save_token_to_file:
+                # Other processes wait until this one has saved the new token, then reuse it
+                with self.token_store.lock():
+                    status, auth_obj, is_new_token = self._request_token(True, current_refresh_token, force)
+                    if status == 200 and is_new_token:
+                        self.save_authen_to_file(auth_obj)
+            else:
+                status, auth_obj, is_new_token = self._request_token(False, current_refresh_token, force)
+                if status == 200:
+                    auth_obj['expires_tm'] = time.time() + int(auth_obj['expires_in']) - self.before_timeout
+
+            if status == 200:  # HTTP Status 'OK'
+
+                #new code
+                self.access_token = auth_obj['access_token']
+                self.refresh_token = auth_obj['refresh_token']
+                self._auth_obj = auth_obj
+                self._generation += 1
+                return auth_obj
+            else:
+                return None
+
+    # Return HTTP status, token and whether the token has just been granted by RDP
+    def _request_token(self, save_token_to_file, current_refresh_token, force):
         is_request_error = False
         try:
             if save_token_to_file: # chatbot_demo_rest.js
-                print('Checking RDP token information in %s' %
-                      (self.token_file))
-                with open(self.token_file, 'r+') as saved_token:  # Open './token.txt' file
-                    auth_obj = json.load(saved_token)
-                    if auth_obj['expires_tm'] > time.time():  # Access Token is still active
-                        print('Token is still active')
-                        return auth_obj
-                    else:
-                        # Access Token expire
-                        print('Token expired, request a new Token with a refresh token')
-                        
+                print('Checking RDP token information in the token store')
+                auth_obj = self.token_store.load()
+                if auth_obj is None:
+                    raise IOError('No token in the token store')
+                # Another process may have refreshed the token, a forced refresh only reuses a different token
+                is_other_token = self._auth_obj is None or auth_obj['access_token'] != self._auth_obj['access_token']
+                if auth_obj['expires_tm'] > time.time() and (not force or is_other_token):  # Access Token is still active
+                    print('Token is still active')
+                    return 200, auth_obj, False
+                else:
+                    # Access Token expire
+                    print('Token expired, request a new Token with a refresh token')
+
                 # chatbot_demo_rest.js
                 status, auth_obj = self.request_new_token(auth_obj['refresh_token'])
             else: # chatbot_demo_ws.js
-                status, auth_obj = self.request_new_token(current_refresh_token) 
-           
+                status, auth_obj = self.request_new_token(current_refresh_token)
+
         except IOError as e:
-            logging.error('IOError Exception: %s' % e)
+            logger.error('IOError Exception: %s', e)
             print('None Token found, requesting a new one')
             is_request_error = True
         except json.JSONDecodeError as json_error:
-            logging.error('json.JSONDecodeError Exception: %s' % json_error)
+            logger.error('json.JSONDecodeError Exception: %s', json_error)
             print('None Token found, requesting a new one')
             is_request_error = True
         except:
@@ -177,16 +252,45 @@ class RDPTokenManagement:
         if is_request_error:  # if first request returns error, re-request RDP Access Token
             status, auth_obj = self.request_new_token(None)
 
-        if status == 200:  # HTTP Status 'OK'
-            if save_token_to_file:
-                self.save_authen_to_file(auth_obj)
-
-            #new code
-            self.access_token = auth_obj['access_token']
-            self.refresh_token = auth_obj['refresh_token']
-            return auth_obj
-        else:
-            return None
+        return status, auth_obj, True
+
+    # Time to renew the cached token, refresh_fraction of expires_in after it was granted
+    def _renew_time(self):
+        auth_obj = self._auth_obj
+        if auth_obj is None:
+            return 0
+        expires_in = int(auth_obj['expires_in'])
+        granted_tm = auth_obj['expires_tm'] - expires_in + self.before_timeout
+        return granted_tm + expires_in * self.refresh_fraction
+
+    def _refresh_loop(self, save_token_to_file):
+        while not self._stop_refresher.is_set():
+            delay = self._renew_time() - time.time()
+            if delay > 0 and self._stop_refresher.wait(delay):
+                break
+            try:
+                auth_obj = self.refresh(save_token_to_file)
+            except Exception as error:
+                logger.error('RDP token refresher exception: %s', error)
+                auth_obj = None
+            if auth_obj is None:
+                # Retry later, the cached token may still be active
+                self._stop_refresher.wait(self.refresh_retry)
+
+    # Renew the token in a background thread, so get_token() callers never wait for RDP
+    def start_refresher(self, save_token_to_file=True):
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._stop_refresher.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, args=(save_token_to_file,),
+                                           name='rdp-token-refresher', daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self):
+        self._stop_refresher.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
 
 
 # =============================== Main Process, For verifying your RDP Account purpose ============================
@@ -0,0 +1,161 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |        Refinitiv Messenger BOT API command reply cache                    --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import collections
+import functools
+import inspect
+import time
+
+import bot_metrics
+from bot_logging import get_logger
+
+# Response cache logger
+logger = get_logger('cache')
+
+
+# Retrieve the error of a computation whose callers were all cancelled, asyncio logs it as never retrieved otherwise
+def _retrieve_exception(task):
+    if not task.cancelled():
+        task.exception()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of command replies with a TTL per command.
+
+    Decorate the function building a reply, it becomes a coroutine function returning the cached reply:
+
+        response_cache = ResponseCache()
+
+        @response_cache.cached('quote', ttl=5)
+        async def quote_text(ric):
+            ...
+
+        text = await quote_text('LCOc1')
+
+    The arguments are part of the cache key, or key(*args, **kwargs) builds it. Keys must be hashable:
+    the reply of a call with an unhashable key (a list or dict argument) is built without caching.
+    Concurrent calls with the same key share one computation. invalidate() removes the replies of a
+    command, or of one key. ttl is seconds, or a callable returning them read at each call, so a
+    setting changed after the decorator runs is used.
+    """
+
+    max_entries = 1024
+
+    def __init__(self, max_entries=None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+        # (name, key) -> (expire time, reply), least recently used first
+        self._entries = collections.OrderedDict()
+        # (name, key) -> future of the computation in progress
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, cache_key):
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            return False, None
+        if entry[0] <= time.monotonic():
+            del self._entries[cache_key]
+            return False, None
+        self._entries.move_to_end(cache_key)
+        return True, entry[1]
+
+    def _store(self, cache_key, ttl, reply):
+        self._entries[cache_key] = (time.monotonic() + ttl, reply)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _compute(self, cache_key, ttl, builder, args, kwargs):
+        task = asyncio.current_task()
+        try:
+            reply = builder(*args, **kwargs)
+            if inspect.isawaitable(reply):
+                reply = await reply
+            # The reply is not cached when it was invalidated while being built
+            if self._pending.get(cache_key) is task:
+                self._store(cache_key, ttl, reply)
+            return reply
+        finally:
+            if self._pending.get(cache_key) is task:
+                del self._pending[cache_key]
+
+    # Return the cached reply of name/key, or build it with builder(*args, **kwargs) and cache it for ttl seconds
+    async def get_or_build(self, name, key, ttl, builder, *args, **kwargs):
+        cache_key = (name, key)
+        try:
+            hash(cache_key)
+        except TypeError:
+            bot_metrics.cache_requests.inc(name, 'uncacheable')
+            reply = builder(*args, **kwargs)
+            if inspect.isawaitable(reply):
+                reply = await reply
+            return reply
+        found, reply = self._lookup(cache_key)
+        if found:
+            bot_metrics.cache_requests.inc(name, 'hit')
+            return reply
+        task = self._pending.get(cache_key)
+        if task is None:
+            bot_metrics.cache_requests.inc(name, 'miss')
+            task = asyncio.get_running_loop().create_task(self._compute(cache_key, ttl, builder, args, kwargs))
+            task.add_done_callback(_retrieve_exception)
+            self._pending[cache_key] = task
+        else:
+            bot_metrics.cache_requests.inc(name, 'coalesced')
+        # A cancelled caller must not cancel the computation the other callers are waiting for
+        return await asyncio.shield(task)
+
+    # Decorator caching the replies of a reply builder for ttl seconds, ttl can be a callable returning them
+    def cached(self, name, ttl, key=None):
+        def make_key(*args, **kwargs):
+            if key is not None:
+                return key(*args, **kwargs)
+            return args, tuple(sorted(kwargs.items()))
+
+        def decorator(builder):
+            @functools.wraps(builder)
+            async def wrapper(*args, **kwargs):
+                return await self.get_or_build(name, make_key(*args, **kwargs), ttl() if callable(ttl) else ttl,
+                                               builder, *args, **kwargs)
+
+            # Remove the cached reply of these arguments, or every reply of the command without arguments
+            def invalidate(*args, **kwargs):
+                if not args and not kwargs:
+                    return self.invalidate(name)
+                return self.invalidate(name, make_key(*args, **kwargs))
+
+            wrapper.invalidate = invalidate
+            return wrapper
+        return decorator
+
+    # Remove the cached replies of a command, or only the one of key. Return the number of removed replies
+    def invalidate(self, name, key=None):
+        if key is not None:
+            self._pending.pop((name, key), None)
+            removed = 1 if self._entries.pop((name, key), None) is not None else 0
+        else:
+            for cache_key in [cache_key for cache_key in self._pending if cache_key[0] == name]:
+                del self._pending[cache_key]
+            keys = [cache_key for cache_key in self._entries if cache_key[0] == name]
+            for cache_key in keys:
+                del self._entries[cache_key]
+            removed = len(keys)
+        logger.debug('Invalidate %d %s replies', removed, name)
+        return removed
+
+    def clear(self):
+        self._pending.clear()
+        self._entries.clear()
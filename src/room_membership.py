@@ -0,0 +1,88 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |         Refinitiv Messenger BOT API chatroom membership tracker           --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+
+
+class RoomMembership:
+    """
+    Set of the chatrooms a bot has joined.
+
+    ensure_joined() runs at most one join per chatroom at a time: concurrent posts to a chatroom that
+    is not joined yet all wait for the same join request.
+    """
+
+    def __init__(self):
+        self._rooms = set()
+        self._managed_rooms = set()
+        # chatroomId -> join task in progress
+        self._joining = {}
+
+    def __contains__(self, room_id):
+        return room_id in self._rooms
+
+    def __iter__(self):
+        return iter(list(self._rooms))
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def add(self, room_id, room_is_managed=False):
+        self._rooms.add(room_id)
+        if room_is_managed:
+            self._managed_rooms.add(room_id)
+
+    def discard(self, room_id):
+        self._rooms.discard(room_id)
+        self._managed_rooms.discard(room_id)
+
+    def is_managed(self, room_id):
+        return room_id in self._managed_rooms
+
+    async def _join(self, room_id, join, room_is_managed):
+        try:
+            if await join(room_id, room_is_managed):
+                self.add(room_id, room_is_managed)
+                return True
+            return False
+        finally:
+            self._joining.pop(room_id, None)
+
+    # Join a chatroom unless it is joined already, join is a coroutine function join(room_id, room_is_managed) -> bool
+    async def ensure_joined(self, room_id, join, room_is_managed=False):
+        if room_id in self._rooms:
+            return True
+        task = self._joining.get(room_id)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._join(room_id, join, room_is_managed))
+            self._joining[room_id] = task
+        # A cancelled caller must not cancel the join the other callers are waiting for
+        return await asyncio.shield(task)
+
+    # Join every tracked chatroom again concurrently, after a reconnection. Chatrooms that fail are untracked,
+    # so the next post joins them again. Return True if every chatroom is joined
+    async def rejoin_all(self, join):
+        rooms = [(room_id, room_id in self._managed_rooms) for room_id in self._rooms]
+        results = await asyncio.gather(*[join(room_id, room_is_managed) for room_id, room_is_managed in rooms],
+                                       return_exceptions=True)
+        for (room_id, _), joined in zip(rooms, results):
+            if joined is not True:
+                self.discard(room_id)
+        return all(joined is True for joined in results)
+
+    # Leave every joined chatroom concurrently, leave is a coroutine function leave(room_id, room_is_managed)
+    async def leave_all(self, leave):
+        rooms = [(room_id, room_id in self._managed_rooms) for room_id in self._rooms]
+        self._rooms.clear()
+        self._managed_rooms.clear()
+        if rooms:
+            await asyncio.gather(*[leave(room_id, room_is_managed) for room_id, room_is_managed in rooms],
+                                 return_exceptions=True)
@@ -0,0 +1,203 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |     Tab-separated market data tables for Messenger BOT API messages       --
+# |-----------------------------------------------------------------------------
+
+"""
+Render rows as the tab-separated text tables Messenger displays, for example:
+
+    text = render_table(rows, ['Name', 'Asmt', 'Fair Value', 'Hst Cls'],
+                        formats={'Asmt': '.2f', 'Fair Value': '.2f', 'Hst Cls': '.2f'},
+                        trend={'Fair Value': 'Hst Cls'}, title='USD BBL EU AM Assessment at 11:30 UKT')
+
+rows is a list of lists/tuples, a list of dicts, a NumPy 2-D or structured array, or CSV (text, or a
+file object) with a header line. The columns of dicts and CSV rows are picked by name. formats maps a column to a format spec ('.2f', ',d') or a callable.
+Column names are unique keys, header is True (the column names), False, or the labels of the header
+line when two columns share a label.
+trend maps a column to a reference column: its values get an (up) or (dn) marker when they are above or
+below the reference value.
+
+Columns are formatted a whole column at a time with precompiled format methods, the (up)/(dn) markers
+of NumPy arrays are computed with array comparisons when NumPy is installed (pip install numpy), and the
+compiled layout of a table is cached.
+"""
+
+import csv
+import functools
+import io
+import sys
+
+UP_MARKER = '(up) '
+DOWN_MARKER = '(dn) '
+
+
+# Return the functions formatting one value with a format spec: a fast one for numbers and a safe one
+# that also converts the numbers of CSV text
+def _formatters(spec):
+    if spec is None:
+        return str, str
+    if callable(spec):
+        return spec, spec
+    format_value = ('{:%s}' % (spec)).format
+
+    def formatter(value):
+        if isinstance(value, str):
+            try:
+                value = int(value) if spec.endswith('d') else float(value)
+            except ValueError:
+                return value
+        return format_value(value)
+
+    return format_value, formatter
+
+
+def _trend_marker(value, reference):
+    try:
+        value = float(value)
+        reference = float(reference)
+    except (TypeError, ValueError):
+        return ''
+    if value > reference:
+        return UP_MARKER
+    if value < reference:
+        return DOWN_MARKER
+    return ''
+
+
+# NumPy arrays only exist once the caller imported NumPy, so NumPy is looked up rather than imported:
+# importing it would add tens of milliseconds to the bot startup
+def _numpy():
+    return sys.modules.get('numpy')
+
+
+def _is_array(values):
+    numpy = _numpy()
+    return numpy is not None and isinstance(values, numpy.ndarray)
+
+
+def _is_numeric_array(values):
+    return _is_array(values) and values.dtype.kind in 'iuf'
+
+
+class TableTemplate:
+    # Compiled layout of a table: columns, their formatters and (up)/(dn) reference columns
+    def __init__(self, columns, formats=None, trend=None, header=True):
+        self.columns = tuple(columns)
+        if len(set(self.columns)) != len(self.columns):
+            raise ValueError('Duplicate column in %s, use header for repeated labels' % (list(self.columns)))
+        formats = formats or {}
+        self.trend = dict(trend or {})
+        self._formatters = [_formatters(formats.get(column)) for column in self.columns]
+        self._index = {column: index for index, column in enumerate(self.columns)}
+        for column, reference in self.trend.items():
+            if column not in self._index or reference not in self._index:
+                raise ValueError('Unknown trend column %s or %s' % (column, reference))
+        if header is True:
+            header = self.columns
+        elif header and len(header) != len(self.columns):
+            raise ValueError('%d header labels for %d columns' % (len(header), len(self.columns)))
+        self._header = '\t'.join(header) if header else None
+
+    # Values of each column: lists, or NumPy arrays for NumPy input
+    def _column_values(self, rows):
+        if _is_array(rows):
+            if rows.dtype.names:
+                return [rows[column] for column in self.columns]
+            rows = _numpy().atleast_2d(rows)
+            return [rows[:, index] for index in range(len(self.columns))]
+        rows = rows if isinstance(rows, list) else list(rows)
+        if rows and isinstance(rows[0], dict):
+            return [[row.get(column, '') for row in rows] for column in self.columns]
+        if not rows:
+            return [[] for _ in self.columns]
+        return [list(values) for values in zip(*rows)]
+
+    def _format_column(self, index, values_by_column):
+        values = values_by_column[index]
+        reference = None
+        if self.columns[index] in self.trend:
+            reference = values_by_column[self._index[self.trend[self.columns[index]]]]
+
+        markers = None
+        if reference is not None and _is_numeric_array(values) and _is_numeric_array(reference):
+            # Compare the whole NumPy columns at once
+            numpy = _numpy()
+            markers = numpy.where(values > reference, UP_MARKER,
+                                  numpy.where(values < reference, DOWN_MARKER, '')).tolist()
+            reference = None
+        if _is_array(values):
+            values = values.tolist()
+
+        # A whole column goes through one precompiled format method, much faster per cell than numpy.char
+        fast, safe = self._formatters[index]
+        try:
+            text = list(map(fast, values))
+        except (TypeError, ValueError):
+            text = list(map(safe, values))
+        if markers is not None:
+            text = list(map(str.__add__, markers, text))
+        if reference is not None:
+            text = [_trend_marker(value, ref) + cell for value, ref, cell in zip(values, reference, text)]
+        return text
+
+    # Render rows as a tab-separated table, with an optional title line
+    def render(self, rows, title=None):
+        values_by_column = self._column_values(rows)
+        cells = [self._format_column(index, values_by_column) for index in range(len(self.columns))]
+        lines = []
+        if title:
+            lines.append(title)
+        if self._header is not None:
+            lines.append(self._header)
+        lines.extend(map('\t'.join, zip(*cells)))
+        return '\n'.join(lines)
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_template(columns, formats, trend, header):
+    return TableTemplate(columns, dict(formats), dict(trend), header)
+
+
+# Return the cached TableTemplate of a table layout
+def get_template(columns, formats=None, trend=None, header=True):
+    if not isinstance(header, bool):
+        header = tuple(header)
+    return _cached_template(tuple(columns), tuple((formats or {}).items()), tuple((trend or {}).items()), header)
+
+
+# Read CSV text or a CSV file object, return the header columns and the rows
+def read_csv(source):
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    reader = csv.reader(source)
+    columns = next(reader, [])
+    return columns, [row for row in reader if row]
+
+
+def _is_csv(rows):
+    return isinstance(rows, str) or hasattr(rows, 'read')
+
+
+# Render rows as a Messenger tab-separated table, see the module documentation
+def render_table(rows, columns=None, formats=None, trend=None, title=None, header=True):
+    if _is_csv(rows):
+        csv_columns, rows = read_csv(rows)
+        if columns is None:
+            columns = csv_columns
+        else:
+            # Pick the chosen columns by their CSV header name, not by their position
+            rows = [dict(zip(csv_columns, row)) for row in rows]
+    elif columns is None:
+        if _is_array(rows) and rows.dtype.names:
+            columns = rows.dtype.names
+        elif isinstance(rows, list) and rows and isinstance(rows[0], dict):
+            columns = list(rows[0])
+        else:
+            raise ValueError('columns are required for rows of lists or arrays')
+    return get_template(columns, formats, trend, header).render(rows, title)
@@ -0,0 +1,165 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+# |-----------------------------------------------------------------------------
+# |        Refinitiv Data Platform token stores shared between processes      --
+# |-----------------------------------------------------------------------------
+
+import abc
+import contextlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class TokenStore(abc.ABC):
+    """
+    Where RDPTokenManagement keeps the RDP token (access token, refresh token and expires_tm).
+
+    RDPTokenManagement holds lock() while it reads the stored token, requests a new one and saves it,
+    so processes sharing a store send one token request and reuse its result.
+    """
+
+    # Return the stored token, or None
+    @abc.abstractmethod
+    def load(self):
+        pass
+
+    @abc.abstractmethod
+    def save(self, auth_obj):
+        pass
+
+    # Exclusive lock across every user of the store
+    @abc.abstractmethod
+    def lock(self):
+        pass
+
+
+class MemoryTokenStore(TokenStore):
+    # Token shared by the RDPTokenManagement objects of one process
+    def __init__(self):
+        self._auth_obj = None
+        self._lock = threading.RLock()
+
+    def load(self):
+        return self._auth_obj
+
+    def save(self, auth_obj):
+        self._auth_obj = dict(auth_obj)
+
+    def lock(self):
+        return self._lock
+
+
+class FileTokenStore(TokenStore):
+    # JSON token file, replaced atomically and locked with flock (msvcrt.locking on Windows) on a side lock file
+    def __init__(self, token_file='./rest-token.txt'):
+        self.token_file = token_file
+        self.lock_file = token_file + '.lock'
+        self._thread_lock = threading.RLock()
+
+    def load(self):
+        try:
+            with open(self.token_file, 'r') as saved_token:
+                return json.load(saved_token)
+        except (IOError, ValueError):
+            return None
+
+    def save(self, auth_obj):
+        directory = os.path.dirname(os.path.abspath(self.token_file))
+        file_descriptor, temp_path = tempfile.mkstemp(prefix='.rest-token-', dir=directory)
+        try:
+            with os.fdopen(file_descriptor, 'w') as saved_token:
+                json.dump(auth_obj, saved_token, indent=4)
+                saved_token.flush()
+                os.fsync(saved_token.fileno())
+            # Readers see either the previous or the new token, never a partially written file
+            os.replace(temp_path, self.token_file)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+
+    @contextlib.contextmanager
+    def lock(self):
+        with self._thread_lock:
+            with open(self.lock_file, 'a+') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    else:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SQLiteTokenStore(TokenStore):
+    # SQLite database holding one token per key (for example per bot username), locked with BEGIN IMMEDIATE
+    def __init__(self, database='./rest-token.db', key='default', timeout=30):
+        self.database = database
+        self.key = key
+        self.timeout = timeout
+        self._local = threading.local()
+        with contextlib.closing(self._connect()) as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS rdp_token (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.database, timeout=self.timeout, isolation_level=None)
+
+    # Use the connection holding the lock when there is one, so load/save do not wait for it
+    @contextlib.contextmanager
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            yield connection
+        else:
+            with contextlib.closing(self._connect()) as connection:
+                yield connection
+
+    def load(self):
+        with self._connection() as connection:
+            row = connection.execute('SELECT value FROM rdp_token WHERE key = ?', (self.key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, auth_obj):
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO rdp_token (key, value) VALUES (?, ?)',
+                               (self.key, json.dumps(auth_obj)))
+
+    @contextlib.contextmanager
+    def lock(self):
+        if getattr(self._local, 'connection', None) is not None:
+            yield
+            return
+        connection = self._connect()
+        try:
+            # Take the database write lock now, other processes wait here until COMMIT
+            connection.execute('BEGIN IMMEDIATE')
+            self._local.connection = connection
+            try:
+                yield
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        finally:
+            self._local.connection = None
+            connection.close()
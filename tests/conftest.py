@@ -0,0 +1,33 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import os
+import socket
+import sys
+
+import pytest
+
+# The modules of the examples are run from the src folder, import them the same way
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('localhost', 0))
+        return probe.getsockname()[1]
+
+
+# Local Messenger BOT API and RDP Auth server, see mock_messenger_server.py
+@pytest.fixture
+def mock_server(monkeypatch):
+    from mock_messenger_server import MockMessengerServer
+    from rdp_token import RDPTokenManagement
+
+    server = MockMessengerServer(http_port=free_port(), ws_port=free_port()).start()
+    monkeypatch.setattr(RDPTokenManagement, 'base_URL', server.gw_url)
+    yield server
+    server.stop()
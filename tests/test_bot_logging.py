@@ -0,0 +1,62 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import logging
+
+import bot_logging
+from bot_logging import LazyJson, get_logger, set_payload_format
+
+
+class CountingDumps:
+    # Stand-in for json.dumps counting the serializations
+    def __init__(self, dumps):
+        self.dumps = dumps
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.dumps(*args, **kwargs)
+
+
+def counting_dumps(monkeypatch):
+    dumps = CountingDumps(bot_logging.json.dumps)
+    monkeypatch.setattr(bot_logging.json, 'dumps', dumps)
+    return dumps
+
+
+def test_payload_is_not_serialized_when_the_level_is_disabled(monkeypatch, caplog):
+    dumps = counting_dumps(monkeypatch)
+    caplog.set_level(logging.INFO, logger='messenger.test')
+    get_logger('test').debug('Sent: %s', LazyJson({'message': 'hello'}))
+    assert dumps.calls == 0
+    assert caplog.records == []
+
+
+def test_payload_is_serialized_when_the_record_is_emitted(monkeypatch, caplog):
+    dumps = counting_dumps(monkeypatch)
+    monkeypatch.setattr(LazyJson, 'compact', False)
+    caplog.set_level(logging.DEBUG, logger='messenger.test')
+    get_logger('test').debug('Sent: %s', LazyJson({'message': 'hello', 'chatroomId': 'groupchat-0000'}))
+    assert caplog.messages == ['Sent: {\n  "chatroomId":"groupchat-0000",\n  "message":"hello"\n}']
+    # Serialized when a handler formats the record, pytest has several capture handlers
+    assert dumps.calls >= 1
+
+
+def test_raw_frames_are_logged_as_is(monkeypatch):
+    dumps = counting_dumps(monkeypatch)
+    assert str(LazyJson(b'{"event":"chatroomPost"}')) == '{"event":"chatroomPost"}'
+    assert str(LazyJson('{"event": "chatroomPost"}')) == '{"event": "chatroomPost"}'
+    assert dumps.calls == 0
+
+
+def test_payload_format(monkeypatch):
+    monkeypatch.setattr(LazyJson, 'compact', False)
+    monkeypatch.setattr(LazyJson, 'max_length', 4096)
+    set_payload_format(compact=True, max_length=10)
+    assert str(LazyJson({'message': 'hello'})) == '{"message"...(9 characters truncated)'
+    set_payload_format(max_length=None)
+    assert str(LazyJson({'message': 'hello'})) == '{"message":"hello"}'
@@ -0,0 +1,94 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import threading
+
+import pytest
+import requests
+
+from bot_metrics import MetricsExporter, MetricsRegistry
+
+
+def test_counter_counts_by_labels_from_many_threads():
+    requests_total = MetricsRegistry().counter('requests_total', 'Requests', ('endpoint', 'status'))
+
+    def increment():
+        for _ in range(1000):
+            requests_total.inc('post', '200')
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    requests_total.inc('post', '429', amount=2)
+    assert requests_total.value('post', '200') == 4000
+    assert requests_total.snapshot() == {('post', '200'): 4000, ('post', '429'): 2}
+    assert requests_total.value('join', '200') == 0
+
+
+def test_histogram_counts_each_observation_in_its_bucket():
+    latency = MetricsRegistry().histogram('latency_seconds', 'Latency', ('endpoint',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value, 'post')
+    with latency.time('join'):
+        pass
+    snapshot = latency.snapshot()
+    # Upper bounds are inclusive, the last bucket is +Inf
+    assert snapshot[('post',)] == {'buckets': [2, 1, 1], 'sum': 2.65, 'count': 4}
+    assert snapshot[('join',)]['buckets'] == [1, 0, 0]
+
+
+def test_prometheus_exposition():
+    registry = MetricsRegistry()
+    frames = registry.counter('ws_frames_total', 'WebSocket frames', ('direction',))
+    registry.counter('reconnects_total', 'Reconnections')
+    latency = registry.histogram('latency_seconds', 'Latency', ('endpoint',), buckets=(0.1, 1.0))
+    frames.inc('in', amount=3)
+    frames.inc('a "quoted"\nlabel')
+    latency.observe(0.5, 'post')
+    latency.observe(0.05, 'post')
+    assert registry.render_prometheus() == '\n'.join([
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{endpoint="post",le="0.1"} 1',
+        'latency_seconds_bucket{endpoint="post",le="1.0"} 2',
+        'latency_seconds_bucket{endpoint="post",le="+Inf"} 2',
+        'latency_seconds_sum{endpoint="post"} 0.55',
+        'latency_seconds_count{endpoint="post"} 2',
+        '# HELP reconnects_total Reconnections',
+        '# TYPE reconnects_total counter',
+        'reconnects_total 0',
+        '# HELP ws_frames_total WebSocket frames',
+        '# TYPE ws_frames_total counter',
+        'ws_frames_total{direction="a \\"quoted\\"\\nlabel"} 1',
+        'ws_frames_total{direction="in"} 3',
+    ]) + '\n'
+
+
+def test_registry_returns_the_metric_of_a_name():
+    registry = MetricsRegistry()
+    counter = registry.counter('events_total')
+    assert registry.counter('events_total') is counter
+    assert registry.get('events_total') is counter
+    with pytest.raises(ValueError):
+        registry.histogram('events_total')
+
+
+def test_exporter_serves_the_registry():
+    registry = MetricsRegistry()
+    registry.counter('events_total', 'Events').inc(amount=5)
+    exporter = MetricsExporter(0, 'localhost', registry).start()
+    try:
+        url = 'http://localhost:%d' % (exporter._server.server_address[1])
+        response = requests.get(url + '/metrics')
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert 'events_total 5\n' in response.text
+        assert requests.get(url + '/other').status_code == 404
+    finally:
+        exporter.stop()
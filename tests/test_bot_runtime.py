@@ -0,0 +1,150 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import random
+
+import websockets
+
+import bot_runtime
+from bot_session import BotSession
+
+
+# Wait until condition() is true, at most timeout seconds
+async def wait_for(condition, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('condition not met in %s seconds' % (timeout))
+
+
+def make_session(server, handler, chatroom_names=('Chatroom 1',)):
+    return BotSession('bot', 'password', 'app_key', handler, chatroom_names, None, server.ws_url, server.gw_url)
+
+
+def test_invalid_frames_are_skipped(mock_server):
+    handled = []
+
+    async def handler(runtime, message_json):
+        if message_json.get('event') == 'chatroomPost':
+            handled.append(message_json['post']['message'])
+            if message_json['post']['message'] == 'crash':
+                raise ValueError('handler failure')
+
+    async def scenario():
+        session = make_session(mock_server, handler)
+        assert await session.start(connect=True)
+        await wait_for(lambda: mock_server.connected_clients())
+        for frame in ('not json', '[1, 2]', '42'):
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                mock_server._broadcast(frame), mock_server._ws_loop))
+        await asyncio.wrap_future(mock_server.send_chatroom_post('groupchat-0000', 'crash'))
+        await asyncio.wrap_future(mock_server.send_chatroom_post('groupchat-0000', 'still served'))
+        await wait_for(lambda: len(handled) == 2)
+        connections = session.runtime.connections
+        await session.close()
+        return connections
+
+    assert asyncio.run(scenario()) == 1
+    assert handled == ['crash', 'still served']
+
+
+def test_events_of_a_chatroom_are_handled_in_order(mock_server):
+    handled = {'groupchat-0000': [], 'groupchat-0001': []}
+    active = set()
+    overlap = []
+
+    async def handler(runtime, message_json):
+        if message_json.get('event') != 'chatroomPost':
+            return
+        room_id = message_json['chatroomId']
+        if room_id in active:
+            overlap.append(room_id)
+        active.add(room_id)
+        await asyncio.sleep(random.uniform(0, 0.01))
+        active.discard(room_id)
+        handled[room_id].append(int(message_json['post']['message']))
+
+    async def scenario():
+        session = make_session(mock_server, handler, ('Chatroom 1', 'Chatroom 2'))
+        assert await session.start(connect=True)
+        await wait_for(lambda: mock_server.connected_clients())
+        for index in range(20):
+            for room_id in handled:
+                mock_server.send_chatroom_post(room_id, str(index))
+        await wait_for(lambda: all(len(texts) == 20 for texts in handled.values()))
+        await session.close()
+
+    asyncio.run(scenario())
+    assert handled == {room_id: list(range(20)) for room_id in handled}
+    assert overlap == []
+
+
+def test_reconnect_rejoins_then_sends_the_held_posts(mock_server):
+    # Request counts seen by the mock server when each post arrives
+    counts_at_post = []
+    mock_server.post_listeners.append(lambda post: counts_at_post.append(dict(mock_server.request_counts)))
+
+    async def ignore(runtime, message_json):
+        pass
+
+    async def scenario():
+        session = make_session(mock_server, ignore)
+        runtime = session.runtime
+        runtime.reconnect_delay = 0.5
+        assert await session.start(connect=True)
+        await wait_for(lambda: runtime.connections == 1)
+        await asyncio.wrap_future(mock_server.drop_connections())
+        await wait_for(lambda: runtime.web_socket is None)
+        # Posted while disconnected: held until the connection is back
+        post = asyncio.ensure_future(runtime.post_message_to_chatroom('groupchat-0000', 'held'))
+        await asyncio.sleep(0.1)
+        held = list(mock_server.posts)
+        status, _ = await post
+        connections = runtime.connections
+        await session.close()
+        return held, status, connections
+
+    held, status, connections = asyncio.run(scenario())
+    assert held == []
+    assert status == 200
+    assert connections == 2
+    assert [post['message'] for post in mock_server.posts] == ['held']
+    # Sent after the second connect request and after the chatroom was joined again
+    assert counts_at_post[0]['ws_connect'] == 2
+    assert counts_at_post[0]['join'] == 2
+
+
+def test_stop_while_connecting_ends_run(mock_server, monkeypatch):
+    connect = websockets.connect
+
+    class StoppedWhileConnecting:
+        # Opening handshake during which stop() is called
+        def __init__(self, runtime, *args, **kwargs):
+            self.runtime = runtime
+            self.connection = connect(*args, **kwargs)
+
+        async def __aenter__(self):
+            await self.runtime.stop()
+            return await self.connection.__aenter__()
+
+        async def __aexit__(self, *exc_info):
+            return await self.connection.__aexit__(*exc_info)
+
+    async def ignore(runtime, message_json):
+        pass
+
+    async def scenario():
+        session = make_session(mock_server, ignore)
+        runtime = session.runtime
+        monkeypatch.setattr(bot_runtime.websockets, 'connect',
+                            lambda *args, **kwargs: StoppedWhileConnecting(runtime, *args, **kwargs))
+        await asyncio.wait_for(runtime.run(), 5)
+        return runtime.connections
+
+    assert asyncio.run(scenario()) == 0
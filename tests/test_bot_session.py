@@ -0,0 +1,71 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import time
+
+from bot_session import BotSession
+from outbox import SQLiteOutbox
+
+
+async def ignore(runtime, message_json):
+    pass
+
+
+def make_session(server, chatroom_names, outbox=None):
+    return BotSession('bot', 'password', 'app_key', ignore, chatroom_names, 'someone@example.com',
+                      server.ws_url, server.gw_url, outbox=outbox)
+
+
+def test_start_connects_while_joining_and_records_the_phases(mock_server):
+    async def scenario():
+        session = make_session(mock_server, ['Chatroom 1', 'Chatroom 2', 'Chatroom 3'])
+        assert await session.start(connect=True)
+        while session.runtime.connections == 0:
+            await asyncio.sleep(0.01)
+        timings = dict(session.timings)
+        await session.close()
+        return timings
+
+    timings = asyncio.run(scenario())
+    assert set(timings) == {'authenticate', 'websocket', 'greeting', 'list_chatrooms', 'join_chatrooms'}
+    assert mock_server.request_counts['join'] == 3
+    assert mock_server.request_counts['ws_connect'] == 1
+
+
+def test_failed_start_still_delivers_the_greeting(mock_server, tmp_path):
+    # The greeting is still being stored and sent when start() fails
+    mock_server.post_listeners.append(lambda post: time.sleep(0.2))
+
+    async def scenario():
+        outbox = SQLiteOutbox(str(tmp_path / 'outbox.db'), synchronous='OFF')
+        outbox.commit_interval = 0.2
+        session = make_session(mock_server, ['No such chatroom'], outbox)
+        assert not await session.start(connect=True)
+        await session.close()
+        # The greeting was acknowledged before the outbox closed
+        outbox = SQLiteOutbox(str(tmp_path / 'outbox.db'))
+        pending = await outbox.pending()
+        await outbox.close()
+        return pending
+
+    assert asyncio.run(scenario()) == []
+    assert [post['recipientEmail'] for post in mock_server.posts] == ['someone@example.com']
+    # The token refresher thread is stopped with the session
+    assert mock_server.request_counts['token'] == 1
+
+
+def test_connect_callback_is_registered_once(mock_server):
+    async def scenario():
+        session = make_session(mock_server, ['Chatroom 1'])
+        for _ in range(2):
+            assert await session.start()
+        callbacks = list(session.runtime.connect_callbacks)
+        await session.close()
+        return callbacks
+
+    assert len(asyncio.run(scenario())) == 1
@@ -0,0 +1,98 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import time
+
+from chatroom_directory import ChatroomDirectory
+
+
+class ListingClient:
+    def __init__(self, chatrooms, managed_chatrooms, delay=0.0):
+        self.chatrooms = {False: chatrooms, True: managed_chatrooms}
+        self.statuses = {False: 200, True: 200}
+        self.delay = delay
+        self.calls = []
+
+    def list_chatrooms(self, access_token, room_is_managed=False):
+        self.calls.append((access_token, room_is_managed))
+        time.sleep(self.delay)
+        status = self.statuses[room_is_managed]
+        return status, {'chatrooms': self.chatrooms[room_is_managed]} if status == 200 else None
+
+
+def room(room_id, name):
+    return {'chatroomId': room_id, 'name': name}
+
+
+def make_directory(client, **kwargs):
+    return ChatroomDirectory(client, lambda: 'token', **kwargs)
+
+
+def test_lookup_by_name_and_id():
+    client = ListingClient([room('groupchat-0000', 'Chatroom 1')], [room('managed-0000', 'Managed 1')])
+    directory = make_directory(client)
+    assert directory.refresh()
+    assert directory.chatroom_id('Chatroom 1') == 'groupchat-0000'
+    assert directory.chatroom_id('No such chatroom') is None
+    assert directory.get_by_id('groupchat-0000')['name'] == 'Chatroom 1'
+    assert len(directory) == 2 and 'managed-0000' in directory
+    assert sorted(client.calls) == [('token', False), ('token', True)]
+
+
+def test_managed_chatrooms_fall_back_behind_chatrooms():
+    client = ListingClient([room('groupchat-0000', 'Shared')],
+                           [room('managed-0000', 'Shared'), room('managed-0001', 'Managed only')])
+    directory = make_directory(client)
+    directory.refresh()
+    # A chatroom wins a name clash, a name only a managed chatroom has finds the managed chatroom
+    assert directory.chatroom_id('Shared') == 'groupchat-0000'
+    assert directory.chatroom_id('Managed only') == 'managed-0001'
+    assert directory.is_managed('managed-0001')
+    assert not directory.is_managed('groupchat-0000')
+    assert not directory.is_managed('unknown')
+
+
+def test_failed_list_keeps_the_previous_chatrooms():
+    client = ListingClient([room('groupchat-0000', 'Chatroom 1')], [room('managed-0000', 'Managed 1')])
+    directory = make_directory(client)
+    directory.refresh()
+    client.statuses = {False: 503, True: 503}
+    assert not directory.refresh()
+    assert directory.chatroom_id('Chatroom 1') == 'groupchat-0000'
+    assert directory.chatroom_id('Managed 1') == 'managed-0000'
+
+
+def test_ttl_marks_the_directory_stale_until_refreshed():
+    client = ListingClient([room('groupchat-0000', 'Chatroom 1')], [])
+    directory = make_directory(client, ttl=0.05)
+    assert directory.is_stale()
+    directory.refresh()
+    assert not directory.is_stale()
+    time.sleep(0.06)
+    assert directory.is_stale()
+    client.chatrooms[False] = [room('groupchat-0001', 'Chatroom 2')]
+    directory.refresh()
+    assert not directory.is_stale()
+    assert directory.chatroom_id('Chatroom 2') == 'groupchat-0001'
+    assert directory.chatroom_id('Chatroom 1') is None
+
+
+def test_chatroom_lists_are_requested_concurrently():
+    client = ListingClient([room('groupchat-0000', 'Chatroom 1')], [room('managed-0000', 'Managed 1')], delay=0.2)
+    directory = make_directory(client)
+    start = time.monotonic()
+    directory.refresh()
+    assert time.monotonic() - start < 0.35
+    assert len(directory) == 2
+
+
+def test_managed_chatrooms_can_be_left_out():
+    client = ListingClient([room('groupchat-0000', 'Chatroom 1')], [room('managed-0000', 'Managed 1')])
+    directory = make_directory(client, include_managed=False)
+    directory.refresh()
+    assert client.calls == [('token', False)]
+    assert len(directory) == 1
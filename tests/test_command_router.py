@@ -0,0 +1,56 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+
+import pytest
+
+from command_router import CommandRouter
+
+
+def make_router(calls):
+    router = CommandRouter()
+
+    @router.command('/help', 'C1', 'C2', 'C3')
+    async def help_command(runtime, message_json, args):
+        calls.append(('help', args))
+
+    @router.command('hello')
+    def hello_command(runtime, message_json, args):
+        calls.append(('hello', args))
+
+    return router
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('/help', ('help', [])),
+    ('/HELP topics "market data"', ('help', ['topics', 'market data'])),
+    ('c2', ('help', [])),
+    ('  Hello ', ('hello', [])),
+    ('hello everyone', None),
+    ('C1 please', None),
+    ('/unknown', None),
+    ('', None),
+])
+def test_dispatch(message, expected):
+    calls = []
+    router = make_router(calls)
+    handled = asyncio.run(router.dispatch(None, {}, message))
+    assert handled == (expected is not None)
+    assert calls == ([expected] if expected is not None else [])
+
+
+def test_unbalanced_quotes_fall_back_to_words():
+    command, args = make_router([]).resolve('/help "market data')
+    assert command.name == '/help'
+    assert args == ['"market', 'data']
+
+
+def test_duplicate_names_are_rejected():
+    router = make_router([])
+    with pytest.raises(ValueError):
+        router.add_command('c1', lambda runtime, message_json, args: None)
@@ -0,0 +1,52 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+
+from dm_broadcast import DirectMessageBroadcast
+
+
+class FakeRuntime:
+    def __init__(self):
+        self.sent = []
+
+    async def post_direct_message(self, email, text):
+        await asyncio.sleep(0)
+        self.sent.append((email, text))
+        return 200, {}
+
+
+def test_a_bad_recipient_does_not_abort_the_broadcast(tmp_path):
+    runtime = FakeRuntime()
+    recipients = [{'email': 'user%d@example.com' % (index), 'name': 'User %d' % (index)} for index in range(20)]
+    # A missing template field
+    recipients[5] = {'email': 'nameless@example.com'}
+    broadcast = DirectMessageBroadcast(runtime, max_concurrency=4, journal_file=str(tmp_path / 'journal.jsonl'))
+
+    report = asyncio.run(broadcast.send(recipients, 'Hello {name}'))
+
+    assert report.summary() == {'delivered': 19, 'failed': 1, 'skipped': 0}
+    assert report.failed() == {'nameless@example.com': None}
+    assert ('user7@example.com', 'Hello User 7') in runtime.sent
+
+
+def test_resume_skips_the_delivered_recipients(tmp_path):
+    journal_file = str(tmp_path / 'journal.jsonl')
+    recipients = ['a@example.com', {'email': 'b@example.com'}, 'c@example.com']
+    asyncio.run(DirectMessageBroadcast(FakeRuntime(), journal_file=journal_file).send(recipients, 'Hi {x}'))
+
+    runtime = FakeRuntime()
+    report = asyncio.run(DirectMessageBroadcast(runtime, journal_file=journal_file).send(
+        recipients, 'Hi {email}', resume=True))
+
+    # Every recipient failed the first time, they are all sent again
+    assert report.summary() == {'delivered': 3, 'failed': 0, 'skipped': 0}
+
+    report = asyncio.run(DirectMessageBroadcast(runtime, journal_file=journal_file).send(
+        recipients, 'Hi {email}', resume=True))
+    assert report.skipped == {'a@example.com', 'b@example.com', 'c@example.com'}
+    assert len(runtime.sent) == 3
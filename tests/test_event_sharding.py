@@ -0,0 +1,82 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import collections
+import random
+
+from event_sharding import ConsistentHashRing, ShardedEventProcessor
+from mock_messenger_server import MockMessengerServer
+
+ROOMS = ['groupchat-%04d' % (index) for index in range(1000)]
+
+
+# Module level handler, run in the worker processes
+async def echo(runtime, message_json):
+    post = message_json['post']
+    await runtime.post_message_to_chatroom(message_json['chatroomId'], 'echo ' + post['message'])
+    if post['message'] == '0':
+        await runtime.post_direct_message(post['sender']['email'], 'welcome')
+
+
+class RecordingRuntime:
+    # The shared outbound sender of a bot: records the posts in the order they are sent
+    def __init__(self):
+        self.posts = collections.defaultdict(list)
+
+    async def post_message_to_chatroom(self, room_id, text, room_is_managed=None):
+        await asyncio.sleep(random.uniform(0, 0.005))
+        self.posts[room_id].append(text)
+
+    async def post_direct_message(self, contact_email, text):
+        self.posts[contact_email].append(text)
+
+
+def test_ring_is_stable_across_instances():
+    ring = ConsistentHashRing(range(4))
+    other = ConsistentHashRing(range(4))
+    assert [ring.get(room) for room in ROOMS] == [other.get(room) for room in ROOMS]
+
+
+def test_ring_spreads_chatrooms_over_the_nodes():
+    ring = ConsistentHashRing(range(4))
+    counts = collections.Counter(ring.get(room) for room in ROOMS)
+    assert set(counts) == {0, 1, 2, 3}
+    assert all(150 <= count <= 350 for count in counts.values())
+
+
+def test_ring_only_moves_the_chatrooms_of_a_changed_node():
+    ring = ConsistentHashRing(range(4))
+    before = {room: ring.get(room) for room in ROOMS}
+    ring.add(4)
+    added = {room: ring.get(room) for room in ROOMS}
+    moved = [room for room in ROOMS if added[room] != before[room]]
+    assert all(added[room] == 4 for room in moved)
+    assert 100 <= len(moved) <= 300
+    ring.remove(4)
+    assert {room: ring.get(room) for room in ROOMS} == before
+    ring.remove(0)
+    assert all(ring.get(room) == before[room] for room in ROOMS if before[room] != 0)
+    assert ConsistentHashRing([]).get('groupchat-0000') is None
+
+
+def test_replies_return_to_the_runtime_in_order():
+    rooms = ROOMS[:3]
+
+    async def scenario():
+        processor = ShardedEventProcessor(echo, worker_processes=2)
+        runtimes = [RecordingRuntime(), RecordingRuntime()]
+        for index in range(10):
+            for room in rooms:
+                for runtime in runtimes:
+                    await processor.message_handler(runtime, MockMessengerServer.chatroom_post_event(room, str(index)))
+        await processor.close()
+        return runtimes
+
+    for runtime in asyncio.run(scenario()):
+        assert runtime.posts == dict({room: ['echo %d' % (index) for index in range(10)] for room in rooms},
+                                     **{'user@example.com': ['welcome'] * 3})
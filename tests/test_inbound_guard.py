@@ -0,0 +1,94 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+
+from bot_session import BotSession
+from inbound_guard import EventDeduplicator, InboundGuard, event_key
+
+
+def chatroom_post(room_id, message_id, timestamp=None):
+    post = {'messageId': message_id, 'message': 'text'}
+    if timestamp is not None:
+        post['timestamp'] = timestamp
+    return {'event': 'chatroomPost', 'chatroomId': room_id, 'post': post}
+
+
+def test_deduplicator_forgets_the_least_recently_seen_keys():
+    deduplicator = EventDeduplicator(capacity=2)
+    assert not deduplicator.seen('a')
+    assert not deduplicator.seen('b')
+    assert deduplicator.seen('a')
+    assert not deduplicator.seen('c')
+    assert len(deduplicator) == 2
+    # 'b' was the least recently seen key
+    assert not deduplicator.seen('b')
+    assert not deduplicator.seen('a')
+
+
+def test_event_key():
+    assert event_key(chatroom_post('groupchat-0000', 'm1')) == ('groupchat-0000', 'm1')
+    assert event_key({'event': 'chatroomPost', 'post': {'postId': 'p1', 'chatroomId': 'r'}}) == ('r', 'p1')
+    assert event_key({'event': 'connect'}) is None
+
+
+def test_duplicate_events_are_dropped():
+    guard = InboundGuard()
+    assert guard.accept(chatroom_post('groupchat-0000', 'm1'))
+    assert not guard.accept(chatroom_post('groupchat-0000', 'm1'))
+    # The same post id in another chatroom is another event
+    assert guard.accept(chatroom_post('groupchat-0001', 'm1'))
+    assert guard.accept({'event': 'connect'})
+    assert guard.duplicates == 1
+
+
+def test_out_of_order_events_are_counted_per_chatroom():
+    guard = InboundGuard()
+    assert guard.accept(chatroom_post('groupchat-0000', 'm1', 200))
+    assert guard.accept(chatroom_post('groupchat-0001', 'm2', 100))
+    assert guard.accept(chatroom_post('groupchat-0000', 'm3', 150))
+    assert guard.out_of_order == 1
+
+
+def test_out_of_order_events_are_dropped_on_request():
+    guard = InboundGuard(drop_out_of_order=True)
+    assert guard.accept(chatroom_post('groupchat-0000', 'm1', '2020-01-01T10:00:01Z'))
+    assert not guard.accept(chatroom_post('groupchat-0000', 'm2', '2020-01-01T10:00:00Z'))
+    assert guard.accept(chatroom_post('groupchat-0000', 'm3', '2020-01-01T10:00:01Z'))
+    # Timestamps that cannot be compared are accepted
+    assert guard.accept(chatroom_post('groupchat-0000', 'm4', 5))
+
+
+def test_events_received_twice_over_the_stream_are_handled_once(mock_server):
+    handled = []
+
+    async def handler(runtime, message_json):
+        if message_json.get('event') == 'chatroomPost':
+            handled.append(message_json['post']['message'])
+
+    async def scenario():
+        session = BotSession('bot', 'password', 'app_key', handler, ['Chatroom 1'], None,
+                             mock_server.ws_url, mock_server.gw_url)
+        assert await session.start(connect=True)
+        while not mock_server.connected_clients():
+            await asyncio.sleep(0.01)
+        event = mock_server.chatroom_post_event('groupchat-0000', 'hello')
+        for _ in range(2):
+            await asyncio.wrap_future(mock_server.send_event(event))
+        await asyncio.wrap_future(mock_server.send_chatroom_post('groupchat-0000', 'again'))
+        for _ in range(100):
+            if len(handled) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        guard = session.runtime.inbound_guard
+        await session.close()
+        return guard
+
+    guard = asyncio.run(scenario())
+    assert handled == ['hello', 'again']
+    assert guard.duplicates == 1
@@ -0,0 +1,82 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+
+import pytest
+
+from inbound_queue import InboundQueue, is_command_event
+
+
+def post(text):
+    return {'event': 'chatroomPost', 'post': {'message': text}}
+
+
+# Fill a queue with events, then return the texts of the waiting events in the order workers get them
+def drain(queue, texts):
+    async def scenario():
+        for text in texts:
+            queue.put_nowait(post(text))
+        received = []
+        while not queue.empty():
+            received.append((await queue.get())['post']['message'])
+            queue.task_done()
+        await queue.join()
+        return received
+
+    return asyncio.run(scenario())
+
+
+def test_is_command_event():
+    assert is_command_event(post(' /help'))
+    assert is_command_event({'event': 'connect'})
+    assert not is_command_event(post('hello everyone'))
+
+
+def test_drop_oldest():
+    queue = InboundQueue(maxsize=3, policy='drop_oldest')
+    assert drain(queue, ['a', '/b', 'c', 'd', 'e']) == ['c', 'd', 'e']
+    assert queue.dropped == {'command': 1, 'chatter': 1}
+
+
+def test_drop_chatter_keeps_the_commands():
+    queue = InboundQueue(maxsize=3, policy='drop_chatter')
+    # d is dropped on arrival, b makes room for /e, and /f drops the oldest command when only commands wait
+    assert drain(queue, ['/a', 'b', '/c', 'd', '/e', '/f']) == ['/c', '/e', '/f']
+    assert queue.dropped == {'command': 1, 'chatter': 2}
+
+
+def test_prioritize_commands():
+    queue = InboundQueue(maxsize=3, policy='prioritize_commands')
+    assert drain(queue, ['a', 'b', '/c', 'd', '/e']) == ['/c', '/e', 'd']
+    assert queue.drop_count() == 2
+
+
+def test_prioritize_commands_drops_new_chatter_when_only_commands_wait():
+    queue = InboundQueue(maxsize=3, policy='prioritize_commands')
+    assert drain(queue, ['/a', '/b', '/c', 'chatter']) == ['/a', '/b', '/c']
+    assert queue.dropped == {'command': 0, 'chatter': 1}
+
+
+def test_lag_of_the_oldest_waiting_event():
+    queue = InboundQueue()
+
+    async def scenario():
+        queue.put_nowait(post('a'))
+        await asyncio.sleep(0.05)
+        lag = queue.lag()
+        await queue.get()
+        return lag
+
+    assert asyncio.run(scenario()) >= 0.05
+    assert queue.last_lag >= 0.05
+    assert queue.lag() == 0.0
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        InboundQueue(policy='drop_newest')
@@ -0,0 +1,71 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import itertools
+import json
+
+import pytest
+
+import json_codec
+
+BACKENDS = ['orjson', 'ujson', 'json']
+MESSAGE = {
+    'event': 'chatroomPost',
+    'chatroomId': 'groupchat-0000',
+    'post': {'message': 'Prix: 12,5 € — 価格 ✓', 'sender': {'email': 'user@example.com'}, 'count': 3,
+             'ratio': 0.25, 'mentions': [], 'edited': False, 'parent': None}
+}
+
+
+def codec(name):
+    if name not in json_codec.CODECS:
+        pytest.skip('%s is not installed' % (name))
+    return dict(zip(('backend', 'dumps', 'dumps_bytes', 'loads'), json_codec.CODECS[name]()))
+
+
+@pytest.fixture
+def restore_backend():
+    backend = json_codec.backend
+    yield
+    json_codec.use_backend(backend)
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_round_trip_and_return_types(name):
+    selected = codec(name)
+    text = selected['dumps'](MESSAGE)
+    data = selected['dumps_bytes'](MESSAGE)
+    assert isinstance(text, str)
+    assert isinstance(data, bytes)
+    assert data == text.encode('utf-8')
+    # Non-ASCII text is kept as UTF-8, not escaped
+    assert '€ — 価格 ✓' in text
+    assert selected['loads'](text) == MESSAGE
+    assert selected['loads'](data) == MESSAGE
+    assert json.loads(text) == MESSAGE
+
+
+@pytest.mark.parametrize('encoder, decoder', list(itertools.product(BACKENDS, repeat=2)))
+def test_backends_are_interchangeable(encoder, decoder):
+    encode, decode = codec(encoder), codec(decoder)
+    assert decode['loads'](encode['dumps'](MESSAGE)) == MESSAGE
+    assert decode['loads'](encode['dumps_bytes'](MESSAGE)) == MESSAGE
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_invalid_json_raises_value_error(name):
+    with pytest.raises(ValueError):
+        codec(name)['loads']('not json')
+
+
+def test_use_backend_selects_the_module_functions(restore_backend):
+    assert json_codec.use_backend() == next(iter(json_codec.CODECS))
+    assert json_codec.use_backend('json') == 'json'
+    assert json_codec.backend == 'json'
+    assert json_codec.loads(json_codec.dumps_bytes(MESSAGE)) == MESSAGE
+    with pytest.raises(ValueError):
+        json_codec.use_backend('simplejson')
@@ -0,0 +1,49 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import logging
+
+from bot_session import BotHost
+from messenger_client import get_messenger_client
+
+
+async def ignore(runtime, message_json):
+    pass
+
+
+def test_shared_client_pool_grows_to_the_requested_size(mock_server):
+    client = get_messenger_client(mock_server.gw_url, pool_maxsize=4)
+    assert get_messenger_client(mock_server.gw_url) is client
+    assert get_messenger_client(mock_server.gw_url, pool_maxsize=2).pool_maxsize == 4
+    assert get_messenger_client(mock_server.gw_url, pool_maxsize=16).pool_maxsize == 16
+
+
+def test_host_threads_reuse_pooled_connections(mock_server, caplog):
+    mock_server.latency = 0.05
+    host = BotHost(max_rest_workers=32)
+    session = host.add_session('bot', 'password', 'app_key', ignore, ws_url=mock_server.ws_url,
+                               gw_url=mock_server.gw_url)
+    client = session.runtime.messenger_client
+    assert client.pool_maxsize == 32
+
+    with caplog.at_level(logging.WARNING, logger='urllib3.connectionpool'):
+        for _ in range(2):
+            futures = [host.executor.submit(client.list_chatrooms, 'token') for _ in range(32)]
+            assert [future.result()[0] for future in futures] == [200] * 32
+    host.executor.shutdown()
+    assert 'Connection pool is full' not in caplog.text
+
+
+def test_host_closes_the_shared_clients_when_its_sessions_end(mock_server):
+    host = BotHost(max_rest_workers=4)
+    session = host.add_session('bot', 'password', 'app_key', ignore, ['No such chatroom'], ws_url=mock_server.ws_url,
+                               gw_url=mock_server.gw_url)
+    client = session.runtime.messenger_client
+    asyncio.run(host.run())
+    # The closed pool is no longer shared, the next caller gets a new client
+    assert get_messenger_client(mock_server.gw_url) is not client
@@ -0,0 +1,180 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import email.utils
+import time
+
+import pytest
+
+from messenger_client import MessengerClient
+from outbound_scheduler import OutboundScheduler, TokenBucket, parse_retry_after
+
+
+class ScriptedResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.reason = 'scripted'
+        self.content = b'{}'
+        self.text = '{}'
+
+
+class ScriptedClient(MessengerClient):
+    # Messenger BOT API client answering the requests with scripted (status, headers), then HTTP 200
+    def __init__(self, responses=()):
+        super().__init__('http://gateway.invalid')
+        self.responses = list(responses)
+        self.sent = []
+
+    def send(self, method, url, access_token, body=None, action=''):
+        self.sent.append((time.monotonic(), body['message']))
+        status, headers = self.responses.pop(0) if self.responses else (200, {})
+        return ScriptedResponse(status, headers)
+
+
+async def call_blocking(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def make_scheduler(client, **kwargs):
+    kwargs.setdefault('room_rate', 1000)
+    kwargs.setdefault('room_burst', 1000)
+    kwargs.setdefault('bot_rate', 1000)
+    kwargs.setdefault('bot_burst', 1000)
+    return OutboundScheduler(client, lambda: 'token', call_blocking, **kwargs)
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    bucket = TokenBucket(rate=10, capacity=2)
+    now = bucket.updated
+    for _ in range(2):
+        assert bucket.wait_time(now) == 0
+        bucket.consume(now)
+    assert bucket.wait_time(now) == pytest.approx(0.1)
+    assert bucket.wait_time(now + 0.1) == pytest.approx(0)
+    bucket.block(1.0, now)
+    assert bucket.wait_time(now + 0.5) == pytest.approx(0.5)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('2') == 2.0
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 28 <= parse_retry_after(retry_at) <= 30
+
+
+def test_throttled_post_is_retried_after_retry_after():
+    client = ScriptedClient([(429, {'Retry-After': '0.2'})])
+
+    async def scenario():
+        scheduler = make_scheduler(client)
+        result = await scheduler.post_message_to_chatroom('groupchat-0000', 'hello')
+        await scheduler.close()
+        return result
+
+    assert asyncio.run(scenario()) == (200, {})
+    assert [text for _, text in client.sent] == ['hello', 'hello']
+    assert client.sent[1][0] - client.sent[0][0] >= 0.2
+
+
+def test_failed_post_keeps_its_chatroom_order():
+    client = ScriptedClient([(503, {})])
+
+    async def scenario():
+        scheduler = make_scheduler(client, max_in_flight=1)
+        scheduler.retry_backoff = 0.05
+        posts = [scheduler.post_message_to_chatroom('groupchat-0000', text) for text in ('1', '2', '3')]
+        results = await asyncio.gather(*posts)
+        await scheduler.close()
+        return results
+
+    assert asyncio.run(scenario()) == [(200, {})] * 3
+    assert [text for _, text in client.sent] == ['1', '1', '2', '3']
+
+
+def test_post_fails_after_max_attempts():
+    client = ScriptedClient([(503, {})] * 3)
+
+    async def scenario():
+        scheduler = make_scheduler(client, max_attempts=3)
+        scheduler.retry_backoff = 0.01
+        result = await scheduler.post_direct_message('someone@example.com', 'hello')
+        await scheduler.close()
+        return result
+
+    assert asyncio.run(scenario()) == (503, None)
+    assert len(client.sent) == 3
+
+
+def test_chatroom_rate_limit_and_queue_depth():
+    client = ScriptedClient()
+
+    async def scenario():
+        scheduler = make_scheduler(client, room_rate=20, room_burst=1)
+        posts = [asyncio.ensure_future(scheduler.post_message_to_chatroom('groupchat-0000', str(index)))
+                 for index in range(5)]
+        await asyncio.sleep(0)
+        depth = scheduler.queue_depth()
+        await asyncio.gather(*posts)
+        await scheduler.close()
+        return depth
+
+    assert asyncio.run(scenario()) == 5
+    # One post per 1/20 second after the burst of one
+    assert client.sent[-1][0] - client.sent[0][0] >= 0.19
+
+
+def test_burst_is_coalesced_in_order():
+    client = ScriptedClient()
+
+    async def scenario():
+        scheduler = make_scheduler(client, coalesce_window=0.05)
+        results = await asyncio.gather(*[scheduler.post_message_to_chatroom('groupchat-0000', 'line %d' % (index))
+                                         for index in range(50)])
+        await scheduler.close()
+        return results, scheduler.coalesced
+
+    results, coalesced = asyncio.run(scenario())
+    assert results == [(200, {})] * 50
+    assert len(client.sent) == 1
+    assert coalesced == 49
+    assert client.sent[0][1].split('\n') == ['line %d' % (index) for index in range(50)]
+
+
+def test_coalesced_posts_respect_max_message_length():
+    client = ScriptedClient()
+
+    async def scenario():
+        scheduler = make_scheduler(client, coalesce_window=0.05, max_message_length=25)
+        await asyncio.gather(*[scheduler.post_direct_message('someone@example.com', 'line %d' % (index))
+                               for index in range(10)])
+        await scheduler.close()
+
+    asyncio.run(scenario())
+    texts = [text for _, text in client.sent]
+    assert all(len(text) <= 25 for text in texts)
+    assert '\n'.join(texts).split('\n') == ['line %d' % (index) for index in range(10)]
+
+
+def test_close_flushes_the_coalescing_window():
+    client = ScriptedClient()
+
+    async def scenario():
+        scheduler = make_scheduler(client, coalesce_window=30)
+        post = asyncio.ensure_future(scheduler.post_message_to_chatroom('groupchat-0000', 'last words'))
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        await scheduler.close()
+        return await post, time.monotonic() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == (200, {})
+    assert elapsed < 1
+    assert [text for _, text in client.sent] == ['last words']
@@ -0,0 +1,96 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import collections
+import random
+
+from outbox import SQLiteOutbox
+
+
+class RecordingSender:
+    def __init__(self, statuses=None):
+        self.sent = collections.Counter()
+        self.statuses = statuses or {}
+
+    async def __call__(self, kind, target, text, room_is_managed):
+        self.sent[text] += 1
+        await asyncio.sleep(random.uniform(0, 0.002))
+        return self.statuses.get(text, 200), {}
+
+
+def test_deliver_acknowledges_delivered_messages(tmp_path):
+    async def scenario():
+        outbox = SQLiteOutbox(str(tmp_path / 'outbox.db'), synchronous='OFF')
+        send = RecordingSender({'busy': 503, 'bad': 400, 'expired': 401, 'forbidden': 403, 'limited': 429})
+        for text in ('ok', 'busy', 'bad', 'expired', 'forbidden', 'limited'):
+            await outbox.deliver('chatroom', 'groupchat-0000', text, False, send)
+        await outbox.flush()
+        pending = await outbox.pending()
+        await outbox.close()
+        return pending
+
+    pending = asyncio.run(scenario())
+    # 503, 401, 403 and 429 are retried later, a 400 is rejected for good
+    assert [row[4] for row in pending] == ['busy', 'expired', 'forbidden', 'limited']
+
+
+def test_replay_sends_messages_left_by_a_previous_run(tmp_path):
+    database = str(tmp_path / 'outbox.db')
+
+    async def previous_run():
+        outbox = SQLiteOutbox(database, synchronous='OFF')
+        await outbox.add('recipient', 'someone@example.com', 'first')
+        await outbox.add('chatroom', 'groupchat-0000', 'second', True)
+        await outbox.close()
+
+    async def next_run():
+        outbox = SQLiteOutbox(database, synchronous='OFF')
+        send = RecordingSender()
+        replayed = await outbox.replay(send)
+        await outbox.flush()
+        pending = await outbox.pending()
+        await outbox.close()
+        return replayed, send.sent, pending
+
+    asyncio.run(previous_run())
+    replayed, sent, pending = asyncio.run(next_run())
+    assert replayed == 2
+    assert sent == {'first': 1, 'second': 1}
+    assert pending == []
+
+
+def test_replay_alongside_deliveries_sends_each_message_once(tmp_path):
+    async def scenario():
+        outbox = SQLiteOutbox(str(tmp_path / 'outbox.db'), synchronous='OFF')
+        outbox.retry_interval = 0
+        send = RecordingSender()
+        stop = asyncio.Event()
+
+        async def replay_continuously():
+            while not stop.is_set():
+                await outbox.replay(send)
+                await asyncio.sleep(0)
+
+        async def deliver(index):
+            # Spread the deliveries over many group commits
+            await asyncio.sleep(random.uniform(0, 0.2))
+            await outbox.deliver('chatroom', 'groupchat-0000', 'message %d' % (index), False, send)
+
+        replayers = [asyncio.get_running_loop().create_task(replay_continuously()) for _ in range(4)]
+        await asyncio.gather(*[deliver(index) for index in range(2000)])
+        stop.set()
+        await asyncio.gather(*replayers)
+        await outbox.flush()
+        pending = await outbox.pending()
+        await outbox.close()
+        return send.sent, pending
+
+    sent, pending = asyncio.run(scenario())
+    assert len(sent) == 2000
+    assert [text for text, count in sent.items() if count > 1] == []
+    assert pending == []
@@ -0,0 +1,76 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import threading
+import time
+
+from conftest import free_port
+from rdp_token import RDPTokenManagement
+from token_store import MemoryTokenStore
+
+
+def make_token_management():
+    return RDPTokenManagement('bot', 'password', 'app_key', before_timeout=0, token_store=MemoryTokenStore())
+
+
+def test_cached_token_is_reused(mock_server):
+    rdp_token = make_token_management()
+    first = rdp_token.get_token(save_token_to_file=False)
+    second = rdp_token.get_token(save_token_to_file=False)
+    assert first['access_token'] == second['access_token']
+    assert mock_server.request_counts['token'] == 1
+
+
+def test_concurrent_callers_share_one_refresh(mock_server):
+    mock_server.latency = 0.05
+    rdp_token = make_token_management()
+    threads = [threading.Thread(target=rdp_token.get_token, kwargs={'save_token_to_file': False})
+               for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert mock_server.request_counts['token'] == 1
+
+
+def test_refresher_renews_the_token_before_it_expires(mock_server):
+    mock_server.expires_in = 2
+    rdp_token = make_token_management()
+    rdp_token.refresh_fraction = 0.5
+    access_token = rdp_token.get_token(save_token_to_file=False)['access_token']
+    rdp_token.start_refresher(save_token_to_file=False)
+    try:
+        time.sleep(1.5)
+        assert rdp_token.get_token(save_token_to_file=False)['access_token'] != access_token
+    finally:
+        rdp_token.stop_refresher()
+
+
+def test_unreachable_server_fails_without_exception(monkeypatch):
+    monkeypatch.setattr(RDPTokenManagement, 'base_URL', 'http://localhost:%d' % (free_port()))
+    rdp_token = make_token_management()
+    assert rdp_token.request_new_token(None) == (None, None)
+    assert rdp_token.get_token(save_token_to_file=False) is None
+
+
+def test_refresher_survives_refresh_exceptions(mock_server):
+    rdp_token = make_token_management()
+    rdp_token.refresh_retry = 0.01
+    calls = []
+
+    def failing_refresh(save_token_to_file=True, current_refresh_token=None, force=True):
+        calls.append(force)
+        raise ValueError('unexpected response')
+
+    rdp_token.refresh = failing_refresh
+    rdp_token.start_refresher(save_token_to_file=False)
+    try:
+        time.sleep(0.2)
+        assert rdp_token._refresher.is_alive()
+        assert len(calls) > 1
+    finally:
+        rdp_token.stop_refresher()
@@ -0,0 +1,126 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+import gc
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+def test_replies_are_cached_per_arguments_until_invalidated():
+    cache = ResponseCache()
+    calls = []
+
+    @cache.cached('quote', ttl=60)
+    def quote_text(ric):
+        calls.append(ric)
+        return 'quote %s %d' % (ric, len(calls))
+
+    async def scenario():
+        replies = [await quote_text('LCOc1'), await quote_text('LCOc1'), await quote_text('CLc1')]
+        quote_text.invalidate('LCOc1')
+        replies.append(await quote_text('LCOc1'))
+        return replies
+
+    assert asyncio.run(scenario()) == ['quote LCOc1 1', 'quote LCOc1 1', 'quote CLc1 2', 'quote LCOc1 3']
+
+
+def test_concurrent_calls_share_one_computation():
+    cache = ResponseCache()
+    calls = []
+
+    @cache.cached('slow', ttl=60)
+    async def slow_text():
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        return 'reply'
+
+    async def scenario():
+        return await asyncio.gather(*[slow_text() for _ in range(10)])
+
+    assert asyncio.run(scenario()) == ['reply'] * 10
+    assert len(calls) == 1
+
+
+def test_ttl_callable_is_read_at_each_call():
+    cache = ResponseCache()
+    settings = {'ttl': 60}
+    calls = []
+
+    @cache.cached('table', lambda: settings['ttl'])
+    def table_text():
+        calls.append(None)
+        return 'table %d' % (len(calls))
+
+    async def scenario():
+        replies = [await table_text()]
+        table_text.invalidate()
+        # Set after the decorator ran: the next reply expires at once
+        settings['ttl'] = 0
+        replies.append(await table_text())
+        replies.append(await table_text())
+        return replies
+
+    assert asyncio.run(scenario()) == ['table 1', 'table 2', 'table 3']
+
+
+def test_least_recently_used_replies_are_evicted():
+    cache = ResponseCache(max_entries=2)
+
+    @cache.cached('echo', ttl=60)
+    def echo(value):
+        return value
+
+    async def scenario():
+        for value in ('a', 'b', 'a', 'c'):
+            await echo(value)
+
+    asyncio.run(scenario())
+    assert len(cache) == 2
+    assert cache._lookup(('echo', (('b',), ()))) == (False, None)
+
+
+def test_unhashable_arguments_are_not_cached():
+    cache = ResponseCache()
+    calls = []
+
+    @cache.cached('table', ttl=60)
+    def table_text(rows=None):
+        calls.append(rows)
+        return '%d rows' % (len(rows))
+
+    async def scenario():
+        return [await table_text(rows=[1, 2]), await table_text(rows=[1, 2])]
+
+    assert asyncio.run(scenario()) == ['2 rows', '2 rows']
+    assert len(calls) == 2
+    assert len(cache) == 0
+
+
+def test_error_of_a_cancelled_computation_is_retrieved():
+    cache = ResponseCache()
+    unretrieved = []
+
+    @cache.cached('broken', ttl=60)
+    async def broken_text():
+        await asyncio.sleep(0.01)
+        raise ValueError('no data')
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+        caller = asyncio.get_running_loop().create_task(broken_text())
+        await asyncio.sleep(0)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0.05)
+        gc.collect()
+
+    asyncio.run(scenario())
+    assert unretrieved == []
@@ -0,0 +1,71 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import asyncio
+
+from room_membership import RoomMembership
+
+
+class Gateway:
+    # join/leave coroutine functions recording their calls, rooms in fail_rooms cannot be joined
+    def __init__(self, fail_rooms=()):
+        self.fail_rooms = set(fail_rooms)
+        self.joins = []
+        self.leaves = []
+
+    async def join(self, room_id, room_is_managed):
+        self.joins.append(room_id)
+        await asyncio.sleep(0.01)
+        return room_id not in self.fail_rooms
+
+    async def leave(self, room_id, room_is_managed):
+        self.leaves.append((room_id, room_is_managed))
+
+
+def test_concurrent_posts_share_one_join():
+    gateway = Gateway()
+    rooms = RoomMembership()
+
+    async def scenario():
+        return await asyncio.gather(*[rooms.ensure_joined('groupchat-0000', gateway.join) for _ in range(10)])
+
+    assert asyncio.run(scenario()) == [True] * 10
+    assert gateway.joins == ['groupchat-0000']
+    assert 'groupchat-0000' in rooms
+    assert asyncio.run(rooms.ensure_joined('groupchat-0000', gateway.join))
+    assert len(gateway.joins) == 1
+
+
+def test_failed_join_is_not_tracked():
+    gateway = Gateway(fail_rooms=['groupchat-0001'])
+    rooms = RoomMembership()
+    assert not asyncio.run(rooms.ensure_joined('groupchat-0001', gateway.join))
+    assert len(rooms) == 0
+    # The next post tries again
+    assert not asyncio.run(rooms.ensure_joined('groupchat-0001', gateway.join))
+    assert gateway.joins == ['groupchat-0001', 'groupchat-0001']
+
+
+def test_rejoin_all_untracks_the_rooms_that_fail():
+    rooms = RoomMembership()
+    rooms.add('groupchat-0000')
+    rooms.add('managed-0000', room_is_managed=True)
+    rooms.add('groupchat-0001')
+    gateway = Gateway(fail_rooms=['groupchat-0001'])
+    assert not asyncio.run(rooms.rejoin_all(gateway.join))
+    assert sorted(rooms) == ['groupchat-0000', 'managed-0000']
+    assert rooms.is_managed('managed-0000')
+
+
+def test_leave_all_leaves_every_room():
+    rooms = RoomMembership()
+    rooms.add('groupchat-0000')
+    rooms.add('managed-0000', room_is_managed=True)
+    gateway = Gateway()
+    asyncio.run(rooms.leave_all(gateway.leave))
+    assert sorted(gateway.leaves) == [('groupchat-0000', False), ('managed-0000', True)]
+    assert len(rooms) == 0
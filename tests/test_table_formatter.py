@@ -0,0 +1,37 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import pytest
+
+from table_formatter import render_table
+
+
+def test_trend_markers_and_formats():
+    rows = [['APR19', 71.04, 70.58], ['MAY19', 70.1, 70.14], ['JUN19', 70.2, 70.2]]
+    text = render_table(rows, ['Name', 'Fair Value', 'Hst Cls'], {'Fair Value': '.2f', 'Hst Cls': '.2f'},
+                        {'Fair Value': 'Hst Cls'}, title='Assessment')
+    assert text == ('Assessment\nName\tFair Value\tHst Cls\n'
+                    'APR19\t(up) 71.04\t70.58\nMAY19\t(dn) 70.10\t70.14\nJUN19\t70.20\t70.20')
+
+
+def test_header_labels_for_repeated_column_labels():
+    rows = [{'Name': 'APR19', 'Asmt Time': '05:07', 'Value Time': '10:58'}]
+    text = render_table(rows, ['Name', 'Asmt Time', 'Value Time'], header=['Name', '10-Apr-19', '10-Apr-19'])
+    assert text == 'Name\t10-Apr-19\t10-Apr-19\nAPR19\t05:07\t10:58'
+
+
+def test_duplicate_columns_are_rejected():
+    with pytest.raises(ValueError):
+        render_table([['a', 'b']], ['10-Apr-19', '10-Apr-19'])
+
+
+def test_csv_numbers_are_formatted():
+    assert render_table('Name,Asmt\nAPR19,70.5\n', formats={'Asmt': '.2f'}) == 'Name\tAsmt\nAPR19\t70.50'
+
+
+def test_csv_columns_are_picked_by_name():
+    assert render_table('a,b\n1,2\n', ['b', 'a']) == 'b\ta\n2\t1'
@@ -0,0 +1,36 @@
+# |-----------------------------------------------------------------------------
+# |            This source code is provided under the Apache 2.0 license      --
+# |  and is provided AS IS with no warranty or guarantee of fit for purpose.  --
+# |                See the project's LICENSE.md for details.                  --
+# |           Copyright Refinitiv 2020. All rights reserved.                  --
+# |-----------------------------------------------------------------------------
+
+import time
+
+import pytest
+
+from token_store import FileTokenStore, MemoryTokenStore, SQLiteTokenStore, TokenStore
+
+
+def test_incomplete_store_fails_when_created():
+    class LoadOnlyStore(TokenStore):
+        def load(self):
+            return None
+
+    with pytest.raises(TypeError):
+        LoadOnlyStore()
+
+
+@pytest.mark.parametrize('make_store', [
+    lambda path: MemoryTokenStore(),
+    lambda path: FileTokenStore(str(path / 'rest-token.txt')),
+    lambda path: SQLiteTokenStore(str(path / 'rest-token.db')),
+])
+def test_saved_token_is_loaded(tmp_path, make_store):
+    store = make_store(tmp_path)
+    assert store.load() is None
+    auth_obj = {'access_token': 'access', 'refresh_token': 'refresh', 'expires_in': '600',
+                'expires_tm': time.time() + 600}
+    with store.lock():
+        store.save(auth_obj)
+    assert store.load() == auth_obj